@@ -2,181 +2,113 @@
 Main Pulumi program for hungry-echoes infrastructure with improved error handling
 and update strategies.
 """
-import yaml
-import os
 import pulumi
-from pulumi_gcp import Provider as GCPProvider
-from pulumi_kubernetes import Provider as K8sProvider
-from pulumi import automation as auto
 
 # Local imports
-from networking.network import Network
-from app_cluster.app_cluster import AppCluster
-from app_cluster.app_cluster_add_ons import AppClusterAddons
-from monitoring_cluster.monitoring_cluster import MonitoringCluster
-from monitoring_cluster.monitoring_cluster_add_ons import MonitoringClusterAddons
-from utils.kubernetes import create_kubeconfig_from_promise
-
-# Custom exception for initialization failures
-class InitializationError(Exception):
-    pass
-
-def create_gcp_provider(config, timeout="120s", gcp_provider_name="gcp-provider"):
+from monitoring_cluster.scrape_config import AppClusterDiscovery
+from config.loader import load_settings
+from config.schema import Settings, SettingsError
+from preflight import engine as preflight
+from stacks import layers, programs
+from utils.providers import InitializationError, create_gcp_provider, create_kube_provider
+
+def main(settings: Settings = None):
     """
-    Creates and configures the GCP provider with proper error handling.
-    Returns tuple of (gcp_provider, project_id)
-    """
-    try:
-        # Configure the GCP provider with project settings
-        gcp_provider = GCPProvider(gcp_provider_name,
-            project=config['project']['id'],
-            # Add retry configurations for API calls
-            request_timeout=timeout,  # Increase timeout for API calls
-        )
-        return gcp_provider
-    except Exception as e:
-        raise InitializationError(f"Failed to create GCP provider: {str(e)}")
-
-def create_kube_provider(app_cluster, project_id, zone, kube_provider_name):
-    """
-    Creates the Kubernetes provider with proper error handling and retry logic.
-    """
-    
-    try:
-        kubeconfig = pulumi.Output.all(
-                app_cluster.cluster.name, 
-                app_cluster.cluster.endpoint, 
-                app_cluster.cluster.master_auth
-            ).apply(lambda args: create_kubeconfig_from_promise(args, project_id, zone))
-        return K8sProvider(kube_provider_name, kubeconfig)
+    Main deployment logic with improved error handling and update strategies.
 
-    except Exception as e:
-        raise InitializationError(f"Failed to create Kubernetes provider: {str(e)}")
+    Args:
+        settings: Settings to deploy with; loaded for the current stack when omitted
 
-def main():
-    """
-    Main deployment logic with improved error handling and update strategies.
+    Returns:
+        The top-level components by name (used by the benchmarks)
     """
-    # Load global config
-    try:
-        config_path = os.path.join(os.path.dirname(__file__), './settings.yaml')
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-    except Exception as e:
-        raise InitializationError(f"Failed to open the settings file at {str(config_path)}. Additional info: {str(e)}")
+    # Load global settings (parsed and validated once per process, with the stack overlay applied)
+    if settings is None:
+        try:
+            settings = load_settings(stack=pulumi.get_stack())
+        except (OSError, SettingsError) as e:
+            raise InitializationError(f"Failed to load the settings file. Additional info: {str(e)}")
+
+    # Reject settings GCP would refuse before a single cloud call (see preflight/)
+    if settings.preflight.enabled:
+        preflight.enforce(settings)
+
+    # A layer project (see stacks/) deploys only its own part of the graph
+    layer = layers.layer_for_project(pulumi.get_project())
+    if layer is not None:
+        return programs.run(layer, settings)
 
     try:
         # Step 1: Create the GCP provider
-        gcp_provider = create_gcp_provider(config)
-
-        # Step 2: Create shared network infrastructure
-        custom_opts = pulumi.ResourceOptions(
-                provider=gcp_provider,
-                # Add custom timeouts for network operations
-                custom_timeouts=pulumi.CustomTimeouts(
-                    create="30m",
-                    update="30m",
-                    delete="30m"
-                ),
-                # Add proper deletion strategy
-                delete_before_replace=True,
-            )
-        network = Network(config, opts=custom_opts)
-
-        # Step 3: Create app cluster using network configuration
-        custom_opts =pulumi.ResourceOptions(
-                provider=gcp_provider,
-                depends_on=[network],
-                # Add custom timeouts for cluster operations
-                custom_timeouts=pulumi.CustomTimeouts(
-                    create="45m",
-                    update="45m",
-                    delete="45m"
-                ),
-                # Ensure proper cleanup on failure
-                delete_before_replace=True,
-            ) 
-        app_cluster = AppCluster(
-            config['pulumi_provider']['app_cluster_provider_name'],
+        gcp_provider = create_gcp_provider(settings)
+
+        # Step 2: Enable the GCP APIs of every component, once for the project
+        bootstrap = programs.deploy_project_bootstrap(settings, gcp_provider)
+
+        # Step 3: Create shared network infrastructure
+        network = programs.deploy_network(settings, gcp_provider, depends_on=[bootstrap])
+
+        # Step 4: Create app cluster using network configuration
+        app_cluster = programs.deploy_app_cluster(
+            settings,
+            gcp_provider,
             vpc_id=network.vpc.id,
             subnet_id=network.app_subnet.id,
-            opts=custom_opts
+            allocation=network.allocations['app_cluster'],
+            depends_on=[bootstrap, network]
         )
 
-        # Step 4: Create k8s provider with proper error handling
+        # Step 5: Create k8s provider with proper error handling
         app_k8s_provider = create_kube_provider(
-            app_cluster,
-            config['project']['id'],
-            config['app_cluster']['zone'],
-            config['pulumi_provider']['app_cluster_k8s_provider_name']
+            app_cluster.cluster.name,
+            app_cluster.cluster.endpoint,
+            app_cluster.cluster.master_auth,
+            settings.project.id,
+            settings.app_cluster.zone,
+            settings.pulumi_provider.app_cluster_k8s_provider_name,
+            settings.kubernetes
         )
 
-        # Step 5: Install cluster add-ons with improved dependency management
-        custom_opts = pulumi.ResourceOptions(
-                provider=app_k8s_provider,
-                depends_on=[network, app_cluster],
-                # Add custom timeouts for add-on operations
-                custom_timeouts=pulumi.CustomTimeouts(
-                    create="20m",
-                    update="20m",
-                    delete="20m"
-                ),
-                # Ensure proper cleanup
-                delete_before_replace=True,
-                # Add ignore_changes for specific fields that cause unnecessary updates
-                ignore_changes=["metadata.annotations", "metadata.labels"]
-            )
-        app_addons = AppClusterAddons(
-            config['pulumi_provider']['app_addons_provider_name'],
-            opts=custom_opts
-        )
+        # Step 6: Install cluster add-ons with improved dependency management
+        app_addons = programs.deploy_app_addons(settings, app_k8s_provider, depends_on=[network, app_cluster])
 
-        # Step 6: Create monitoring cluster with proper error handling
-        custom_opts = pulumi.ResourceOptions(
-                provider=gcp_provider,
-                depends_on=[network],
-                # Add custom timeouts
-                custom_timeouts=pulumi.CustomTimeouts(
-                    create="45m",
-                    update="45m",
-                    delete="45m"
-                ),
-                # Ensure proper cleanup
-                delete_before_replace=True,
-            ) 
-        monitoring_cluster = MonitoringCluster(
-            config['pulumi_provider']['monitoring_cluster_provider_name'],
+        # Step 7: Deploy the app database (Postgres behind PgBouncer)
+        app_database = None
+        if settings.database.enabled:
+            app_database = programs.deploy_app_database(settings, app_k8s_provider, depends_on=[app_cluster])
+
+        # Step 8: Create monitoring cluster with proper error handling
+        monitoring_cluster = programs.deploy_monitoring_cluster(
+            settings,
+            gcp_provider,
             vpc_id=network.vpc.id,
             subnet_id=network.monitoring_subnet.id,
-            opts = custom_opts
+            allocation=network.allocations['monitoring_cluster'],
+            depends_on=[bootstrap, network]
         )
 
-        # Step 7: Create Kubernetes provider for monitoring cluster
+        # Step 9: Create Kubernetes provider for monitoring cluster
         monitoring_k8s_provider = create_kube_provider(
-            monitoring_cluster,
-            config['project']['id'],
-            config['monitoring_cluster']['zone'],
-            config['pulumi_provider']['monitoring_cluster_k8s_provider_name']
+            monitoring_cluster.cluster.name,
+            monitoring_cluster.cluster.endpoint,
+            monitoring_cluster.cluster.master_auth,
+            settings.project.id,
+            settings.monitoring_cluster.zone,
+            settings.pulumi_provider.monitoring_cluster_k8s_provider_name,
+            settings.kubernetes
         )
 
-        # Step 8: Install monitoring cluster add-ons (Prometheus Stack)
-        monitoring_addons = MonitoringClusterAddons(
-            config['pulumi_provider']['monitoring_addons_provider_name'],
-            opts=pulumi.ResourceOptions(
-                provider=monitoring_k8s_provider,
-                depends_on=[network, monitoring_cluster],
-                # Add custom timeouts for add-on operations
-                custom_timeouts=pulumi.CustomTimeouts(
-                    create="20m",
-                    update="20m",
-                    delete="20m"
-                ),
-                # Ensure proper cleanup
-                delete_before_replace=True,
-                # Add ignore_changes for specific fields that cause unnecessary updates
-                ignore_changes=["metadata.annotations", "metadata.labels"]
+        # Step 10: Install monitoring cluster add-ons (Prometheus Stack)
+        # Prometheus discovers the app pods through the app cluster API
+        discovery = None
+        if settings.monitoring.scrape.mode == "discovery":
+            discovery = AppClusterDiscovery(
+                api_server=app_cluster.cluster.endpoint.apply(lambda endpoint: f"https://{endpoint}"),
+                ca_certificate=app_cluster.cluster.master_auth.cluster_ca_certificate,
+                token=app_addons.metrics_discovery_token
             )
-        )
+        monitoring_addons = programs.deploy_monitoring_addons(
+            settings, monitoring_k8s_provider, discovery, depends_on=[network, monitoring_cluster])
 
         # Export necessary values with proper error handling
         pulumi.export('app_cluster_name', app_cluster.cluster.name)
@@ -185,6 +117,19 @@ def main():
         pulumi.export('monitoring_cluster_endpoint', monitoring_cluster.cluster.endpoint)
         pulumi.export('vpc_name', network.vpc.name)
         pulumi.export('vpc_id', network.vpc.id)
+        pulumi.export('enabled_services', bootstrap.ready)
+
+        components = {
+            "project_bootstrap": bootstrap,
+            "network": network,
+            "app_cluster": app_cluster,
+            "app_addons": app_addons,
+            "monitoring_cluster": monitoring_cluster,
+            "monitoring_addons": monitoring_addons,
+        }
+        if app_database is not None:
+            components["app_database"] = app_database
+        return components
 
     except InitializationError as e:
         # Handle initialization failures
@@ -1,9 +1,10 @@
 # app_cluster/app_cluster.py
-import pulumi
 from pulumi import ComponentResource, ResourceOptions, Output
-from pulumi_gcp import container, projects
-import yaml
-import os
+from pulumi_gcp import container
+
+from config.schema import Settings
+from networking.ipam import ClusterAllocation
+from utils.node_pools import RELEASE_CHANNEL, node_pool_args
 
 class AppCluster(ComponentResource):
     """
@@ -11,21 +12,28 @@ class AppCluster(ComponentResource):
     for the main application workload with improved error handling
     and update strategies.
     """
-    
+
+    # GCP APIs the cluster needs, enabled by the project bootstrap (see bootstrap/)
+    REQUIRED_SERVICES = (
+        "container.googleapis.com",
+        "compute.googleapis.com",
+        "monitoring.googleapis.com",
+        "logging.googleapis.com",
+    )
+
     def __init__(self, 
                  name: str, 
+                 settings: Settings,
                  vpc_id: Output,           
                  subnet_id: Output,         
+                 allocation: ClusterAllocation,
                  opts: ResourceOptions = None):
         super().__init__('hungry-echoes:app', name, None, opts)
 
-        # Load app cluster configuration
-        config_path = os.path.join(os.path.dirname(__file__), '../settings.yaml')
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
-
-        # Enable required GCP APIs with improved error handling
-        self.services = self._enable_gcp_services(name)
+        # Shared, already validated settings
+        self.settings = settings
+        # Secondary range names of the subnet, as allocated by the network
+        self.allocation = allocation
 
         # Create the GKE cluster with improved configuration
         self.cluster = self._create_gke_cluster(name, vpc_id, subnet_id)
@@ -33,6 +41,11 @@ class AppCluster(ComponentResource):
         # Create node pool with complete configuration
         self.node_pool = self._create_node_pool(name)
 
+        # Optional spot VM pool for burst capacity
+        self.spot_node_pool = None
+        if self.settings.node_pool.app_cluster.spot_pool.enabled:
+            self.spot_node_pool = self._create_node_pool(name, spot=True)
+
         # Register outputs
         self.register_outputs({
             "cluster_name": self.cluster.name,
@@ -40,54 +53,22 @@ class AppCluster(ComponentResource):
             "cluster_location": self.cluster.location
         })
 
-    def _enable_gcp_services(self, name: str):
-        """
-        Enables required GCP APIs with proper error handling and retries.
-        """
-        required_services = [
-            "container.googleapis.com",     
-            "compute.googleapis.com",       
-            "monitoring.googleapis.com",    
-            "logging.googleapis.com",       
-        ]
-
-        services = []
-        for service in required_services:
-            enabled_service = projects.Service(
-                f"{name}-{service}",
-                project=self.config['project']['id'],
-                service=service,
-                disable_dependent_services=False,
-                disable_on_destroy=False,
-                opts=ResourceOptions(
-                    parent=self,
-                    # Add custom timeouts for API enablement
-                    custom_timeouts=pulumi.CustomTimeouts(
-                        create="10m",
-                        delete="10m"
-                    )
-                )
-            )
-            services.append(enabled_service)
-        
-        return services
-
     def _create_gke_cluster(self, name: str, vpc_id: Output, subnet_id: Output):
         """
         Creates GKE cluster with improved configuration and error handling.
         """
         return container.Cluster(
             name,
-            name=self.config['app_cluster']['name'],
-            location=self.config['app_cluster']['zone'],
+            name=self.settings.app_cluster.name,
+            location=self.settings.app_cluster.zone,
 
             # Remove default node pool
             initial_node_count=1,
             remove_default_node_pool=True,
 
             # Use the STABLE release channel for managed upgrades
-            release_channel={   
-                "channel": "STABLE"
+            release_channel={
+                "channel": RELEASE_CHANNEL
             },
 
             # Improve maintenance window configuration
@@ -103,59 +84,41 @@ class AppCluster(ComponentResource):
 
             # IP allocation policy
             ip_allocation_policy={
-                "cluster_secondary_range_name": "app-pods",
-                "services_secondary_range_name": "app-services"
+                "cluster_secondary_range_name": self.allocation.pods_range_name,
+                "services_secondary_range_name": self.allocation.services_range_name
             },
 
             # Enable workload identity
             workload_identity_config={
-                "workload_pool": f"{self.config['project']['id']}.svc.id.goog"
+                "workload_pool": f"{self.settings.project.id}.svc.id.goog"
             },
 
+            # Gateway API for container-native load balancing (ingress.mode "gateway")
+            gateway_api_config=(
+                {"channel": "CHANNEL_STANDARD"} if self.settings.ingress.mode == "gateway" else None
+            ),
+
             # Disable deletion protection for development
             deletion_protection=False,
 
-            opts=ResourceOptions(
-                parent=self,
-                depends_on=self.services
-            )
+            opts=ResourceOptions(parent=self)
         )
 
-    def _create_node_pool(self, name: str):
+    def _create_node_pool(self, name: str, spot: bool = False):
         """
         Creates node pool with complete configuration addressing the 
         missing attributes error.
+
+        Args:
+            name: Base resource name of the pool
+            spot: Create the spot VM pool (node_pool.app_cluster.spot_pool) instead
         """
+        machine = self.settings.node_pool.app_cluster
+        suffix = "spot-node-pool" if spot else "node-pool"
         return container.NodePool(
-            f"{name}-node-pool",
-            name=f"{self.config['app_cluster']['name']}-node-pool",
-            location=self.config['app_cluster']['zone'],
+            f"{name}-{suffix}",
             cluster=self.cluster.name,
-            node_count=self.config['node_pool']['node_count'],
-
-            # Add required version
-            version=self.config['node_pool']['node_version'],
-
-            # Complete node configuration
-            node_config={
-                # Required base configuration
-                "machine_type": self.config['node_pool']['app_cluster']['machine_type'],
-                "disk_size_gb": self.config['node_pool']['disk_size_gb'],
-                "disk_type": self.config['node_pool']['disk_type'],
-                "image_type": self.config['node_pool']['image_type'],
-
-                # OAuth scopes
-                "oauth_scopes": [
-                    "https://www.googleapis.com/auth/logging.write",
-                    "https://www.googleapis.com/auth/monitoring",
-                    "https://www.googleapis.com/auth/devstorage.read_only"
-                ],
-
-                # Enable workload identity
-                "workload_metadata_config": {
-                    "mode": "GKE_METADATA"
-                },
-            },
-
+            # Size, version and node configuration (see utils/node_pools.py)
+            **node_pool_args(self.settings, self.settings.app_cluster, machine, machine.machine_type, spot),
             opts=ResourceOptions(parent=self)
-        )
\ No newline at end of file
+        )
@@ -1,19 +1,103 @@
-# app_cluster/ingress.py
+# app_cluster/app_cluster_add_ons.py
 
-from pulumi import ComponentResource, ResourceOptions, runtime
-from pulumi_kubernetes.helm.v3 import Chart, ChartOpts
-from pulumi_kubernetes.core.v1 import Namespace
+from pulumi import ComponentResource, Output, ResourceOptions, runtime, log
+from pulumi_kubernetes.apps.v1 import StatefulSet
+from pulumi_kubernetes.core.v1 import ConfigMap, Namespace, Secret, Service, ServiceAccount
+from pulumi_kubernetes.rbac.v1 import Role, RoleBinding
+import base64
 import os
 
+from app_cluster import ingress_profile
+from app_cluster.gateway import deploy_gateway
+from config.schema import Settings
+from monitoring_cluster import scrape_config
+from utils.helm import install_chart
+from utils.prometheus import CONFIG_DIR, CONFIG_VOLUME, config_reloader_container
+from utils.tailscale import deploy_proxies, egress_annotations, install_operator
+
 class AppClusterAddons(ComponentResource):
     """
-    Installs required Helm charts (NGINX Ingress and Tailscale) on the GKE cluster.
-    Includes logic to skip Helm deployments during the Pulumi preview phase.
+    Installs required Helm charts (NGINX Ingress and Tailscale) on the GKE cluster,
+    or the Gateway API objects instead of NGINX when `ingress.mode` is "gateway".
+    Charts are rendered from the local chart cache, so they also take part in
+    previews unless `charts.render_in_preview` is turned off.
     """
 
-    def __init__(self, name: str, opts: ResourceOptions = None):
+    def __init__(self, name: str, settings: Settings, opts: ResourceOptions = None):
         super().__init__('hungry-echoes:addons', name, None, opts)
 
+        self.settings = settings
+        render_charts = settings.charts.render_in_preview or not runtime.is_dry_run()
+
+        # Public entry point: the NGINX controller, or the Gateway API with container-native load balancing
+        self.nginx_ingress = None
+        self.gateway = []
+        if settings.ingress.mode == "gateway":
+            self.gateway = deploy_gateway(settings, opts=ResourceOptions(parent=self))
+        else:
+            self._deploy_nginx_ingress(render_charts)
+
+        # Create namespace for Tailscale
+        self.tailscale_namespace = Namespace(
+            "tailscale-namespace",
+            metadata={
+                "name": "tailscale"
+            },
+            opts=ResourceOptions(parent=self)
+        )
+
+        # Fetch Tailscale OAuth credentials from environment variables
+        app_tailscale_client_id = os.getenv('APP_TAILSCALE_OAUTH_CLIENT_ID')
+        app_tailscale_client_secret = os.getenv('APP_TAILSCALE_OAUTH_CLIENT_SECRET')
+        has_credentials = bool(app_tailscale_client_id and app_tailscale_client_secret)
+
+        if not has_credentials and not runtime.is_dry_run():
+            raise ValueError(
+                "APP_TAILSCALE_OAUTH_CLIENT_ID and APP_TAILSCALE_OAUTH_CLIENT_SECRET "
+                "environment variables must be set"
+            )
+
+        # Deploy Tailscale Operator from the local chart cache
+        self.tailscale_proxies = []
+        if render_charts and has_credentials:
+            # Install Tailscale Operator
+            self.tailscale = install_operator(
+                "tailscale",
+                settings,
+                settings.tailscale.app_cluster,
+                app_tailscale_client_id,
+                app_tailscale_client_secret,
+                opts=ResourceOptions(parent=self, depends_on=[self.tailscale_namespace])
+            )
+            # Proxy defaults, HA egress group and connector (need the chart's CRDs)
+            self.tailscale_proxies = deploy_proxies(
+                "app", settings, settings.tailscale.app_cluster,
+                opts=ResourceOptions(parent=self, depends_on=[self.tailscale])
+            )
+        else:
+            log.warn("Skipping Tailscale deployment during preview (charts.render_in_preview is off "
+                     "or the Tailscale OAuth credentials are not set).")
+
+        # Read-only identity the monitoring Prometheus uses to discover app pods
+        self.metrics_discovery_token = None
+        if settings.monitoring.scrape.mode == "discovery":
+            self.metrics_discovery_token = self._create_metrics_discovery_identity()
+
+        # Prometheus agent that scrapes the app pods and pushes to the monitoring cluster
+        self.prometheus_agent = None
+        if settings.monitoring.scrape.mode == "agent":
+            self.prometheus_agent = self._deploy_prometheus_agent()
+
+        # Register outputs
+        self.register_outputs({})
+
+    def _deploy_nginx_ingress(self, render_charts: bool):
+        """
+        Installs the NGINX ingress controller, sized and tuned by the active
+        ingress profile (see app_cluster/ingress_profile.py).
+        """
+        settings = self.settings
+
         # Create namespace for NGINX Ingress
         self.nginx_namespace = Namespace(
             "nginx-namespace",
@@ -23,86 +107,168 @@ class AppClusterAddons(ComponentResource):
             opts=ResourceOptions(parent=self)
         )
 
-        # Deploy NGINX Ingress Controller only during apply phase
-        if not runtime.is_dry_run():
+        # Deploy NGINX Ingress Controller from the local chart cache
+        if render_charts:
             # Install NGINX Ingress Controller
-            self.nginx_ingress = Chart(
-                "nginx-ingress",
-                ChartOpts(
-                    chart="ingress-nginx",
-                    version="4.11.3",
-                    fetch_opts={
-                        "repo": "https://kubernetes.github.io/ingress-nginx"
-                    },
-                    namespace=self.nginx_namespace.metadata["name"],
-                    values={
-                        "controller": {
-                            "replicaCount": 1,
-                            "service": {
-                                "type": "LoadBalancer"
-                            },
-                            "resources": {
-                                "requests": {
-                                    "memory": "64Mi",
-                                    "cpu": "100m"
-                                },
-                                "limits": {
-                                    "memory": "128Mi",
-                                    "cpu": "200m"
-                                }
-                            }
-                        }
-                    }
-                ),
+            self.nginx_ingress = install_chart(
+                ingress_profile.RELEASE_NAME,
+                settings.charts.ingress_nginx,
+                settings.charts,
+                namespace="ingress-nginx",
+                # Autoscaling, disruption budget, workers and upstream keepalive from the active profile
+                values={"controller": ingress_profile.controller_values(settings.ingress.active_profile)},
                 opts=ResourceOptions(parent=self, depends_on=[self.nginx_namespace])
             )
         else:
-            print("Skipping NGINX Ingress deployment during preview.")
+            log.info("Skipping NGINX Ingress deployment during preview (charts.render_in_preview is off).")
 
-        # Create namespace for Tailscale
-        self.tailscale_namespace = Namespace(
-            "tailscale-namespace",
+    def _create_pod_reader(self, account_name: str, account_namespace: str, depends_on=None) -> ServiceAccount:
+        """
+        Creates a service account that may only list and watch pods in the
+        namespaces of the scrape jobs.
+        """
+        account = ServiceAccount(
+            f"{account_name}-sa",
+            metadata={"name": account_name, "namespace": account_namespace},
+            opts=ResourceOptions(parent=self, depends_on=depends_on or [])
+        )
+
+        namespaces = sorted({job.namespace for job in self.settings.monitoring.scrape.jobs})
+        for namespace in namespaces:
+            role = Role(
+                f"{account_name}-role-{namespace}",
+                metadata={"name": account_name, "namespace": namespace},
+                rules=[{"api_groups": [""], "resources": ["pods"], "verbs": ["get", "list", "watch"]}],
+                opts=ResourceOptions(parent=self)
+            )
+            RoleBinding(
+                f"{account_name}-binding-{namespace}",
+                metadata={"name": account_name, "namespace": namespace},
+                role_ref={"api_group": "rbac.authorization.k8s.io", "kind": "Role", "name": account_name},
+                subjects=[{"kind": "ServiceAccount", "name": account_name, "namespace": account_namespace}],
+                opts=ResourceOptions(parent=self, depends_on=[role, account])
+            )
+        return account
+
+    def _create_metrics_discovery_identity(self) -> Output:
+        """
+        Creates the pod reader used by the monitoring Prometheus for discovery
+        and returns its (secret) token.
+        """
+        account = self._create_pod_reader("prometheus-discovery", "default")
+
+        # Long-lived token; Kubernetes fills in the data after the Secret exists
+        token_secret = Secret(
+            "prometheus-discovery-token",
             metadata={
-                "name": "tailscale"
+                "name": "prometheus-discovery-token",
+                "namespace": "default",
+                "annotations": {"kubernetes.io/service-account.name": "prometheus-discovery"}
             },
+            type="kubernetes.io/service-account-token",
+            opts=ResourceOptions(parent=self, depends_on=[account])
+        )
+        # Read it back once populated (the create response may predate the token controller)
+        populated = Secret.get(
+            "prometheus-discovery-token-read",
+            token_secret.id,
+            opts=ResourceOptions(parent=self, depends_on=[token_secret])
+        )
+        return Output.secret(populated.data.apply(
+            lambda data: base64.b64decode(data["token"]).decode() if data and "token" in data else ""))
+
+    def _deploy_prometheus_agent(self) -> StatefulSet:
+        """
+        Deploys a Prometheus agent (no local TSDB, no queries) that scrapes the
+        app pods in-cluster and remote-writes to the monitoring Prometheus
+        through a Tailscale egress service. Its WAL sits on a persistent volume,
+        so samples survive tailnet outages and pod restarts and are replayed
+        once the receiver is reachable again.
+        """
+        monitoring = self.settings.monitoring
+        remote_write = monitoring.remote_write
+
+        namespace = Namespace(
+            "app-monitoring-namespace",
+            metadata={"name": "monitoring"},
             opts=ResourceOptions(parent=self)
         )
+        child_opts = ResourceOptions(parent=self, depends_on=[namespace])
+        account = self._create_pod_reader("prometheus-agent", "monitoring", depends_on=[namespace])
 
-        # Deploy Tailscale Operator only during apply phase
-        if not runtime.is_dry_run():
-            # Fetch Tailscale OAuth credentials from environment variables
-            app_tailscale_client_id = os.getenv('APP_TAILSCALE_OAUTH_CLIENT_ID')
-            app_tailscale_client_secret = os.getenv('APP_TAILSCALE_OAUTH_CLIENT_SECRET')
+        # Egress to the receiver in the monitoring cluster; the operator fills in the proxy address
+        # (of the HA egress group when tailscale.app_cluster.egress_group is enabled)
+        receiver = Service(
+            "prometheus-receiver-egress",
+            metadata={
+                "name": "prometheus-receiver",
+                "namespace": "monitoring",
+                "annotations": egress_annotations(remote_write.receiver_tailnet_fqdn,
+                                                  self.settings.tailscale.app_cluster)
+            },
+            spec={
+                "type": "ExternalName",
+                "external_name": "unused",  # any value - will be overwritten by operator
+                "ports": [{"port": 9090, "protocol": "TCP", "target_port": 9090}]
+            },
+            opts=child_opts
+        )
 
-            if not app_tailscale_client_id or not app_tailscale_client_secret:
-                raise ValueError(
-                    "APP_TAILSCALE_OAUTH_CLIENT_ID and APP_TAILSCALE_OAUTH_CLIENT_SECRET "
-                    "environment variables must be set"
-                )
+        config_map = ConfigMap(
+            "prometheus-agent-config",
+            metadata={"name": "prometheus-agent-config", "namespace": "monitoring"},
+            data={"prometheus.yml": scrape_config.render_agent(
+                monitoring.scrape, remote_write,
+                "http://prometheus-receiver.monitoring.svc.cluster.local:9090/api/v1/write")},
+            opts=child_opts
+        )
 
-            # Install Tailscale Operator
-            self.tailscale = Chart(
-                "tailscale",
-                ChartOpts(
-                    chart="tailscale-operator",
-                    fetch_opts={
-                        "repo": "https://pkgs.tailscale.com/helmcharts/"
-                    },
-                    namespace=self.tailscale_namespace.metadata["name"],
-                    values={
-                        "oauth": {
-                            "clientId": app_tailscale_client_id,
-                            "clientSecret": app_tailscale_client_secret
-                        },
-                        "operator": {
-                            "hostname": "app-tailscale-operator"
-                        }
+        return StatefulSet(
+            "prometheus-agent",
+            metadata={"name": "prometheus-agent", "namespace": "monitoring"},
+            spec={
+                "service_name": "prometheus-agent",
+                "replicas": 1,
+                "selector": {"match_labels": {"app": "prometheus-agent"}},
+                "template": {
+                    "metadata": {"labels": {"app": "prometheus-agent"}},
+                    "spec": {
+                        "service_account_name": "prometheus-agent",
+                        # The WAL volume is written as the nobody user of the Prometheus image
+                        "security_context": {"fs_group": 65534},
+                        "containers": [
+                            {
+                                "name": "prometheus",
+                                "image": monitoring.prometheus.image,
+                                "args": [
+                                    f"--config.file={CONFIG_DIR}/prometheus.yml",
+                                    "--enable-feature=agent",
+                                    "--storage.agent.path=/wal",
+                                    f"--storage.agent.retention.max-time={remote_write.wal_max_time}",
+                                    "--web.enable-lifecycle",
+                                ],
+                                "ports": [{"container_port": 9090, "name": "http"}],
+                                "volume_mounts": [
+                                    {"name": CONFIG_VOLUME, "mount_path": f"{CONFIG_DIR}/"},
+                                    {"name": "wal", "mount_path": "/wal"},
+                                ],
+                                "resources": {
+                                    "requests": {"cpu": "100m", "memory": "256Mi"},
+                                    "limits": {"cpu": "500m", "memory": "512Mi"}
+                                }
+                            },
+                            config_reloader_container(monitoring.prometheus.config_reloader_image)
+                        ],
+                        "volumes": [{"name": CONFIG_VOLUME, "config_map": {"name": "prometheus-agent-config"}}]
                     }
-                ),
-                opts=ResourceOptions(parent=self, depends_on=[self.tailscale_namespace])
-            )
-        else:
-            print("Skipping Tailscale deployment during preview.")
-
-        # Register outputs
-        self.register_outputs({})
\ No newline at end of file
+                },
+                "volume_claim_templates": [{
+                    "metadata": {"name": "wal"},
+                    "spec": {
+                        "access_modes": ["ReadWriteOnce"],
+                        "resources": {"requests": {"storage": remote_write.wal_size}}
+                    }
+                }]
+            },
+            opts=ResourceOptions(parent=self, depends_on=[account, config_map, receiver])
+        )
@@ -0,0 +1,353 @@
+# app_cluster/database.py
+"""
+The app database: a tuned Postgres server behind a PgBouncer pool.
+
+Every echo pod keeps its own `database/sql` pool, so the number of server
+connections used to grow with the replica count until Postgres ran out of
+connections (and of CPU for their backends) long before the echo pods were
+busy. The app now connects to PgBouncer, which multiplexes any number of
+client connections over a few server connections per replica. In
+"transaction" mode a server connection is only held for one transaction; the
+app runs single statements without parameters, which lib/pq sends with the
+simple query protocol, so nothing depends on session state.
+
+Postgres runs as a StatefulSet with its parameters (connections, memory,
+planner costs for SSD) from `database.postgres`, on a volume of its own
+SSD-backed StorageClass. The schema and the phrases are seeded by
+database_init.sql when the volume is first initialized.
+
+Credentials come from the APP_POSTGRES_PASSWORD environment variable and are
+stored in the `postgres-secret` Secret the app deployment reads.
+"""
+import os
+from typing import Dict, List, Optional
+
+from pulumi import ComponentResource, Output, ResourceOptions, log, runtime
+from pulumi_kubernetes.apps.v1 import Deployment, StatefulSet
+from pulumi_kubernetes.core.v1 import ConfigMap, Secret, Service
+from pulumi_kubernetes.networking.v1 import NetworkPolicy
+from pulumi_kubernetes.policy.v1 import PodDisruptionBudget
+from pulumi_kubernetes.storage.v1 import StorageClass
+
+from config.schema import DatabaseSettings, PgBouncerSettings, PostgresSettings, Settings
+
+POSTGRES_PORT = 5432
+INIT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database_init.sql")
+PGBOUNCER_CONFIG_DIR = "/etc/pgbouncer"
+# The app pods, the only clients of the pool
+APP_LABELS = {"app": "hungry-echoes"}
+POSTGRES_LABELS = {"app": "postgres", "component": "database"}
+PGBOUNCER_LABELS = {"app": "pgbouncer", "component": "database"}
+
+
+def _resources(cpu_request: str, memory_request: str,
+               cpu_limit: Optional[str], memory_limit: Optional[str]) -> Dict:
+    limits = {key: value for key, value in (("cpu", cpu_limit), ("memory", memory_limit)) if value}
+    return {"requests": {"cpu": cpu_request, "memory": memory_request}, **({"limits": limits} if limits else {})}
+
+
+def postgres_parameters(postgres: PostgresSettings) -> Dict[str, str]:
+    """Server parameters of Postgres, by name."""
+    parameters = {
+        "max_connections": str(postgres.max_connections),
+        "shared_buffers": f"{postgres.shared_buffers_mb}MB",
+        "effective_cache_size": f"{postgres.effective_cache_size_mb}MB",
+        "work_mem": f"{postgres.work_mem_mb}MB",
+        "maintenance_work_mem": f"{postgres.maintenance_work_mem_mb}MB",
+        "random_page_cost": str(postgres.random_page_cost),
+        "effective_io_concurrency": str(postgres.effective_io_concurrency),
+    }
+    parameters.update(postgres.extra_parameters or {})
+    return parameters
+
+
+def pgbouncer_ini(database: DatabaseSettings) -> str:
+    """Renders pgbouncer.ini for the app database."""
+    pgbouncer = database.pgbouncer
+    server = f"postgres-0.postgres.{database.namespace}.svc.cluster.local"
+    settings = {
+        "listen_addr": "0.0.0.0",
+        "listen_port": POSTGRES_PORT,
+        "auth_type": "scram-sha-256",
+        "auth_file": f"{PGBOUNCER_CONFIG_DIR}/userlist.txt",
+        "pool_mode": pgbouncer.pool_mode,
+        "max_client_conn": pgbouncer.max_client_conn,
+        "default_pool_size": pgbouncer.default_pool_size,
+        "min_pool_size": pgbouncer.min_pool_size,
+        "reserve_pool_size": pgbouncer.reserve_pool_size,
+        "reserve_pool_timeout": pgbouncer.reserve_pool_timeout,
+        "server_idle_timeout": pgbouncer.server_idle_timeout,
+        # lib/pq sets extra_float_digits in its startup packet, which PgBouncer does not track
+        "ignore_startup_parameters": "extra_float_digits",
+        # SHOW POOLS / SHOW STATS on the admin console
+        "stats_users": database.user,
+    }
+    lines = ["[databases]",
+             f"{database.name} = host={server} port={POSTGRES_PORT} dbname={database.name}",
+             "",
+             "[pgbouncer]"]
+    lines.extend(f"{key} = {value}" for key, value in settings.items())
+    return "\n".join(lines) + "\n"
+
+
+class AppDatabase(ComponentResource):
+    """
+    Deploys Postgres and the PgBouncer pool the app connects to, in the app cluster.
+    """
+
+    def __init__(self, name: str, settings: Settings, opts: ResourceOptions = None):
+        super().__init__('hungry-echoes:database', name, None, opts)
+
+        self.settings = settings
+        database = settings.database
+
+        password = os.getenv('APP_POSTGRES_PASSWORD')
+        if not password and not runtime.is_dry_run():
+            raise ValueError("APP_POSTGRES_PASSWORD environment variable must be set")
+
+        self.postgres = None
+        self.pgbouncer = None
+        if password:
+            self.credentials = Secret(
+                "postgres-secret",
+                metadata={"name": "postgres-secret", "namespace": database.namespace, "labels": POSTGRES_LABELS},
+                string_data={
+                    "POSTGRES_USER": database.user,
+                    "POSTGRES_PASSWORD": Output.secret(password),
+                    "POSTGRES_DB": database.name,
+                },
+                opts=ResourceOptions(parent=self)
+            )
+            self.postgres = self._deploy_postgres()
+            self.pgbouncer = self._deploy_pgbouncer(password)
+            self._create_network_policies()
+        else:
+            log.warn("Skipping the app database during preview (APP_POSTGRES_PASSWORD is not set).")
+
+        # Register outputs
+        self.register_outputs({})
+
+    def _deploy_postgres(self) -> StatefulSet:
+        """
+        Deploys the Postgres StatefulSet, its headless Service and the SSD
+        StorageClass of its data volume.
+        """
+        database = self.settings.database
+        postgres = database.postgres
+        namespace = database.namespace
+
+        storage_class = StorageClass(
+            "postgres-storage-class",
+            metadata={"name": postgres.storage_class},
+            provisioner="pd.csi.storage.gke.io",
+            parameters={"type": postgres.disk_type},
+            # Provision the disk in the zone the pod is scheduled to
+            volume_binding_mode="WaitForFirstConsumer",
+            allow_volume_expansion=True,
+            # Keep the disk when the claim is deleted
+            reclaim_policy="Retain",
+            opts=ResourceOptions(parent=self)
+        )
+
+        init_scripts = ConfigMap(
+            "postgres-init-scripts",
+            metadata={"name": "postgres-init-scripts", "namespace": namespace, "labels": POSTGRES_LABELS},
+            data={"init.sql": _read_init_script()},
+            opts=ResourceOptions(parent=self)
+        )
+
+        # Headless Service: a stable DNS name for the pod
+        service = Service(
+            "postgres-service",
+            metadata={"name": "postgres", "namespace": namespace, "labels": POSTGRES_LABELS},
+            spec={
+                "cluster_ip": "None",
+                "selector": {"app": "postgres"},
+                "ports": [{"port": POSTGRES_PORT, "target_port": POSTGRES_PORT}],
+            },
+            opts=ResourceOptions(parent=self)
+        )
+
+        def from_secret(key: str) -> Dict:
+            return {"name": key, "value_from": {"secret_key_ref": {"name": "postgres-secret", "key": key}}}
+
+        probe_command = ["pg_isready", "-U", database.user, "-d", database.name]
+        args: List[str] = []
+        for key, value in postgres_parameters(postgres).items():
+            args += ["-c", f"{key}={value}"]
+
+        return StatefulSet(
+            "postgres",
+            metadata={"name": "postgres", "namespace": namespace, "labels": POSTGRES_LABELS},
+            spec={
+                "service_name": "postgres",
+                "replicas": 1,
+                "selector": {"match_labels": {"app": "postgres"}},
+                "template": {
+                    "metadata": {"labels": POSTGRES_LABELS},
+                    "spec": {
+                        "containers": [{
+                            "name": "postgres",
+                            "image": postgres.image,
+                            "args": args,
+                            "ports": [{"container_port": POSTGRES_PORT, "name": "postgres"}],
+                            "env": [
+                                from_secret("POSTGRES_USER"),
+                                from_secret("POSTGRES_PASSWORD"),
+                                from_secret("POSTGRES_DB"),
+                                {"name": "PGDATA", "value": "/var/lib/postgresql/data/pgdata"},
+                            ],
+                            "resources": _resources(postgres.cpu_request, postgres.memory,
+                                                    postgres.cpu_limit, postgres.memory),
+                            "volume_mounts": [
+                                {"name": "data", "mount_path": "/var/lib/postgresql/data"},
+                                {"name": "init-scripts", "mount_path": "/docker-entrypoint-initdb.d"},
+                                {"name": "shm", "mount_path": "/dev/shm"},
+                            ],
+                            "readiness_probe": {
+                                "exec": {"command": probe_command},
+                                "initial_delay_seconds": 5,
+                                "period_seconds": 10,
+                            },
+                            "liveness_probe": {
+                                "exec": {"command": probe_command},
+                                "initial_delay_seconds": 30,
+                                "period_seconds": 10,
+                            },
+                        }],
+                        "volumes": [
+                            {"name": "init-scripts", "config_map": {"name": "postgres-init-scripts"}},
+                            # Parallel queries use dynamic shared memory; the container default is 64MB
+                            {"name": "shm", "empty_dir": {"medium": "Memory",
+                                                          "size_limit": f"{postgres.shared_buffers_mb}Mi"}},
+                        ],
+                    }
+                },
+                "volume_claim_templates": [{
+                    "metadata": {"name": "data"},
+                    "spec": {
+                        "access_modes": ["ReadWriteOnce"],
+                        "storage_class_name": postgres.storage_class,
+                        "resources": {"requests": {"storage": postgres.storage_size}},
+                    }
+                }]
+            },
+            opts=ResourceOptions(parent=self, depends_on=[storage_class, init_scripts, service, self.credentials])
+        )
+
+    def _deploy_pgbouncer(self, password: str) -> Deployment:
+        """
+        Deploys the PgBouncer pool, its Service (the app's DB_HOST) and a
+        disruption budget that keeps one replica up during node upgrades.
+        """
+        database = self.settings.database
+        pgbouncer: PgBouncerSettings = database.pgbouncer
+        namespace = database.namespace
+
+        config = ConfigMap(
+            "pgbouncer-config",
+            metadata={"name": "pgbouncer-config", "namespace": namespace, "labels": PGBOUNCER_LABELS},
+            data={"pgbouncer.ini": pgbouncer_ini(database)},
+            opts=ResourceOptions(parent=self)
+        )
+        # PgBouncer authenticates clients against this list and logs in to Postgres with it
+        userlist = Secret(
+            "pgbouncer-userlist",
+            metadata={"name": "pgbouncer-userlist", "namespace": namespace, "labels": PGBOUNCER_LABELS},
+            string_data={"userlist.txt": Output.secret(f'"{database.user}" "{password}"\n')},
+            opts=ResourceOptions(parent=self)
+        )
+
+        Service(
+            "pgbouncer-service",
+            metadata={"name": "pgbouncer", "namespace": namespace, "labels": PGBOUNCER_LABELS},
+            spec={
+                "selector": {"app": "pgbouncer"},
+                "ports": [{"port": POSTGRES_PORT, "target_port": POSTGRES_PORT, "protocol": "TCP"}],
+            },
+            opts=ResourceOptions(parent=self)
+        )
+
+        if pgbouncer.replicas > 1:
+            PodDisruptionBudget(
+                "pgbouncer-pdb",
+                metadata={"name": "pgbouncer", "namespace": namespace},
+                spec={"min_available": 1, "selector": {"match_labels": {"app": "pgbouncer"}}},
+                opts=ResourceOptions(parent=self)
+            )
+
+        return Deployment(
+            "pgbouncer",
+            metadata={"name": "pgbouncer", "namespace": namespace, "labels": PGBOUNCER_LABELS},
+            spec={
+                "replicas": pgbouncer.replicas,
+                "selector": {"match_labels": {"app": "pgbouncer"}},
+                "template": {
+                    "metadata": {"labels": PGBOUNCER_LABELS},
+                    "spec": {
+                        # One replica per node where possible
+                        "topology_spread_constraints": [{
+                            "max_skew": 1,
+                            "topology_key": "kubernetes.io/hostname",
+                            "when_unsatisfiable": "ScheduleAnyway",
+                            "label_selector": {"match_labels": {"app": "pgbouncer"}},
+                        }],
+                        "containers": [{
+                            "name": "pgbouncer",
+                            "image": pgbouncer.image,
+                            "ports": [{"container_port": POSTGRES_PORT, "name": "pgbouncer"}],
+                            "resources": _resources(pgbouncer.cpu_request, pgbouncer.memory_request,
+                                                    pgbouncer.cpu_limit, pgbouncer.memory_limit),
+                            # The image only generates a configuration when none is mounted
+                            "volume_mounts": [{"name": "config", "mount_path": PGBOUNCER_CONFIG_DIR,
+                                               "read_only": True}],
+                            "readiness_probe": {
+                                "tcp_socket": {"port": POSTGRES_PORT},
+                                "period_seconds": 5,
+                            },
+                            "liveness_probe": {
+                                "tcp_socket": {"port": POSTGRES_PORT},
+                                "initial_delay_seconds": 10,
+                                "period_seconds": 15,
+                            },
+                        }],
+                        "volumes": [{
+                            "name": "config",
+                            "projected": {"sources": [
+                                {"config_map": {"name": "pgbouncer-config"}},
+                                {"secret": {"name": "pgbouncer-userlist"}},
+                            ]},
+                        }],
+                    }
+                },
+            },
+            opts=ResourceOptions(parent=self, depends_on=[config, userlist, self.postgres])
+        )
+
+    def _create_network_policies(self):
+        """
+        PgBouncer only accepts the app pods. Postgres accepts PgBouncer, and the
+        app pods for the one LISTEN session each keeps for phrase table changes
+        (LISTEN does not work through a transaction-mode pool).
+        """
+        namespace = self.settings.database.namespace
+        for name, selector, clients in (("postgres", {"app": "postgres"}, [{"app": "pgbouncer"}, APP_LABELS]),
+                                        ("pgbouncer", {"app": "pgbouncer"}, [APP_LABELS])):
+            NetworkPolicy(
+                f"{name}-network-policy",
+                metadata={"name": f"{name}-network-policy", "namespace": namespace},
+                spec={
+                    "pod_selector": {"match_labels": selector},
+                    "policy_types": ["Ingress"],
+                    "ingress": [{
+                        "from_": [{"pod_selector": {"match_labels": labels}} for labels in clients],
+                        "ports": [{"protocol": "TCP", "port": POSTGRES_PORT}],
+                    }],
+                },
+                opts=ResourceOptions(parent=self)
+            )
+
+
+def _read_init_script() -> str:
+    with open(INIT_SCRIPT) as f:
+        return f.read()
@@ -0,0 +1,119 @@
+# app_cluster/gateway.py
+"""
+Container-native load balancing for the app (`ingress.mode: gateway`).
+
+In "nginx" mode a request crosses the L4 load balancer, the NGINX controller
+and kube-proxy before it reaches an echo pod. Here a GKE Gateway provisions a
+Google L7 load balancer whose backends are network endpoint groups (NEGs) of
+the pod IPs, so the load balancer sends requests straight to the pods:
+
+- Gateway + HTTPRoute: the load balancer and the route to the app Service
+  (GKE creates the NEGs for Services referenced by a route);
+- HealthCheckPolicy: the load balancer health checks the pods on the readiness path;
+- GCPBackendPolicy: backend timeout and connection draining;
+- NetworkPolicy: lets the load balancer and health check ranges reach the pods.
+
+The load balancer and its health checks come from the Google health check
+ranges; the Network adds the backend port to the health check firewall rule
+in this mode (see `networking.firewall.with_health_check_ports`). The cluster
+needs the Gateway API enabled, which AppCluster does in this mode.
+"""
+from typing import List
+
+from pulumi import ResourceOptions
+from pulumi_kubernetes.apiextensions import CustomResource
+from pulumi_kubernetes.networking.v1 import NetworkPolicy
+
+from config.schema import Settings
+
+GATEWAY_API_VERSION = "gateway.networking.k8s.io/v1"
+GKE_POLICY_API_VERSION = "networking.gke.io/v1"
+GATEWAY_NAME = "hungry-echoes"
+
+
+def deploy_gateway(settings: Settings, opts: ResourceOptions) -> List:
+    """
+    Creates the Gateway API objects of the container-native path.
+
+    Args:
+        settings: Shared, already validated settings
+        opts: Resource options (parent, provider)
+
+    Returns:
+        The created resources, the Gateway first
+    """
+    gateway = settings.ingress.gateway
+    service_ref = {"group": "", "kind": "Service", "name": gateway.service}
+
+    gateway_resource = CustomResource(
+        "app-gateway",
+        api_version=GATEWAY_API_VERSION,
+        kind="Gateway",
+        metadata={"name": GATEWAY_NAME, "namespace": gateway.namespace},
+        spec={
+            "gatewayClassName": gateway.gateway_class,
+            "listeners": [{"name": "http", "protocol": "HTTP", "port": 80}],
+        },
+        opts=opts
+    )
+
+    route = CustomResource(
+        "app-http-route",
+        api_version=GATEWAY_API_VERSION,
+        kind="HTTPRoute",
+        metadata={"name": GATEWAY_NAME, "namespace": gateway.namespace},
+        spec={
+            "parentRefs": [{"name": GATEWAY_NAME}],
+            "hostnames": list(gateway.hostnames),
+            "rules": [{"backendRefs": [{"name": gateway.service, "port": gateway.service_port}]}],
+        },
+        opts=ResourceOptions.merge(opts, ResourceOptions(depends_on=[gateway_resource]))
+    )
+
+    health_check = CustomResource(
+        "app-health-check-policy",
+        api_version=GKE_POLICY_API_VERSION,
+        kind="HealthCheckPolicy",
+        metadata={"name": gateway.service, "namespace": gateway.namespace},
+        spec={
+            "default": {
+                "config": {
+                    "type": "HTTP",
+                    "httpHealthCheck": {"port": gateway.backend_port, "requestPath": gateway.health_check_path},
+                },
+            },
+            "targetRef": service_ref,
+        },
+        opts=opts
+    )
+
+    backend_policy = CustomResource(
+        "app-backend-policy",
+        api_version=GKE_POLICY_API_VERSION,
+        kind="GCPBackendPolicy",
+        metadata={"name": gateway.service, "namespace": gateway.namespace},
+        spec={
+            "default": {
+                "timeoutSec": gateway.timeout_seconds,
+                "connectionDraining": {"drainingTimeoutSec": gateway.connection_draining_seconds},
+            },
+            "targetRef": service_ref,
+        },
+        opts=opts
+    )
+
+    # Requests now reach the pods from the load balancer, not from the ingress-nginx namespace
+    network_policy = NetworkPolicy(
+        "app-gateway-network-policy",
+        metadata={"name": f"{gateway.service}-from-load-balancer", "namespace": gateway.namespace},
+        spec={
+            "pod_selector": {"match_labels": {"app": gateway.service}},
+            "policy_types": ["Ingress"],
+            "ingress": [{
+                "from_": [{"ip_block": {"cidr": cidr}} for cidr in settings.network.health_check_ranges],
+                "ports": [{"protocol": "TCP", "port": gateway.backend_port}],
+            }],
+        },
+        opts=opts
+    )
+    return [gateway_resource, route, health_check, backend_policy, network_policy]
@@ -0,0 +1,66 @@
+# app_cluster/ingress_profile.py
+"""
+Helm values of the NGINX ingress controller, generated from the active
+ingress profile (`ingress.profile` in settings.yaml).
+
+The controller fronts all public traffic, so it is autoscaled on CPU with a
+PodDisruptionBudget and spread over the nodes. It keeps a pool of idle
+keepalive connections to the upstream pods, so requests reuse connections
+instead of opening a new TCP connection to an echo pod each time. With
+`externalTrafficPolicy: Local` the load balancer only sends traffic to nodes
+that run a controller pod, which skips the extra kube-proxy hop and keeps the
+client address.
+"""
+from typing import Any, Dict
+
+from config.schema import IngressProfileSettings
+
+# Helm release name of the controller (see AppClusterAddons); its pods carry it as instance label
+RELEASE_NAME = "nginx-ingress"
+
+
+def controller_config(profile: IngressProfileSettings) -> Dict[str, str]:
+    """Keys of the ingress-nginx ConfigMap (every value is a string)."""
+    config = {
+        "worker-processes": profile.worker_processes,
+        "max-worker-connections": str(profile.worker_connections),
+        "upstream-keepalive-connections": str(profile.upstream_keepalive_connections),
+        "upstream-keepalive-requests": str(profile.upstream_keepalive_requests),
+        "upstream-keepalive-timeout": str(profile.upstream_keepalive_timeout),
+    }
+    config.update(profile.extra_config or {})
+    return config
+
+
+def controller_values(profile: IngressProfileSettings) -> Dict[str, Any]:
+    """The `controller` section of the ingress-nginx chart values."""
+    requests = {"cpu": profile.cpu_request, "memory": profile.memory_request}
+    limits = {key: value for key, value in (("cpu", profile.cpu_limit), ("memory", profile.memory_limit)) if value}
+    return {
+        # Only used while autoscaling is off; the HPA owns the replica count
+        "replicaCount": profile.min_replicas,
+        "autoscaling": {
+            "enabled": True,
+            "minReplicas": profile.min_replicas,
+            "maxReplicas": profile.max_replicas,
+            "targetCPUUtilizationPercentage": profile.target_cpu_utilization,
+        },
+        "minAvailable": profile.min_available,
+        # One controller per node where possible, so a node loss takes out a single replica
+        "topologySpreadConstraints": [{
+            "maxSkew": 1,
+            "topologyKey": "kubernetes.io/hostname",
+            "whenUnsatisfiable": "ScheduleAnyway",
+            "labelSelector": {"matchLabels": {
+                "app.kubernetes.io/name": "ingress-nginx",
+                "app.kubernetes.io/instance": RELEASE_NAME,
+                "app.kubernetes.io/component": "controller",
+            }},
+        }],
+        "config": controller_config(profile),
+        "service": {
+            "type": "LoadBalancer",
+            "externalTrafficPolicy": profile.external_traffic_policy,
+        },
+        "resources": {"requests": requests, **({"limits": limits} if limits else {})},
+    }
@@ -0,0 +1,51 @@
+# automation/__main__.py
+"""
+Command line entry point for the Automation API tooling.
+
+Run from the infra/ directory:
+    python -m automation profile --stack dev --operation up
+    python -m automation rollout --wave dev --wave staging,staging-eu --operation up
+    python -m automation charts pull
+    python -m automation capacity --prometheus http://prometheus:9090 --target-rps 400 --apply --stack prod
+    python -m automation tsdb --stack prod
+    python -m automation targeted --stack dev --operation up
+    python -m automation split-stack --stack organization/hungry-echoes/dev --execute
+    python -m automation preflight --stack prod
+    python -m automation ipam --stack dev
+"""
+import argparse
+import sys
+
+from automation import capacity, charts, ipam, preflight, profiler, rollout, split_stack, targeted, tsdb
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m automation", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    profiler.add_arguments(commands.add_parser(
+        "profile", help="Run preview/up and report the deployment critical path"))
+    rollout.add_arguments(commands.add_parser(
+        "rollout", help="Run preview/up across stacks concurrently, wave by wave"))
+    charts.add_arguments(commands.add_parser(
+        "charts", help="Pre-fetch the pinned Helm charts into the local cache"))
+    capacity.add_arguments(commands.add_parser(
+        "capacity", help="Recommend node pool sizes from request rate metrics"))
+    tsdb.add_arguments(commands.add_parser(
+        "tsdb", help="Estimate the monitoring Prometheus TSDB size, retention and resources"))
+    targeted.add_arguments(commands.add_parser(
+        "targeted", help="Run preview/up on the components whose inputs changed, and their dependents"))
+    split_stack.add_arguments(commands.add_parser(
+        "split-stack", help="Move a monolithic stack into the layer stacks without recreating resources"))
+    preflight.add_arguments(commands.add_parser(
+        "preflight", help="Validate the settings locally against the static GCP catalog"))
+    ipam.add_arguments(commands.add_parser(
+        "ipam", help="Record the previous IPAM allocations in the stack config"))
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
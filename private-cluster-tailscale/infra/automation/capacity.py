@@ -0,0 +1,249 @@
+# automation/capacity.py
+"""
+Metrics-driven capacity planner for the node pools.
+
+Reads the request rate (`hungry_echoes_requests_total`) and the CPU used by the
+app containers from Prometheus, or from a file recorded earlier with --record,
+and recommends a machine type and autoscaler bounds for a target RPS plus
+headroom. With --apply the recommendation is written to the node pool section
+of the stack's settings overlay (settings.<stack>.yaml), so it goes through the
+same validation and review as any other settings change.
+
+Run from the infra/ directory:
+    python -m automation capacity --prometheus http://prometheus:9090 --target-rps 400
+    python -m automation capacity --prometheus http://prometheus:9090 --record metrics.json
+    python -m automation capacity --metrics-file metrics.json --headroom 0.5 --apply --stack prod
+"""
+import json
+import math
+import os
+import statistics
+import time
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import yaml
+
+from config.loader import DEFAULT_SETTINGS_PATH, clear_settings_cache, load_settings, overlay_path
+from utils.node_pools import DAEMONSET_MILLICORES, MACHINE_TYPES
+
+RPS_QUERY = "sum(rate(hungry_echoes_requests_total[5m]))"
+CPU_QUERY = 'sum(rate(container_cpu_usage_seconds_total{container="hungry-echoes"}[5m]))'
+
+Samples = List[Tuple[float, float]]
+
+
+@dataclass
+class Recommendation:
+    cluster: str
+    machine_type: str
+    min_nodes: int
+    max_nodes: int
+    peak_rps: float
+    baseline_rps: float
+    rps_per_core: float
+    required_cores: float
+
+    def settings_patch(self) -> dict:
+        return {"node_pool": {self.cluster: {
+            "machine_type": self.machine_type,
+            "autoscaling": {"enabled": True, "min_nodes": self.min_nodes, "max_nodes": self.max_nodes},
+        }}}
+
+
+def query_range(prometheus: str, query: str, window: int, step: int) -> Samples:
+    """Runs a Prometheus range query over the last `window` seconds and sums the series."""
+    end = time.time()
+    params = urllib.parse.urlencode({"query": query, "start": end - window, "end": end, "step": step})
+    url = f"{prometheus.rstrip('/')}/api/v1/query_range?{params}"
+    with urllib.request.urlopen(url, timeout=60) as response:
+        body = json.load(response)
+    if body.get("status") != "success":
+        raise RuntimeError(f"Prometheus query failed: {body.get('error', body)}")
+
+    totals: Dict[float, float] = {}
+    for series in body["data"]["result"]:
+        for timestamp, value in series["values"]:
+            if value not in ("NaN", "+Inf", "-Inf"):
+                totals[float(timestamp)] = totals.get(float(timestamp), 0.0) + float(value)
+    return sorted(totals.items())
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def rps_per_core(rps: Samples, cpu: Samples) -> Optional[float]:
+    """Median throughput per CPU core over the samples where both series have data."""
+    cpu_at = dict(cpu)
+    ratios = [value / cpu_at[timestamp] for timestamp, value in rps
+              if value > 0 and cpu_at.get(timestamp, 0) > 0]
+    return statistics.median(ratios) if ratios else None
+
+
+def nodes_for(cores: float, machine_type: str) -> int:
+    usable = MACHINE_TYPES[machine_type][1] - DAEMONSET_MILLICORES
+    return max(1, math.ceil(cores * 1000 / usable))
+
+
+def recommend(rps: Samples, cpu: Samples, cluster: str, target_rps: Optional[float], headroom: float,
+              min_nodes: int, fallback_rps_per_core: float, machine_types: Sequence[str]) -> Recommendation:
+    """
+    Picks the machine type that serves the target with the fewest total vCPUs
+    (a proxy for cost), preferring fewer, larger nodes on ties.
+
+    The pool's maximum covers the target (or the observed p99) plus headroom;
+    its minimum covers the observed p10 load with the same headroom, and never
+    drops below `min_nodes` for availability.
+    """
+    values = [value for _, value in rps]
+    peak = target_rps if target_rps is not None else percentile(values, 0.99)
+    baseline = min(percentile(values, 0.10), peak)
+    if peak <= 0:
+        raise ValueError("no request rate to plan for; pass --target-rps or record some traffic first")
+
+    throughput = rps_per_core(rps, cpu) or fallback_rps_per_core
+    required = peak * (1 + headroom) / throughput
+
+    candidates = []
+    for machine_type in machine_types:
+        if MACHINE_TYPES[machine_type][1] <= DAEMONSET_MILLICORES:
+            continue
+        nodes = max(min_nodes, nodes_for(required, machine_type))
+        candidates.append((nodes * MACHINE_TYPES[machine_type][0], nodes, machine_type))
+    if not candidates:
+        raise ValueError("no machine type leaves room for workloads")
+    _, max_nodes, machine_type = min(candidates)
+
+    low = max(min_nodes, nodes_for(baseline * (1 + headroom) / throughput, machine_type))
+    return Recommendation(cluster, machine_type, min(low, max_nodes), max_nodes,
+                          peak, baseline, throughput, required)
+
+
+def load_metrics(path: str) -> Tuple[Samples, Samples]:
+    with open(path) as f:
+        document = json.load(f)
+    return ([tuple(s) for s in document["rps"]], [tuple(s) for s in document.get("cpu_cores", [])])
+
+
+def apply(recommendation: Recommendation, stack: str, path: str = DEFAULT_SETTINGS_PATH) -> str:
+    """Merges the recommendation into settings.<stack>.yaml and validates the result."""
+    target = overlay_path(stack, path)
+    document = {}
+    if os.path.exists(target):
+        with open(target) as f:
+            document = yaml.safe_load(f) or {}
+
+    cluster_pool = document.setdefault("node_pool", {}).setdefault(recommendation.cluster, {})
+    patch = recommendation.settings_patch()["node_pool"][recommendation.cluster]
+    cluster_pool["machine_type"] = patch["machine_type"]
+    cluster_pool.setdefault("autoscaling", {}).update(patch["autoscaling"])
+
+    rendered = yaml.safe_dump(document, sort_keys=False)
+    previous = None
+    if os.path.exists(target):
+        with open(target) as f:
+            previous = f.read()
+    with open(target, "w") as f:
+        f.write(rendered)
+
+    # Refuse to leave an invalid overlay behind
+    clear_settings_cache()
+    try:
+        load_settings(stack=stack, path=path)
+    except Exception:
+        if previous is None:
+            os.remove(target)
+        else:
+            with open(target, "w") as f:
+                f.write(previous)
+        raise
+    return target
+
+
+def print_recommendation(recommendation: Recommendation, current_machine: str, current_scaling: str):
+    print(f"Cluster:            {recommendation.cluster}")
+    print(f"Peak RPS planned:   {recommendation.peak_rps:.1f}")
+    print(f"Baseline RPS (p10): {recommendation.baseline_rps:.1f}")
+    print(f"RPS per core:       {recommendation.rps_per_core:.1f}")
+    print(f"Cores needed:       {recommendation.required_cores:.2f} (with headroom)")
+    print(f"Current:            {current_machine}, {current_scaling}")
+    print(f"Recommended:        {recommendation.machine_type}, "
+          f"autoscaling {recommendation.min_nodes}..{recommendation.max_nodes} nodes")
+    print("\nSettings:")
+    print(yaml.safe_dump(recommendation.settings_patch(), sort_keys=False), end="")
+
+
+def run(args) -> int:
+    if args.metrics_file:
+        rps, cpu = load_metrics(args.metrics_file)
+    elif args.prometheus:
+        window, step = args.window * 3600, args.step
+        rps = query_range(args.prometheus, args.rps_query, window, step)
+        cpu = query_range(args.prometheus, args.cpu_query, window, step)
+        if args.record:
+            with open(args.record, "w") as f:
+                json.dump({"rps": rps, "cpu_cores": cpu}, f)
+            print(f"Recorded {len(rps)} samples to {args.record}")
+    elif args.target_rps is None:
+        print("Pass --prometheus, --metrics-file or at least --target-rps")
+        return 2
+    else:
+        rps, cpu = [], []
+
+    settings = load_settings(stack=args.stack)
+    machine = getattr(settings.node_pool, args.cluster)
+    try:
+        recommendation = recommend(rps, cpu, args.cluster, args.target_rps, args.headroom, args.min_nodes,
+                                   args.rps_per_core, args.machine_types.split(","))
+    except ValueError as e:
+        print(e)
+        return 1
+
+    scaling = (f"autoscaling {machine.autoscaling.min_nodes}..{machine.autoscaling.max_nodes} nodes"
+               if machine.autoscaling.enabled
+               else f"{machine.node_count or settings.node_pool.node_count} fixed nodes")
+    print_recommendation(recommendation, machine.machine_type, scaling)
+
+    if args.apply:
+        print(f"\nWritten to {apply(recommendation, args.stack)}")
+    return 0
+
+
+def add_arguments(parser):
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--prometheus", help="Prometheus base URL, e.g. http://monitoring-prometheus:9090")
+    source.add_argument("--metrics-file", help="Plan from a file recorded with --record")
+    parser.add_argument("--record", help="Save the samples fetched from Prometheus to this file")
+    parser.add_argument("--window", type=int, default=168, help="Hours of history to read (default: a week)")
+    parser.add_argument("--step", type=int, default=300, help="Seconds between samples")
+    parser.add_argument("--rps-query", default=RPS_QUERY)
+    parser.add_argument("--cpu-query", default=CPU_QUERY)
+    parser.add_argument("--cluster", default="app_cluster", choices=["app_cluster", "monitoring_cluster"])
+    parser.add_argument("--target-rps", type=float, help="Peak RPS to plan for (default: observed p99)")
+    parser.add_argument("--headroom", type=float, default=0.3, help="Spare capacity on top of the peak (0.3 = 30%%)")
+    parser.add_argument("--min-nodes", type=int, default=2, help="Never scale below this many nodes")
+    parser.add_argument("--rps-per-core", type=float, default=200.0,
+                        help="Throughput per core when no CPU samples are available")
+    parser.add_argument("--machine-types", default=",".join(MACHINE_TYPES),
+                        help="Comma separated candidates")
+    parser.add_argument("--stack", default=None, help="Stack whose settings overlay is read (and written)")
+    parser.add_argument("--apply", action="store_true", help="Write the recommendation to settings.<stack>.yaml")
+    parser.set_defaults(func=_main)
+
+
+def _main(args) -> int:
+    if args.apply and not args.stack:
+        print("--apply needs --stack (recommendations go into the stack's settings overlay)")
+        return 2
+    unknown = [m for m in args.machine_types.split(",") if m not in MACHINE_TYPES]
+    if unknown:
+        print(f"Unknown machine type(s): {', '.join(unknown)}; known: {', '.join(MACHINE_TYPES)}")
+        return 2
+    return run(args)
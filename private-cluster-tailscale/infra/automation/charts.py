@@ -0,0 +1,39 @@
+# automation/charts.py
+"""
+Pre-fetches the pinned Helm charts into the local chart cache.
+
+Run this once with network access (e.g. before going offline or in CI) and copy
+the printed digests into settings.yaml to pin the exact archives.
+"""
+from dataclasses import fields
+
+from config.loader import load_settings
+from config.schema import ChartSettings
+from utils.helm import ChartCache, ChartCacheError
+
+
+def pull(stack: str = None) -> int:
+    settings = load_settings(stack=stack)
+    # Always allowed to download here, whatever charts.offline says
+    cache = ChartCache(settings.charts.cache_dir, offline=False)
+
+    failures = 0
+    for f in fields(settings.charts):
+        chart = getattr(settings.charts, f.name)
+        if not isinstance(chart, ChartSettings):
+            continue
+        try:
+            path = cache.resolve(chart)
+        except (ChartCacheError, OSError) as e:
+            print(f"{f.name}: FAILED: {e}")
+            failures += 1
+            continue
+        pinned = "pinned" if chart.digest else "not pinned"
+        print(f"{f.name}: {chart.chart} {chart.version}\n  digest: {cache.digest(chart)} ({pinned})\n  path:   {path}")
+    return 1 if failures else 0
+
+
+def add_arguments(parser):
+    parser.add_argument("action", choices=["pull"])
+    parser.add_argument("--stack", default=None, help="Apply the settings overlay of this stack")
+    parser.set_defaults(func=lambda args: pull(args.stack))
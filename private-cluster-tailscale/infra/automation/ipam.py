@@ -0,0 +1,121 @@
+# automation/ipam.py
+"""
+Records the IPAM allocations of the previous run in the stack config.
+
+The program allocates the cluster ranges before it registers a single resource
+(see networking/ipam.py), so it reads the previous run's allocations from the
+`ipam:allocations` stack config. This copies the `ipam_allocations` stack
+output there; the rollout, targeted, profile and split-stack commands do it
+before every preview/up. A layered network stack that has no outputs yet (right
+after split-stack) takes the allocations of the monolithic stack it was split
+from, and the cluster layer stacks get the network layer's allocations, which
+their clusters are built with. A stack that already has resources but no
+allocations to record is an error, because allocating from scratch could move
+its subnets.
+
+Run from the infra/ directory:
+    python -m automation ipam --stack dev
+    python -m automation ipam --stack organization/hungry-echoes-network/dev --layer network
+    python -m automation ipam --stack organization/hungry-echoes-app-cluster/dev --layer app-cluster
+"""
+import json
+from typing import Dict, Optional
+
+from pulumi import automation as auto
+
+from automation.workspace import select_stack
+from networking.ipam import IPAM_CONFIG_KEY, IPAM_CONFIG_NAMESPACE, IPAM_OUTPUT, IpamError
+from stacks.layers import LAYERS, MONOLITH_PROJECT, Layer, get_layer, layer_stack_name
+
+
+def _exported(stack: auto.Stack) -> Optional[Dict[str, dict]]:
+    output = stack.outputs().get(IPAM_OUTPUT)
+    return output.value if output is not None else None
+
+
+def _has_resources(stack: auto.Stack) -> bool:
+    resources = stack.export_stack().deployment.get("resources", [])
+    return any(resource["type"] != "pulumi:pulumi:Stack" for resource in resources)
+
+
+def _store(stack: auto.Stack, allocations: Dict[str, dict]):
+    stack.set_config(f"{IPAM_CONFIG_NAMESPACE}:{IPAM_CONFIG_KEY}",
+                     auto.ConfigValue(value=json.dumps(allocations, sort_keys=True)))
+
+
+def _monolith_stack(stack_name: str) -> Optional[auto.Stack]:
+    """The monolithic stack a layer stack was split from, if it still exists."""
+    parts = stack_name.split("/")
+    name = f"{parts[0]}/{MONOLITH_PROJECT}/{parts[-1]}" if len(parts) == 3 else parts[-1]
+    try:
+        return select_stack(name)
+    except auto.StackNotFoundError:
+        return None
+
+
+def _layer_stack(layer: Layer, stack_name: str) -> auto.Stack:
+    """The stack of `layer` next to the layer stack `stack_name` (same organization and stack)."""
+    parts = stack_name.split("/")
+    name = layer_stack_name(layer, parts[-1], parts[0]) if len(parts) == 3 else parts[-1]
+    return auto.select_stack(stack_name=name, work_dir=layer.directory)
+
+
+def record(stack: auto.Stack, fallback: Optional[auto.Stack] = None) -> Dict[str, dict]:
+    """
+    Records the allocations exported by `stack`, or else by `fallback`, in the config of `stack`.
+
+    Raises:
+        IpamError: If there is nothing to record but `stack` already has resources
+    """
+    allocations = _exported(stack)
+    if allocations is None and fallback is not None:
+        allocations = _exported(fallback)
+    if allocations is None:
+        if _has_resources(stack):
+            raise IpamError(f"{stack.name} has resources but no '{IPAM_OUTPUT}' output to record; "
+                            f"pin its current ranges in settings.yaml (network.clusters) first")
+        allocations = {}
+    _store(stack, allocations)
+    return allocations
+
+
+def prepare(stack: auto.Stack, layer: Optional[Layer] = None):
+    """
+    Records what the program of `stack` reads from the IPAM config.
+
+    Args:
+        stack: The monolithic stack, or a stack of `layer`
+        layer: The layer `stack` deploys; None for the monolithic project
+    """
+    if layer is None:
+        record(stack)
+    elif layer.name == "network":
+        record(stack, _monolith_stack(stack.name))
+    elif layer.name in ("app-cluster", "monitoring-cluster"):
+        network = _layer_stack(get_layer("network"), stack.name)
+        allocations = _exported(network)
+        if allocations is None:
+            raise IpamError(f"{network.name} has no '{IPAM_OUTPUT}' output yet; deploy the network layer first")
+        _store(stack, allocations)
+
+
+def add_arguments(parser):
+    parser.add_argument("--stack", required=True, help="Stack to record the allocations of")
+    parser.add_argument("--layer", choices=[layer.name for layer in LAYERS],
+                        help="Layer the stack belongs to (default: the monolithic project)")
+    parser.set_defaults(func=_main)
+
+
+def _main(args) -> int:
+    layer = get_layer(args.layer) if args.layer else None
+    if layer is None:
+        stack = select_stack(args.stack)
+    else:
+        stack = auto.select_stack(stack_name=args.stack, work_dir=layer.directory)
+    try:
+        prepare(stack, layer)
+    except IpamError as e:
+        print(f"error: {e}")
+        return 1
+    print(f"{args.stack}: recorded the IPAM allocations")
+    return 0
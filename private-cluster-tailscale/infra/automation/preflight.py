@@ -0,0 +1,47 @@
+# automation/preflight.py
+"""
+Runs the preflight validation (see preflight/) for a stack's settings without
+starting Pulumi, or refreshes the static catalog it checks against.
+
+Run from the infra/ directory:
+    python -m automation preflight --stack prod
+    python -m automation preflight --refresh-catalog     # needs gcloud credentials
+"""
+from config.loader import load_settings
+from preflight import catalog, engine
+from preflight.rules import CLUSTERS
+
+
+def check(stack: str = None, rules=()) -> int:
+    settings = load_settings(stack=stack)
+    try:
+        report = engine.run(settings, rules=rules)
+    except catalog.CatalogError as e:
+        print(f"error: {e}")
+        return 1
+    for violation in report.violations:
+        print(violation)
+    print(report.summary())
+    return 1 if report.errors else 0
+
+
+def refresh(stack: str = None) -> int:
+    settings = load_settings(stack=stack)
+    zones = [getattr(settings, key).zone for key in CLUSTERS]
+    try:
+        for line in catalog.refresh(settings.project.id, zones, settings.preflight.catalog):
+            print(line)
+    except catalog.CatalogError as e:
+        print(f"error: {e}")
+        return 1
+    print("catalog refreshed; review and commit it")
+    return 0
+
+
+def add_arguments(parser):
+    parser.add_argument("--stack", default=None, help="Apply the settings overlay of this stack")
+    parser.add_argument("--rule", action="append", default=[], help="Only run this rule (repeatable)")
+    parser.add_argument("--refresh-catalog", action="store_true",
+                        help="Rebuild the catalog with gcloud for the zones in the settings")
+    parser.set_defaults(func=lambda args: refresh(args.stack) if args.refresh_catalog
+                        else check(args.stack, args.rule))
@@ -0,0 +1,298 @@
+# automation/profiler.py
+"""
+Critical-path profiler for `preview` / `up` runs driven through the Automation API.
+
+Per-resource start/finish times come from the engine event stream
+(ResourcePreEvent -> ResOutputsEvent / ResOpFailedEvent). The dependency graph is
+rebuilt from the stack state: `parent`, `dependencies` (the `depends_on` wiring
+plus Output dependencies) and `provider` references. A `depends_on` on a
+component resource waits for every child of that component, so component edges
+are expanded to the component's descendants before the critical path is walked.
+
+The report contains:
+- the critical path, with the wall-clock each step added on top of the step it waited on
+- the wall-clock each top-level component (Network, AppCluster, ...) added
+- critical edges that came from a component-wide `depends_on`, which are the first
+  candidates for loosening
+- component edges already implied by another dependency (e.g. AppClusterAddons ->
+  Network, which is implied by AppClusterAddons -> AppCluster -> Network)
+"""
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from pulumi import automation as auto
+
+from automation import ipam
+from automation.workspace import op_name, select_stack, urn_name, urn_type
+
+COMPONENT_PREFIX = "hungry-echoes:"
+
+
+@dataclass
+class ResourceTiming:
+    urn: str
+    op: str
+    start: float
+    finish: Optional[float] = None
+    failed: bool = False
+
+
+@dataclass
+class PathStep:
+    urn: str
+    start: float
+    finish: float
+    added: float
+    waited_on: Optional[str] = None
+    via: Optional[str] = None
+
+
+@dataclass
+class DependencyGraph:
+    """Resource graph rebuilt from stack state and engine events."""
+    parents: Dict[str, str] = field(default_factory=dict)
+    dependencies: Dict[str, Set[str]] = field(default_factory=dict)
+    custom: Set[str] = field(default_factory=set)
+
+    def children(self) -> Dict[str, Set[str]]:
+        children: Dict[str, Set[str]] = {}
+        for child, parent in self.parents.items():
+            children.setdefault(parent, set()).add(child)
+        return children
+
+    def top_level(self, urn: str) -> str:
+        """Returns the outermost non-stack ancestor of `urn`."""
+        while urn in self.parents and urn_type(self.parents[urn]) != "pulumi:pulumi:Stack":
+            urn = self.parents[urn]
+        return urn
+
+
+class EventRecorder:
+    """Collects per-resource timings; pass `on_event` to `Stack.preview`/`Stack.up`."""
+
+    def __init__(self):
+        self.t0 = time.monotonic()
+        self.timings: Dict[str, ResourceTiming] = {}
+        self.parents: Dict[str, str] = {}
+        self.custom: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def on_event(self, event: auto.EngineEvent):
+        now = time.monotonic() - self.t0
+        with self._lock:
+            if event.resource_pre_event is not None:
+                metadata = event.resource_pre_event.metadata
+                self.timings[metadata.urn] = ResourceTiming(metadata.urn, op_name(metadata.op), now)
+                state = metadata.new or metadata.old
+                if state is not None:
+                    if state.parent:
+                        self.parents[metadata.urn] = state.parent
+                    if state.custom:
+                        self.custom.add(metadata.urn)
+            elif event.res_outputs_event is not None:
+                timing = self.timings.get(event.res_outputs_event.metadata.urn)
+                if timing is not None:
+                    timing.finish = now
+            elif event.res_op_failed_event is not None:
+                timing = self.timings.get(event.res_op_failed_event.metadata.urn)
+                if timing is not None:
+                    timing.finish = now
+                    timing.failed = True
+
+
+def build_graph(resources: List[dict], recorder: Optional[EventRecorder] = None) -> DependencyGraph:
+    """
+    Builds the dependency graph from exported state resources, topped up with
+    parent links seen in the event stream (resources that only exist in a preview).
+    """
+    graph = DependencyGraph()
+    if recorder is not None:
+        graph.parents.update(recorder.parents)
+        graph.custom.update(recorder.custom)
+
+    for resource in resources:
+        urn = resource["urn"]
+        if resource.get("parent"):
+            graph.parents[urn] = resource["parent"]
+        if resource.get("custom"):
+            graph.custom.add(urn)
+        deps = set(resource.get("dependencies") or [])
+        provider = resource.get("provider")
+        if provider:
+            # Provider references are "<urn>::<id>"
+            deps.add(provider.rsplit("::", 1)[0])
+        graph.dependencies[urn] = deps
+    return graph
+
+
+def _expand(graph: DependencyGraph, children: Dict[str, Set[str]], urn: str) -> Set[str]:
+    """Returns `urn` itself, or every custom descendant when `urn` is a component."""
+    if urn in graph.custom or urn not in children:
+        return {urn}
+    expanded: Set[str] = set()
+    for child in children[urn]:
+        expanded |= _expand(graph, children, child)
+    return expanded
+
+
+def critical_path(timings: Dict[str, ResourceTiming], graph: DependencyGraph) -> List[PathStep]:
+    """
+    Walks back from the last resource to finish, following at every step the
+    dependency that finished last before the step started.
+    """
+    finished = {urn: t for urn, t in timings.items() if t.finish is not None and urn in graph.custom}
+    if not finished:
+        return []
+
+    children = graph.children()
+    current = max(finished.values(), key=lambda t: t.finish).urn
+    steps: List[PathStep] = []
+    seen: Set[str] = set()
+
+    while current is not None and current not in seen:
+        seen.add(current)
+        timing = finished[current]
+
+        gate, via = None, None
+        for dep in graph.dependencies.get(current, ()):
+            for candidate in _expand(graph, children, dep):
+                dep_timing = finished.get(candidate)
+                if dep_timing is None or dep_timing.finish > timing.start + 1e-3:
+                    continue
+                if gate is None or dep_timing.finish > finished[gate].finish:
+                    gate, via = candidate, dep
+
+        base = finished[gate].finish if gate is not None else 0.0
+        steps.append(PathStep(current, timing.start, timing.finish, timing.finish - base, gate, via))
+        current = gate
+
+    steps.reverse()
+    return steps
+
+
+def implied_component_edges(graph: DependencyGraph) -> List[Dict[str, str]]:
+    """
+    Returns component-level `depends_on` edges that are already implied by
+    another dependency of the same component (transitively redundant edges).
+    """
+    components = {urn for urn in graph.dependencies if urn_type(urn).startswith(COMPONENT_PREFIX)}
+
+    def reachable(start: str, skip: str) -> Set[str]:
+        stack = [dep for dep in graph.dependencies.get(start, ()) if dep != skip]
+        seen: Set[str] = set()
+        while stack:
+            urn = stack.pop()
+            if urn in seen:
+                continue
+            seen.add(urn)
+            stack.extend(graph.dependencies.get(urn, ()))
+        return seen
+
+    redundant = []
+    for urn in sorted(components):
+        for dep in sorted(graph.dependencies.get(urn, ())):
+            if dep in reachable(urn, dep):
+                redundant.append({"from": urn, "to": dep})
+    return redundant
+
+
+def build_report(stack_name: str, operation: str, recorder: EventRecorder, graph: DependencyGraph) -> dict:
+    """Assembles the JSON report (Chrome trace format plus profiler sections)."""
+    path = critical_path(recorder.timings, graph)
+
+    by_component: Dict[str, float] = {}
+    for step in path:
+        component = urn_name(graph.top_level(step.urn))
+        by_component[component] = by_component.get(component, 0.0) + step.added
+
+    trace_events = []
+    for timing in recorder.timings.values():
+        if timing.finish is None:
+            continue
+        trace_events.append({
+            "name": urn_name(timing.urn),
+            "cat": urn_type(timing.urn),
+            "ph": "X",
+            "ts": int(timing.start * 1e6),
+            "dur": int((timing.finish - timing.start) * 1e6),
+            "pid": 1,
+            "tid": urn_name(graph.top_level(timing.urn)),
+            "args": {"urn": timing.urn, "op": timing.op, "failed": timing.failed},
+        })
+
+    return {
+        "stack": stack_name,
+        "operation": operation,
+        "total_seconds": max((t.finish for t in recorder.timings.values() if t.finish is not None), default=0.0),
+        "critical_path": [vars(step) for step in path],
+        "component_seconds": by_component,
+        "component_wide_critical_edges": [
+            {"from": step.urn, "to": step.via, "gating_resource": step.waited_on}
+            for step in path if step.via is not None and step.via != step.waited_on
+        ],
+        "implied_component_edges": implied_component_edges(graph),
+        "traceEvents": trace_events,
+    }
+
+
+def print_summary(report: dict):
+    """Prints a human readable version of `report`."""
+    print(f"\n{report['operation']} of stack '{report['stack']}' took {report['total_seconds']:.1f}s\n")
+
+    print("Critical path:")
+    for step in report["critical_path"]:
+        print(f"  +{step['added']:8.1f}s  {urn_type(step['urn'])}  {urn_name(step['urn'])}")
+
+    print("\nWall-clock added per component:")
+    for component, seconds in sorted(report["component_seconds"].items(), key=lambda kv: -kv[1]):
+        print(f"  {seconds:8.1f}s  {component}")
+
+    if report["component_wide_critical_edges"]:
+        print("\nCritical steps gated by a component-wide depends_on:")
+        for edge in report["component_wide_critical_edges"]:
+            print(f"  {urn_name(edge['from'])} waited on {urn_name(edge['gating_resource'])} "
+                  f"through {urn_name(edge['to'])}")
+
+    if report["implied_component_edges"]:
+        print("\nComponent dependencies already implied by another dependency:")
+        for edge in report["implied_component_edges"]:
+            print(f"  {urn_name(edge['from'])} -> {urn_name(edge['to'])}")
+
+
+def run(stack_name: str, operation: str = "preview", output: str = "profile.json") -> dict:
+    """
+    Runs `operation` ("preview" or "up") on `stack_name`, writes the JSON trace
+    to `output` and returns the report.
+    """
+    stack = select_stack(stack_name)
+    ipam.prepare(stack)
+    recorder = EventRecorder()
+
+    if operation == "up":
+        stack.up(on_event=recorder.on_event)
+    else:
+        stack.preview(on_event=recorder.on_event)
+
+    resources = stack.export_stack().deployment.get("resources", [])
+    report = build_report(stack_name, operation, recorder, build_graph(resources, recorder))
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def add_arguments(parser):
+    parser.add_argument("--stack", required=True, help="Stack to profile")
+    parser.add_argument("--operation", choices=["preview", "up"], default="preview")
+    parser.add_argument("--output", default="profile.json", help="Where to write the JSON trace")
+    parser.set_defaults(func=_main)
+
+
+def _main(args) -> int:
+    report = run(args.stack, args.operation, args.output)
+    print_summary(report)
+    print(f"\nTrace written to {args.output} (open it in chrome://tracing or Perfetto)")
+    return 0
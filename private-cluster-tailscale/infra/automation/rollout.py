@@ -0,0 +1,152 @@
+# automation/rollout.py
+"""
+Concurrent, wave-based rollout of this program across several stacks.
+
+Stacks are grouped into waves (e.g. dev -> staging,staging-eu -> prod,prod-eu).
+Every stack in a wave runs at the same time, bounded by a concurrency cap and a
+per-stack timeout, and the next wave only starts when the whole previous wave
+succeeded. Progress from all stacks is streamed as it arrives, prefixed with the
+stack name.
+
+The Automation API is blocking, so each operation runs in a worker thread; the
+event loop only does scheduling, timeouts and bookkeeping.
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from pulumi import automation as auto
+
+from automation import ipam
+from automation.workspace import op_name, select_stack, urn_name, urn_type
+
+_print_lock = threading.Lock()
+
+
+def _emit(stack_name: str, message: str):
+    with _print_lock:
+        print(f"[{stack_name}] {message}", flush=True)
+
+
+@dataclass
+class StackResult:
+    stack: str
+    operation: str
+    ok: bool
+    seconds: float
+    changes: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class _ProgressPrinter:
+    """Turns engine events into one-line progress messages for a single stack."""
+
+    def __init__(self, stack_name: str):
+        self.stack_name = stack_name
+
+    def on_event(self, event: auto.EngineEvent):
+        if event.resource_pre_event is not None:
+            metadata = event.resource_pre_event.metadata
+            op = op_name(metadata.op)
+            if op != "same":
+                _emit(self.stack_name, f"{op} {urn_type(metadata.urn)} {urn_name(metadata.urn)}")
+        elif event.res_op_failed_event is not None:
+            _emit(self.stack_name, f"FAILED {urn_name(event.res_op_failed_event.metadata.urn)}")
+        elif event.diagnostic_event is not None and event.diagnostic_event.severity == "error":
+            _emit(self.stack_name, f"error: {event.diagnostic_event.message.strip()}")
+
+
+def _run_blocking(stack: auto.Stack, operation: str, printer: _ProgressPrinter) -> Optional[dict]:
+    ipam.prepare(stack)
+    if operation == "up":
+        result = stack.up(on_event=printer.on_event)
+        return result.summary.resource_changes
+    result = stack.preview(on_event=printer.on_event)
+    return result.change_summary
+
+
+async def run_stack(stack_name: str, operation: str, semaphore: asyncio.Semaphore,
+                    timeout: Optional[float]) -> StackResult:
+    """Runs `operation` on one stack once a concurrency slot is free."""
+    async with semaphore:
+        started = time.monotonic()
+        _emit(stack_name, f"starting {operation}")
+        stack = None
+        try:
+            stack = await asyncio.to_thread(select_stack, stack_name)
+            changes = await asyncio.wait_for(
+                asyncio.to_thread(_run_blocking, stack, operation, _ProgressPrinter(stack_name)),
+                timeout=timeout)
+            result = StackResult(stack_name, operation, True, time.monotonic() - started, changes)
+        except asyncio.TimeoutError:
+            if stack is not None:
+                # Ask the engine to stop; the worker thread returns once it does
+                await asyncio.to_thread(stack.cancel)
+            result = StackResult(stack_name, operation, False, time.monotonic() - started,
+                                 error=f"timed out after {timeout:.0f}s")
+        except Exception as e:
+            result = StackResult(stack_name, operation, False, time.monotonic() - started, error=str(e))
+
+        _emit(stack_name, f"{operation} {'succeeded' if result.ok else 'FAILED'} in {result.seconds:.0f}s"
+                          + (f": {result.error}" if result.error else ""))
+        return result
+
+
+async def rollout(waves: Sequence[Sequence[str]], operation: str = "preview",
+                  concurrency: int = 4, timeout: Optional[float] = None) -> List[StackResult]:
+    """
+    Rolls `operation` out wave by wave.
+
+    Args:
+        waves: Stack names per wave, in promotion order
+        operation: "preview" or "up"
+        concurrency: Maximum number of stacks running at the same time
+        timeout: Per-stack timeout in seconds (None for no timeout)
+
+    Returns:
+        Results for every stack that was started; stacks in waves after a
+        failed wave are not started.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[StackResult] = []
+
+    for index, wave in enumerate(waves, start=1):
+        print(f"--- wave {index}/{len(waves)}: {', '.join(wave)}", flush=True)
+        wave_results = await asyncio.gather(*(run_stack(name, operation, semaphore, timeout) for name in wave))
+        results.extend(wave_results)
+
+        failed = [r.stack for r in wave_results if not r.ok]
+        if failed:
+            remaining = [name for later in waves[index:] for name in later]
+            print(f"--- wave {index} failed ({', '.join(failed)}); not promoting to: "
+                  f"{', '.join(remaining) or 'nothing left'}", flush=True)
+            break
+
+    return results
+
+
+def print_summary(results: List[StackResult]):
+    print("\nRollout summary:")
+    for r in results:
+        status = "ok" if r.ok else f"FAILED ({r.error})"
+        changes = ", ".join(f"{op_name(op)}={count}" for op, count in (r.changes or {}).items())
+        print(f"  {r.stack:<24} {r.operation:<8} {r.seconds:7.0f}s  {status}  {changes}")
+
+
+def add_arguments(parser):
+    parser.add_argument("--wave", action="append", required=True, metavar="STACK[,STACK...]",
+                        help="Comma separated stacks of one wave; repeat for later waves")
+    parser.add_argument("--operation", choices=["preview", "up"], default="preview")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum stacks running at once")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-stack timeout in seconds")
+    parser.set_defaults(func=_main)
+
+
+def _main(args) -> int:
+    waves = [[name.strip() for name in wave.split(",") if name.strip()] for wave in args.wave]
+    results = asyncio.run(rollout(waves, args.operation, args.concurrency, args.timeout))
+    print_summary(results)
+    started = sum(len(w) for w in waves) == len(results)
+    return 0 if started and all(r.ok for r in results) else 1
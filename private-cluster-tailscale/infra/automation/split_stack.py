@@ -0,0 +1,138 @@
+# automation/split_stack.py
+"""
+Moves a monolithic `hungry-echoes` stack into the layer stacks (see stacks/).
+
+Resources are moved with `pulumi state move`, which rewrites their URNs into
+the destination stack without touching the cloud resources. Each layer gets its
+components with every descendant (the network layer also takes the project
+bootstrap); the add-on layers also take their Kubernetes provider. The GCP
+provider is shared and gets copied into each destination stack that needs it.
+Afterwards every layer is previewed, dependencies first.
+Anything other than no-ops, output changes and StackReference reads stops the
+migration before that layer is updated. The update is still needed, because
+stack outputs are not moved and the layers above read them.
+
+Run from the infra/ directory:
+    python -m automation split-stack --stack organization/hungry-echoes/dev            # show the plan
+    python -m automation split-stack --stack organization/hungry-echoes/dev --execute
+"""
+import subprocess
+from typing import Dict, List
+
+from pulumi import automation as auto
+
+from automation import ipam
+from automation.workspace import PROJECT_DIR, op_name, select_stack, urn_type
+from config.loader import load_settings
+from stacks.layers import LAYERS, MONOLITH_PROJECT, layer_stack_name
+
+# Operations a migrated layer may show in its first preview
+_ALLOWED_OPS = {"same", "read", "refresh"}
+# Resources that may change or appear anyway: the stack (outputs) and StackReferences (reads)
+_ALLOWED_TYPES = {"pulumi:pulumi:Stack", "pulumi:pulumi:StackReference"}
+
+
+def _descendants(resources: List[dict], urn: str) -> List[str]:
+    children: Dict[str, List[str]] = {}
+    for resource in resources:
+        if resource.get("parent"):
+            children.setdefault(resource["parent"], []).append(resource["urn"])
+    found, pending = [], [urn]
+    while pending:
+        current = pending.pop()
+        found.append(current)
+        pending.extend(children.get(current, []))
+    return found
+
+
+def plan_moves(resources: List[dict], stack: str) -> Dict[str, List[str]]:
+    """URNs to move per layer name; a layer whose components are not in the state gets nothing."""
+    settings = load_settings(stack=stack)
+    k8s_providers = {
+        "app-addons": settings.pulumi_provider.app_cluster_k8s_provider_name,
+        "monitoring-addons": settings.pulumi_provider.monitoring_cluster_k8s_provider_name,
+    }
+    moves: Dict[str, List[str]] = {}
+    for layer in LAYERS:
+        urns = []
+        for resource in resources:
+            if resource["type"] in layer.component_types:
+                urns.extend(_descendants(resources, resource["urn"]))
+        provider = k8s_providers.get(layer.name)
+        if provider:
+            urns.extend(r["urn"] for r in resources
+                        if r["type"] == "pulumi:providers:kubernetes" and r["urn"].endswith(f"::{provider}"))
+        moves[layer.name] = urns
+    return moves
+
+
+def _split_name(stack_name: str):
+    parts = stack_name.split("/")
+    if len(parts) != 3 or parts[1] != MONOLITH_PROJECT:
+        raise ValueError(f"expected a fully qualified stack like organization/{MONOLITH_PROJECT}/dev, got '{stack_name}'")
+    return parts[0], parts[2]
+
+
+def _move(source: str, destination: str, urns: List[str]):
+    subprocess.run(["pulumi", "state", "move", "--source", source, "--dest", destination, "--yes", *urns],
+                   cwd=PROJECT_DIR, check=True)
+
+
+def _unexpected_changes(stack: auto.Stack) -> List[str]:
+    unexpected = []
+
+    def on_event(event: auto.EngineEvent):
+        if event.resource_pre_event is None:
+            return
+        metadata = event.resource_pre_event.metadata
+        op = op_name(metadata.op)
+        if op not in _ALLOWED_OPS and urn_type(metadata.urn) not in _ALLOWED_TYPES:
+            unexpected.append(f"{op} {metadata.urn}")
+
+    stack.preview(on_event=on_event)
+    return unexpected
+
+
+def migrate(source: str, execute: bool = False) -> int:
+    organization, stack = _split_name(source)
+    resources = select_stack(source).export_stack().deployment.get("resources", [])
+    moves = plan_moves(resources, stack)
+
+    for layer in LAYERS:
+        print(f"{layer_stack_name(layer, stack, organization)}: {len(moves[layer.name])} resources")
+        for urn in moves[layer.name]:
+            print(f"  {urn}")
+    if not execute:
+        print("\nNothing moved; run again with --execute")
+        return 0
+
+    for layer in LAYERS:
+        destination = layer_stack_name(layer, stack, organization)
+        auto.create_or_select_stack(stack_name=destination, work_dir=layer.directory)
+        if moves[layer.name]:
+            _move(source, destination, moves[layer.name])
+
+    # Dependencies first: each layer needs the outputs of the ones below it
+    for layer in LAYERS:
+        destination = layer_stack_name(layer, stack, organization)
+        layer_stack = auto.select_stack(stack_name=destination, work_dir=layer.directory)
+        ipam.prepare(layer_stack, layer)
+        unexpected = _unexpected_changes(layer_stack)
+        if unexpected:
+            print(f"{destination}: the preview wants to change resources; stopping before the update:")
+            for change in unexpected:
+                print(f"  {change}")
+            return 1
+        layer_stack.up(on_output=print)
+        print(f"{destination}: migrated")
+
+    print(f"\nEvery layer is deployed. {source} now only holds what was left behind "
+          f"(e.g. the shared GCP provider); remove it with `pulumi stack rm` once it is empty.")
+    return 0
+
+
+def add_arguments(parser):
+    parser.add_argument("--stack", required=True, help=f"Fully qualified monolithic stack, e.g. "
+                                                       f"organization/{MONOLITH_PROJECT}/dev")
+    parser.add_argument("--execute", action="store_true", help="Move the resources and update every layer")
+    parser.set_defaults(func=lambda args: migrate(args.stack, args.execute))
@@ -0,0 +1,306 @@
+# automation/targeted.py
+"""
+Change-detection driven, targeted preview/up.
+
+Every top-level component is fingerprinted from its inputs: the settings
+subtrees it reads (chart versions, digests and other chart settings included)
+and the hash of the modules that build it (chart values live in the code). The
+fingerprints of the last successful targeted `up` are kept with the stack, in
+the `targeted:fingerprints` stack config, together with the version of the
+update that deployed them. A run compares the current fingerprints with them
+and targets only the changed components, their descendants and every
+dependent component, so a change to one add-on does not diff and refresh both
+GKE clusters and the network.
+
+A full run happens when --full is given, when no fingerprints are stored yet
+(first run), when the stack was updated since they were stored (a plain
+`pulumi up` or refresh, or an up from another checkout, which may have deployed
+anything), when a shared input changed (the entry point, the settings loader
+and schema, the kubeconfig helpers, requirements) or when a changed component
+is not in the stack state yet. Inputs that are not fingerprinted, such as the
+Tailscale OAuth credentials and the database password in the environment, need
+a --full run when they change.
+
+Run from the infra/ directory:
+    python -m automation targeted --stack dev              # preview the changed components
+    python -m automation targeted --stack dev --operation up
+    python -m automation targeted --stack dev --operation up --full
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from pulumi import automation as auto
+
+from config.loader import load_settings
+from config.schema import Settings, to_dict
+from automation import ipam
+from automation.workspace import PROJECT_DIR, op_name, select_stack
+
+# Stack config holding the fingerprints of the last successful targeted up
+FINGERPRINT_CONFIG_KEY = "targeted:fingerprints"
+FINGERPRINT_VERSION = 2
+
+# Inputs shared by every component; a change here means a full run
+GLOBAL_KEY = "__global__"
+GLOBAL_SETTINGS = ("pulumi_provider", "kubernetes")
+GLOBAL_SOURCES = ("__main__.py", "Pulumi.yaml", "requirements.txt", "config", "stacks",
+                  "utils/kubernetes.py", "utils/providers.py")
+
+
+@dataclass(frozen=True)
+class Component:
+    name: str
+    # ComponentResource type token, used to find the component in the stack state
+    type: str
+    settings: Tuple[str, ...]
+    sources: Tuple[str, ...]
+    # Components whose outputs this one consumes
+    depends_on: Tuple[str, ...] = ()
+    # ... and those it only consumes in monitoring.scrape.mode "discovery"
+    discovery_depends_on: Tuple[str, ...] = ()
+
+    def dependencies(self, settings: Settings) -> Tuple[str, ...]:
+        if settings.monitoring.scrape.mode == "discovery":
+            return self.depends_on + self.discovery_depends_on
+        return self.depends_on
+
+
+# In deployment order, dependencies first (see __main__.py)
+COMPONENTS: Tuple[Component, ...] = (
+    # Enables the APIs the other components declare; they only need it to exist,
+    # so it has no dependents and a cluster change only re-checks the APIs
+    Component("project_bootstrap", "hungry-echoes:project",
+              settings=("project",),
+              sources=("bootstrap", "networking/network.py", "app_cluster/app_cluster.py",
+                       "monitoring_cluster/monitoring_cluster.py")),
+    Component("network", "hungry-echoes:network",
+              settings=("project", "network", "ingress.mode"),
+              sources=("networking",)),
+    Component("app_cluster", "hungry-echoes:app",
+              settings=("project", "app_cluster", "node_pool", "ingress.mode"),
+              sources=("app_cluster/app_cluster.py", "utils/node_pools.py"),
+              depends_on=("network",)),
+    Component("app_addons", "hungry-echoes:addons",
+              settings=("charts", "monitoring.scrape", "monitoring.remote_write", "monitoring.prometheus",
+                        "tailscale", "ingress"),
+              sources=("app_cluster/app_cluster_add_ons.py", "app_cluster/ingress_profile.py", "app_cluster/gateway.py",
+                       "monitoring_cluster/scrape_config.py",
+                       "utils/helm.py", "utils/prometheus.py", "utils/tailscale.py"),
+              depends_on=("app_cluster",)),
+    Component("app_database", "hungry-echoes:database",
+              settings=("database",),
+              sources=("app_cluster/database.py", "app_cluster/database_init.sql"),
+              depends_on=("app_cluster",)),
+    Component("monitoring_cluster", "hungry-echoes:monitoring",
+              settings=("project", "monitoring_cluster", "node_pool", "monitoring"),
+              sources=("monitoring_cluster/monitoring_cluster.py", "monitoring_cluster/tsdb_sizing.py",
+                       "monitoring_cluster/recording_rules.py", "utils/node_pools.py"),
+              depends_on=("network",)),
+    Component("monitoring_addons", "hungry-echoes:monitoring-addons",
+              settings=("charts", "node_pool", "monitoring", "tailscale"),
+              sources=("monitoring_cluster/monitoring_cluster_add_ons.py", "monitoring_cluster/scrape_config.py",
+                       "monitoring_cluster/recording_rules.py", "monitoring_cluster/tsdb_sizing.py",
+                       "utils/helm.py", "utils/prometheus.py", "utils/node_pools.py", "utils/tailscale.py"),
+              depends_on=("monitoring_cluster",),
+              # The scrape config embeds the app cluster endpoint and the discovery token
+              discovery_depends_on=("app_cluster", "app_addons")),
+)
+
+
+@dataclass
+class Plan:
+    stack: str
+    # None means a full run
+    components: Optional[List[str]]
+    reason: str
+    fingerprints: Dict[str, str]
+
+
+def _source_files(path: str) -> List[str]:
+    full = os.path.join(PROJECT_DIR, path)
+    if os.path.isfile(full):
+        return [path]
+    if not os.path.isdir(full):
+        return []
+    files = []
+    for root, dirs, names in os.walk(full):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        files.extend(os.path.relpath(os.path.join(root, name), PROJECT_DIR)
+                     for name in sorted(names) if name.endswith(".py"))
+    return files
+
+
+def _settings_subtree(settings: Settings, path: str):
+    value = settings
+    for part in path.split("."):
+        value = getattr(value, part)
+    return to_dict(value)
+
+
+def fingerprint(settings: Settings, settings_paths: Sequence[str], sources: Sequence[str]) -> str:
+    """Hashes the given settings subtrees and source files (missing files hash as absent)."""
+    digest = hashlib.sha256()
+    for path in settings_paths:
+        digest.update(f"settings:{path}\0".encode())
+        digest.update(json.dumps(_settings_subtree(settings, path), sort_keys=True).encode())
+    for source in sources:
+        for path in _source_files(source) or [source]:
+            digest.update(f"source:{path}\0".encode())
+            full = os.path.join(PROJECT_DIR, path)
+            if os.path.isfile(full):
+                with open(full, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def fingerprints(settings: Settings) -> Dict[str, str]:
+    """Current fingerprints of every component, plus the shared inputs."""
+    result = {GLOBAL_KEY: fingerprint(settings, GLOBAL_SETTINGS, GLOBAL_SOURCES)}
+    for component in COMPONENTS:
+        result[component.name] = fingerprint(settings, component.settings, component.sources)
+    return result
+
+
+def _last_update(stack: auto.Stack) -> Optional[int]:
+    """Version of the stack's latest update (up, refresh, destroy), from the backend's history."""
+    history = stack.history(page_size=1)
+    return history[0].version if history else None
+
+
+def load_stored(stack: auto.Stack) -> Optional[dict]:
+    """The stored fingerprints record: {"version", "update", "components"}, or None if there is none."""
+    value = stack.get_all_config().get(FINGERPRINT_CONFIG_KEY)
+    if value is None:
+        return None
+    try:
+        stored = json.loads(value.value)
+    except ValueError:
+        return None
+    if stored.get("version") != FINGERPRINT_VERSION:
+        return None
+    return stored
+
+
+def save(stack: auto.Stack, current: Dict[str, str], update: int):
+    """Stores the fingerprints deployed by update version `update` with the stack."""
+    record = {"version": FINGERPRINT_VERSION, "update": update, "components": current}
+    stack.set_config(FINGERPRINT_CONFIG_KEY, auto.ConfigValue(value=json.dumps(record, sort_keys=True)))
+
+
+def with_dependents(changed: Set[str], settings: Settings) -> List[str]:
+    """Returns the changed components plus everything that (transitively) depends on them, in order."""
+    selected = set(changed)
+    for component in COMPONENTS:
+        if any(dependency in selected for dependency in component.dependencies(settings)):
+            selected.add(component.name)
+    return [component.name for component in COMPONENTS if component.name in selected]
+
+
+def plan(stack: auto.Stack, full: bool = False) -> Plan:
+    """Decides which components a run has to touch."""
+    stack_name = stack.name
+    settings = load_settings(stack=stack_name.split("/")[-1])
+    current = fingerprints(settings)
+    record = None if full else load_stored(stack)
+
+    if full:
+        return Plan(stack_name, None, "full run requested", current)
+    if record is None:
+        return Plan(stack_name, None, "no fingerprints stored for this stack", current)
+    if record.get("update") != _last_update(stack):
+        return Plan(stack_name, None, "the stack was updated outside a targeted run since the fingerprints "
+                                      "were stored", current)
+    stored = record.get("components") or {}
+    if stored.get(GLOBAL_KEY) != current[GLOBAL_KEY]:
+        return Plan(stack_name, None, "shared inputs changed (entry point, settings schema, kubeconfig)", current)
+
+    changed = {name for name in current if name != GLOBAL_KEY and stored.get(name) != current[name]}
+    if not changed:
+        return Plan(stack_name, [], "nothing changed since the last successful up", current)
+    selected = with_dependents(changed, settings)
+    if len(selected) == len(COMPONENTS):
+        return Plan(stack_name, None, "every component is affected", current)
+    reason = f"changed: {', '.join(sorted(changed))}"
+    if len(selected) > len(changed):
+        reason += f"; dependents: {', '.join(name for name in selected if name not in changed)}"
+    return Plan(stack_name, selected, reason, current)
+
+
+def target_urns(resources: List[dict], components: Sequence[str]) -> Optional[List[str]]:
+    """
+    URNs that cover the given components: each component, its existing
+    descendants, and a wildcard for children it does not have yet (new
+    resources are only created when they are targeted). None when a component
+    is missing from the state.
+    """
+    types = {component.name: component.type for component in COMPONENTS}
+    children: Dict[str, List[str]] = {}
+    by_type: Dict[str, str] = {}
+    for resource in resources:
+        if resource.get("parent"):
+            children.setdefault(resource["parent"], []).append(resource["urn"])
+        by_type.setdefault(resource["type"], resource["urn"])
+
+    targets = []
+    for name in components:
+        urn = by_type.get(types[name])
+        if urn is None:
+            return None
+        stack_part, project, type_chain, _ = urn.split("::", 3)
+        targets.extend([urn, f"{stack_part}::{project}::{type_chain}$**"])
+        pending = list(children.get(urn, []))
+        while pending:
+            child = pending.pop()
+            targets.append(child)
+            pending.extend(children.get(child, []))
+    return targets
+
+
+def run(stack_name: str, operation: str = "preview", full: bool = False) -> int:
+    stack = select_stack(stack_name)
+    current_plan = plan(stack, full)
+    print(f"[{stack_name}] {current_plan.reason}")
+    if current_plan.components == []:
+        return 0
+
+    ipam.prepare(stack)
+    kwargs = {}
+    if current_plan.components is not None:
+        targets = target_urns(stack.export_stack().deployment.get("resources", []), current_plan.components)
+        if targets is None:
+            print(f"[{stack_name}] a changed component is not deployed yet; running in full")
+        else:
+            print(f"[{stack_name}] targeting {', '.join(current_plan.components)} ({len(targets)} URNs)")
+            # Resources outside the components that consume their outputs (e.g. Kubernetes providers)
+            kwargs = {"target": targets, "target_dependents": True}
+
+    if operation == "up":
+        result = stack.up(on_output=print, **kwargs)
+        changes = result.summary.resource_changes
+        # Only reached on success; a failed up raises and keeps the old fingerprints
+        save(stack, current_plan.fingerprints, result.summary.version)
+    else:
+        changes = stack.preview(on_output=print, **kwargs).change_summary
+    print(f"[{stack_name}] {operation}: " + ", ".join(f"{op_name(op)}={count}" for op, count in (changes or {}).items()))
+    return 0
+
+
+def add_arguments(parser):
+    parser.add_argument("--stack", required=True)
+    parser.add_argument("--operation", choices=["preview", "up"], default="preview")
+    parser.add_argument("--full", action="store_true", help="Ignore the stored fingerprints and run everything")
+    parser.add_argument("--show", action="store_true", help="Only print which components would run")
+    parser.set_defaults(func=_main)
+
+
+def _main(args) -> int:
+    if args.show:
+        current_plan = plan(select_stack(args.stack), args.full)
+        print(current_plan.reason)
+        print("components: " + ("all" if current_plan.components is None
+                                 else ", ".join(current_plan.components) or "none"))
+        return 0
+    return run(args.stack, args.operation, args.full)
@@ -0,0 +1,31 @@
+# automation/tsdb.py
+"""
+Prints the TSDB sizing of the monitoring Prometheus for a stack's settings.
+
+The same estimate is applied by the program when monitoring.tsdb.auto_size is
+on; this shows it (and why) before a preview.
+"""
+import yaml
+
+from config.loader import load_settings
+from config.schema import to_dict
+from monitoring_cluster import tsdb_sizing
+
+
+def run(args) -> int:
+    settings = load_settings(stack=args.stack)
+    sizing = tsdb_sizing.estimate(settings)
+    print(sizing.summary())
+    for warning in sizing.warnings:
+        print(f"warning: {warning}")
+    print()
+    print(yaml.safe_dump(to_dict(sizing), sort_keys=False), end="")
+    print(f"resources: {sizing.resources()}")
+    if not settings.monitoring.tsdb.auto_size:
+        print("\nmonitoring.tsdb.auto_size is off; the program keeps the fixed resources and machine type")
+    return 0
+
+
+def add_arguments(parser):
+    parser.add_argument("--stack", default=None, help="Apply the settings overlay of this stack")
+    parser.set_defaults(func=run)
@@ -0,0 +1,40 @@
+# automation/workspace.py
+"""
+Helpers shared by the Automation API tooling.
+
+The tooling drives this very project directory (the same program `pulumi up`
+runs), so stacks are selected through a LocalWorkspace rooted at infra/.
+"""
+import os
+
+from pulumi import automation as auto
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def select_stack(stack_name: str, create: bool = False) -> auto.Stack:
+    """
+    Returns the Automation API handle for `stack_name` in this project.
+
+    Args:
+        stack_name: Fully qualified or short stack name
+        create: Create the stack when it does not exist yet
+    """
+    if create:
+        return auto.create_or_select_stack(stack_name=stack_name, work_dir=PROJECT_DIR)
+    return auto.select_stack(stack_name=stack_name, work_dir=PROJECT_DIR)
+
+
+def urn_name(urn: str) -> str:
+    """Returns the resource name part of a Pulumi URN."""
+    return urn.split("::")[-1]
+
+
+def urn_type(urn: str) -> str:
+    """Returns the (innermost) resource type of a Pulumi URN."""
+    return urn.split("::")[2].split("$")[-1]
+
+
+def op_name(op) -> str:
+    """Returns the plain name ("create", "same", ...) of an engine OpType."""
+    return getattr(op, "value", op)
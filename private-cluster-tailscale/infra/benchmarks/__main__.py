@@ -0,0 +1,159 @@
+# benchmarks/__main__.py
+"""
+Offline benchmarks for program construction (no cloud access, Pulumi mocks only).
+
+Run from the infra/ directory:
+    python -m benchmarks                               # compare against baseline.json
+    python -m benchmarks --scales 1,10,50 --repeat 5
+    python -m benchmarks --update-baseline             # accept the current numbers
+
+Every data point runs in its own interpreter, so imports, the settings cache and
+the Pulumi runtime start from scratch each time. Results are written as JSON and
+compared against the stored baseline; any regression makes the run exit non-zero.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+INFRA_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Scenario names; kept here so the driver does not import Pulumi itself
+SCENARIO_NAMES = ("baseline", "clusters", "node_pools", "firewall_rules")
+
+
+def _run_worker(scenario: str, n: int, preview: bool, with_charts: bool) -> dict:
+    cmd = [sys.executable, "-m", "benchmarks", "--worker", scenario, str(n)]
+    if not preview:
+        cmd.append("--up")
+    if with_charts:
+        cmd.append("--with-charts")
+    proc = subprocess.run(cmd, cwd=INFRA_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{scenario} n={n} failed:\n{proc.stderr}")
+    # The program may log to stdout; the measurement is the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure(scales: List[int], repeat: int, preview: bool, with_charts: bool) -> Dict[str, Dict[str, dict]]:
+    results: Dict[str, Dict[str, dict]] = {}
+    for scenario in SCENARIO_NAMES:
+        for n in ([1] if scenario == "baseline" else scales):
+            runs = [_run_worker(scenario, n, preview, with_charts) for _ in range(repeat)]
+            counts = {run["resources"] for run in runs}
+            if len(counts) != 1:
+                raise RuntimeError(f"{scenario} n={n}: resource count is not deterministic ({sorted(counts)})")
+            results.setdefault(scenario, {})[str(n)] = {
+                "seconds": statistics.median(run["seconds"] for run in runs),
+                "import_seconds": statistics.median(run["import_seconds"] for run in runs),
+                "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+                "rss_growth_mb": max(run["rss_growth_mb"] for run in runs),
+                "resources": runs[0]["resources"],
+            }
+            point = results[scenario][str(n)]
+            print(f"{scenario:<15} n={n:<5} {point['seconds'] * 1000:9.1f} ms  "
+                  f"(+{point['import_seconds'] * 1000:.0f} ms imports)  "
+                  f"{point['resources']:6d} resources  {point['peak_rss_mb']:7.1f} MiB peak", flush=True)
+    return results
+
+
+def compare(results: dict, baseline: dict, time_tolerance: float, memory_tolerance: float) -> List[str]:
+    """Returns a description of every regression of `results` against `baseline`."""
+    regressions = []
+    for scenario, points in results.items():
+        for n, point in points.items():
+            base = baseline.get(scenario, {}).get(n)
+            if base is None:
+                continue
+            label = f"{scenario} n={n}"
+            if point["resources"] != base["resources"]:
+                regressions.append(f"{label}: resource count {base['resources']} -> {point['resources']} "
+                                   f"(re-run with --update-baseline if intended)")
+            # Ignore sub-50ms differences; they are below the noise of process start-up
+            if point["seconds"] > base["seconds"] * (1 + time_tolerance) and point["seconds"] - base["seconds"] > 0.05:
+                regressions.append(f"{label}: {base['seconds']:.3f}s -> {point['seconds']:.3f}s")
+            if point["peak_rss_mb"] > base["peak_rss_mb"] * (1 + memory_tolerance):
+                regressions.append(f"{label}: peak RSS {base['peak_rss_mb']:.1f} -> {point['peak_rss_mb']:.1f} MiB")
+    return regressions
+
+
+def print_growth(results: dict):
+    """Prints the marginal cost per resource between the smallest and largest scale."""
+    print("\nGrowth (between smallest and largest scale):")
+    for scenario, points in results.items():
+        if len(points) < 2:
+            continue
+        ordered = sorted(points.items(), key=lambda kv: int(kv[0]))
+        (_, low), (_, high) = ordered[0], ordered[-1]
+        added = high["resources"] - low["resources"]
+        if added <= 0:
+            continue
+        print(f"  {scenario:<15} {(high['seconds'] - low['seconds']) / added * 1000:7.2f} ms and "
+              f"{(high['peak_rss_mb'] - low['peak_rss_mb']) / added * 1024:7.1f} KiB per added resource")
+
+
+def _worker(args) -> int:
+    from benchmarks.scenarios import run_scenario
+    scenario, n = args.worker
+    result = run_scenario(scenario, int(n), preview=not args.up, with_charts=args.with_charts)
+    print(json.dumps(result))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,10,50", help="Comma separated scales for the scaling scenarios")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per data point (median time is kept)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.20, help="Allowed relative memory growth")
+    parser.add_argument("--up", action="store_true", help="Evaluate as an update instead of a preview")
+    parser.add_argument("--with-charts", action="store_true",
+                        help="Also build the Helm charts (needs a warm chart cache)")
+    parser.add_argument("--worker", nargs=2, metavar=("SCENARIO", "N"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return _worker(args)
+
+    scales = sorted({int(s) for s in args.scales.split(",") if s.strip()})
+    results = measure(scales, args.repeat, preview=not args.up, with_charts=args.with_charts)
+    print_growth(results)
+
+    document = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# benchmarks/scenarios.py
+"""
+Benchmark scenarios. Each one builds the full `main()` program and then grows
+one dimension of the topology synthetically to `n`.
+"""
+import dataclasses
+import importlib
+import importlib.util
+import os
+import pkgutil
+import resource
+import time
+from typing import Callable, Dict
+
+import pulumi
+import pulumi_gcp
+import pulumi_kubernetes
+from pulumi_gcp import compute, container
+
+from app_cluster.app_cluster import AppCluster
+from benchmarks.mocks import BenchmarkMocks
+from config.loader import load_settings
+from config.schema import Settings
+from networking.ipam import IPAM_CONFIG_KEY, IPAM_CONFIG_NAMESPACE
+from utils.node_pools import node_pool_args
+
+PROGRAM_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '__main__.py')
+
+
+def load_program():
+    """Imports the Pulumi program (infra/__main__.py) as a regular module."""
+    spec = importlib.util.spec_from_file_location("hungry_echoes_program", PROGRAM_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def benchmark_settings(with_charts: bool = False) -> Settings:
+    """Project settings adjusted so the program never leaves the machine."""
+    settings = load_settings()
+    return dataclasses.replace(
+        settings,
+        project=dataclasses.replace(settings.project, check_enabled_services=False),
+        kubernetes=dataclasses.replace(settings.kubernetes, auth_mode="exec"),
+        charts=dataclasses.replace(settings.charts, render_in_preview=with_charts, offline=True),
+    )
+
+
+def _baseline(program, settings: Settings, n: int):
+    program.main(settings)
+
+
+def _clusters(program, settings: Settings, n: int):
+    components = program.main(settings)
+    network = components["network"]
+    for i in range(1, n):
+        cluster_settings = dataclasses.replace(
+            settings, app_cluster=dataclasses.replace(settings.app_cluster, name=f"{settings.app_cluster.name}-{i}"))
+        AppCluster(
+            f"{settings.pulumi_provider.app_cluster_provider_name}-{i}",
+            cluster_settings,
+            vpc_id=network.vpc.id,
+            subnet_id=network.app_subnet.id,
+            allocation=network.allocations["app_cluster"],
+            opts=pulumi.ResourceOptions(depends_on=[network])
+        )
+
+
+def _node_pools(program, settings: Settings, n: int):
+    components = program.main(settings)
+    app_cluster = components["app_cluster"]
+    machine = settings.node_pool.app_cluster
+    for i in range(1, n):
+        cluster_settings = dataclasses.replace(settings.app_cluster, name=f"{settings.app_cluster.name}-{i}")
+        container.NodePool(
+            f"{settings.pulumi_provider.app_cluster_provider_name}-{i}-node-pool",
+            cluster=app_cluster.cluster.name,
+            **node_pool_args(settings, cluster_settings, machine, machine.machine_type),
+            opts=pulumi.ResourceOptions(parent=app_cluster)
+        )
+
+
+def _firewall_rules(program, settings: Settings, n: int):
+    components = program.main(settings)
+    network = components["network"]
+    for i in range(n):
+        compute.Firewall(
+            f"bench-firewall-{i}",
+            network=network.vpc.name,
+            allows=[{"protocol": "tcp", "ports": [str(10000 + i)]}],
+            source_ranges=[network.allocations["app_cluster"].subnet_cidr],
+            opts=pulumi.ResourceOptions(parent=network)
+        )
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "baseline": _baseline,
+    "clusters": _clusters,
+    "node_pools": _node_pools,
+    "firewall_rules": _firewall_rules,
+}
+
+
+def _warm_provider_modules():
+    """
+    The provider SDKs load their resource modules lazily on first attribute
+    access, which costs far more than building the graph. Load them up front so
+    import time is reported separately from construction time.
+    """
+    for package in (pulumi_gcp.compute, pulumi_gcp.container, pulumi_gcp.projects,
+                    pulumi_kubernetes.core.v1, pulumi_kubernetes.helm.v3):
+        for module in pkgutil.iter_modules(package.__path__):
+            importlib.import_module(f"{package.__name__}.{module.name}")
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_scenario(name: str, n: int, preview: bool = True, with_charts: bool = False) -> dict:
+    """
+    Builds scenario `name` at scale `n` under mocks and returns its measurements.
+    Must run in a fresh process: the Pulumi runtime cannot register the same URNs twice.
+    """
+    started = time.perf_counter()
+    program = load_program()
+    _warm_provider_modules()
+    import_seconds = time.perf_counter() - started
+
+    settings = benchmark_settings(with_charts)
+    mocks = BenchmarkMocks()
+    pulumi.runtime.set_mocks(mocks, project="hungry-echoes", stack="bench", preview=preview)
+    # What automation/ipam.py records for a new stack
+    pulumi.runtime.set_config(f"{IPAM_CONFIG_NAMESPACE}:{IPAM_CONFIG_KEY}", "{}")
+
+    @pulumi.runtime.test
+    def build():
+        SCENARIOS[name](program, settings, n)
+
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "n": n,
+        "seconds": elapsed,
+        "import_seconds": import_seconds,
+        "peak_rss_mb": _max_rss_mb(),
+        "rss_growth_mb": _max_rss_mb() - rss_before,
+        "resources": mocks.resources,
+        "invokes": mocks.calls,
+        "resources_by_type": mocks.by_type,
+    }
@@ -0,0 +1,99 @@
+# bootstrap/project_bootstrap.py
+from typing import Iterable, List
+
+import pulumi
+from pulumi import ComponentResource, ResourceOptions, Output, log
+from pulumi_gcp import projects
+
+from bootstrap.services import ServiceLookupError, enabled_services
+from config.schema import Settings
+
+
+def required_services(components: Iterable[type]) -> List[str]:
+    """The union of the `REQUIRED_SERVICES` the given component classes declare, sorted."""
+    return sorted({service for component in components for service in getattr(component, "REQUIRED_SERVICES", ())})
+
+
+class ProjectBootstrap(ComponentResource):
+    """
+    Project-level bootstrap that enables the GCP APIs the components need,
+    exactly once per project, however many clusters declare the same API.
+
+    Every required API always gets a `projects.Service`, so the state does not
+    depend on what the project looks like when the program runs (and the
+    Services the app cluster used to own keep their aliases). Enabling an API
+    that is already enabled is a no-op, and Services never disable their API
+    on destroy. With `project.check_enabled_services` on, the enabled APIs are
+    looked up in one bulk read (see bootstrap/services.py), only to report
+    which ones this run is actually going to enable.
+
+    `ready` resolves to the enabled APIs once all of them are enabled; the
+    clusters depend on this component so they never start before it.
+    """
+
+    def __init__(self, name: str, settings: Settings, services: Iterable[str],
+                 legacy_parent: str = None, opts: ResourceOptions = None):
+        """
+        Args:
+            name: Resource name of the component
+            settings: Shared, already validated settings
+            services: APIs to enable (see `required_services`)
+            legacy_parent: Name of the app cluster component that used to own the
+                Service resources; they are aliased so an existing stack keeps them
+            opts: Resource options
+        """
+        super().__init__('hungry-echoes:project', name, None, opts)
+
+        self._name = name
+        self.settings = settings
+        self.required = sorted(set(services))
+        self._report_missing_services()
+        self.services = [self._enable_service(service, legacy_parent) for service in self.required]
+
+        # Depends on every Service
+        self.ready = Output.all(*[service.service for service in self.services]).apply(
+            lambda _: self.required)
+
+        self.register_outputs({
+            "enabled_services": self.ready,
+        })
+
+    def _report_missing_services(self):
+        """Logs which required APIs are not enabled yet (informational only)."""
+        project_id = self.settings.project.id
+        if not self.settings.project.check_enabled_services:
+            return
+        try:
+            enabled = enabled_services(project_id)
+        except ServiceLookupError as e:
+            log.warn(f"Could not list the enabled APIs of {project_id}: {e}", resource=self)
+            return
+        missing = [service for service in self.required if service not in enabled]
+        log.info(f"{len(self.required) - len(missing)} of {len(self.required)} required APIs are "
+                 f"already enabled in {project_id}"
+                 + (f"; enabling {', '.join(missing)}" if missing else ""), resource=self)
+
+    def _enable_service(self, service: str, legacy_parent: str = None) -> projects.Service:
+        aliases = []
+        if legacy_parent:
+            # Previously created by the app cluster as f"{name}-{service}"
+            aliases.append(pulumi.Alias(
+                name=f"{legacy_parent}-{service}",
+                parent=pulumi.create_urn(legacy_parent, 'hungry-echoes:app'),
+            ))
+        return projects.Service(
+            f"{self._name}-{service}",
+            project=self.settings.project.id,
+            service=service,
+            disable_dependent_services=False,
+            disable_on_destroy=False,
+            opts=ResourceOptions(
+                parent=self,
+                aliases=aliases,
+                # Add custom timeouts for API enablement
+                custom_timeouts=pulumi.CustomTimeouts(
+                    create="10m",
+                    delete="10m"
+                )
+            )
+        )
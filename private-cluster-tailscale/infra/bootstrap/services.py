@@ -0,0 +1,70 @@
+# bootstrap/services.py
+"""
+Bulk lookup of the APIs already enabled in a project.
+
+One paged `services.list` call against the Service Usage API answers for
+every API at once, instead of one read per `projects.Service`. The answer is
+cached per project for the rest of the process, so every component (and every
+stack an automation command drives in this process) shares a single lookup.
+"""
+import threading
+from typing import Dict, FrozenSet
+
+from utils.kubernetes import get_access_token
+
+SERVICE_USAGE_URL = "https://serviceusage.googleapis.com/v1/projects/{project}/services"
+_PAGE_SIZE = 200
+_TIMEOUT_SECONDS = 30
+
+
+class ServiceLookupError(RuntimeError):
+    """Raised when the enabled services of a project cannot be listed."""
+
+
+_lock = threading.Lock()
+_enabled: Dict[str, FrozenSet[str]] = {}
+
+
+def _list_enabled(project_id: str) -> FrozenSet[str]:
+    # Imported lazily, like google-auth in utils/kubernetes.py
+    import requests
+
+    headers = {"Authorization": f"Bearer {get_access_token()}"}
+    params = {"filter": "state:ENABLED", "pageSize": _PAGE_SIZE}
+    enabled = set()
+    while True:
+        response = requests.get(SERVICE_USAGE_URL.format(project=project_id), headers=headers,
+                                params=params, timeout=_TIMEOUT_SECONDS)
+        if response.status_code != 200:
+            raise ServiceLookupError(f"listing the services of {project_id} returned "
+                                     f"{response.status_code}: {response.text[:200]}")
+        body = response.json()
+        # Names look like projects/<number>/services/container.googleapis.com
+        enabled.update(service["name"].rsplit("/", 1)[-1] for service in body.get("services", []))
+        if not body.get("nextPageToken"):
+            return frozenset(enabled)
+        params["pageToken"] = body["nextPageToken"]
+
+
+def enabled_services(project_id: str) -> FrozenSet[str]:
+    """
+    Returns the APIs enabled in the project, listed once per process.
+
+    Args:
+        project_id: The GCP project to look at
+
+    Returns:
+        The enabled service names, e.g. "compute.googleapis.com"
+
+    Raises:
+        ServiceLookupError: When the list cannot be read (no credentials, no permission, no network)
+    """
+    with _lock:
+        if project_id not in _enabled:
+            try:
+                _enabled[project_id] = _list_enabled(project_id)
+            except ServiceLookupError:
+                raise
+            except Exception as e:
+                raise ServiceLookupError(f"listing the services of {project_id} failed: {e}")
+        return _enabled[project_id]
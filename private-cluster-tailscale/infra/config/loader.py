@@ -0,0 +1,107 @@
+# config/loader.py
+"""
+Loads settings.yaml once per process and hands out a validated `Settings` object.
+
+Stack-specific overrides live next to the base file as `settings.<stack>.yaml`
+and are deep-merged on top of it (mappings merge, everything else replaces).
+Parsed files are cached on (mtime, size) and on their content hash, so repeated
+Automation API runs in the same process only re-parse files that really changed.
+"""
+import hashlib
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+from config.schema import Settings, SettingsError, build
+
+DEFAULT_SETTINGS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'settings.yaml')
+
+_lock = threading.Lock()
+
+# path -> (stat key, content digest, parsed document)
+_file_cache: Dict[str, Tuple[Tuple[int, int], str, Any]] = {}
+
+# (base digest, overlay digest) -> validated settings
+_settings_cache: Dict[Tuple[str, Optional[str]], Settings] = {}
+
+
+def overlay_path(stack: str, path: str = DEFAULT_SETTINGS_PATH) -> str:
+    """Returns the path of the per-stack overlay for the given base settings file."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{stack}{ext}"
+
+
+def _read(path: str) -> Tuple[str, Any]:
+    """Returns (digest, parsed document) for `path`, re-parsing only when the content changed."""
+    st = os.stat(path)
+    stat_key = (st.st_mtime_ns, st.st_size)
+
+    cached = _file_cache.get(path)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1], cached[2]
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+
+    if cached is not None and cached[1] == digest:
+        # Touched but unchanged; refresh the stat key and keep the parsed document
+        _file_cache[path] = (stat_key, digest, cached[2])
+        return digest, cached[2]
+
+    try:
+        document = yaml.safe_load(raw) or {}
+    except yaml.YAMLError as e:
+        raise SettingsError(f"Failed to parse {path}: {e}") from e
+
+    _file_cache[path] = (stat_key, digest, document)
+    return digest, document
+
+
+def _merge(base: Any, overlay: Any) -> Any:
+    """Deep-merges `overlay` on top of `base` without mutating either."""
+    if isinstance(base, dict) and isinstance(overlay, dict):
+        merged = dict(base)
+        for key, value in overlay.items():
+            merged[key] = _merge(base[key], value) if key in base else value
+        return merged
+    return overlay
+
+
+def load_settings(stack: Optional[str] = None, path: str = DEFAULT_SETTINGS_PATH) -> Settings:
+    """
+    Returns the validated settings for `stack`.
+
+    Args:
+        stack: Optional stack name; when `settings.<stack>.yaml` exists it is merged on top
+        path: Path of the base settings file
+
+    Raises:
+        SettingsError: If a file cannot be parsed or the merged result is invalid
+        OSError: If the base settings file cannot be read
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        base_digest, base_doc = _read(path)
+
+        overlay_digest, overlay_doc = None, None
+        if stack:
+            stack_path = overlay_path(stack, path)
+            if os.path.exists(stack_path):
+                overlay_digest, overlay_doc = _read(stack_path)
+
+        key = (base_digest, overlay_digest)
+        settings = _settings_cache.get(key)
+        if settings is None:
+            document = _merge(base_doc, overlay_doc) if overlay_doc is not None else base_doc
+            settings = _settings_cache[key] = build(Settings, document)
+        return settings
+
+
+def clear_settings_cache():
+    """Drops every cached file and settings object."""
+    with _lock:
+        _file_cache.clear()
+        _settings_cache.clear()
@@ -0,0 +1,893 @@
+# config/schema.py
+"""
+Typed, immutable view of settings.yaml.
+
+Every section of the settings file maps onto a frozen, slotted dataclass.
+The generic `build` function walks the parsed YAML alongside the dataclass
+type hints, so adding a new setting only means adding a field here.
+"""
+import ipaddress
+import re
+from dataclasses import dataclass, fields, is_dataclass, MISSING
+from typing import Any, Dict, Optional, Tuple, Union, get_args, get_origin, get_type_hints
+
+
+class SettingsError(ValueError):
+    """Raised when the settings file (or a stack overlay) fails validation."""
+
+
+def _check_cidr(value: str, key: str):
+    try:
+        ipaddress.ip_network(value, strict=True)
+    except ValueError as e:
+        raise ValueError(f"'{key}' is not a valid CIDR block: {e}")
+
+
+@dataclass(frozen=True, slots=True)
+class ProjectSettings:
+    id: str
+    # List the enabled APIs once to report the missing ones (see bootstrap/)
+    check_enabled_services: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class ProviderNames:
+    """Pulumi resource names used by the components."""
+    network_provider_name: str
+    app_cluster_provider_name: str
+    app_cluster_k8s_provider_name: str
+    app_addons_provider_name: str
+    monitoring_cluster_provider_name: str
+    monitoring_cluster_k8s_provider_name: str
+    monitoring_addons_provider_name: str
+    project_bootstrap_name: str = "project-bootstrap"
+    app_database_name: str = "app-database"
+
+
+@dataclass(frozen=True, slots=True)
+class ClusterNetworkSettings:
+    """
+    Subnet of one cluster. Ranges that are set are pinned; the others are
+    allocated by networking/ipam.py with the given prefix lengths.
+    """
+    region: str
+    # Pulumi resource name of the subnet (defaults to "<key>-subnet")
+    resource_name: Optional[str] = None
+    # Secondary ranges are named "<range_prefix>-pods" / "<range_prefix>-services"
+    range_prefix: Optional[str] = None
+    subnet_cidr: Optional[str] = None
+    pods_cidr: Optional[str] = None
+    services_cidr: Optional[str] = None
+    master_ipv4_cidr_block: Optional[str] = None
+    subnet_prefix: int = 20
+    pods_prefix: int = 16
+    services_prefix: int = 20
+    # Set for clusters with a private control plane (GKE requires a /28)
+    control_plane_prefix: Optional[int] = None
+
+    def __post_init__(self):
+        for name in ("subnet_cidr", "pods_cidr", "services_cidr", "master_ipv4_cidr_block"):
+            if getattr(self, name):
+                _check_cidr(getattr(self, name), name)
+        for name in ("subnet_prefix", "pods_prefix", "services_prefix", "control_plane_prefix"):
+            value = getattr(self, name)
+            if value is not None and not 8 <= value <= 29:
+                raise ValueError(f"'{name}' must be between 8 and 29, got {value}")
+
+
+@dataclass(frozen=True, slots=True)
+class IpamSettings:
+    supernet: str = "10.0.0.0/8"
+    control_plane_supernet: str = "172.16.0.0/16"
+    # Remember allocations in the `ipam_allocations` stack output so they stay stable
+    persist: bool = True
+
+    def __post_init__(self):
+        _check_cidr(self.supernet, "supernet")
+        _check_cidr(self.control_plane_supernet, "control_plane_supernet")
+
+
+FIREWALL_PROTOCOLS = ("all", "tcp", "udp", "sctp", "icmp", "esp", "ah", "ipip")
+FIREWALL_CLUSTER_RANGES = ("subnet", "pods", "services")
+# Source alias for the Google Cloud load balancer health check ranges
+HEALTH_CHECK_SOURCE = "health_checks"
+
+
+@dataclass(frozen=True, slots=True)
+class FirewallAllowSettings:
+    protocol: str
+    # Ports or port ranges ("8081", "30000-32767"); empty means every port
+    ports: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        if self.protocol not in FIREWALL_PROTOCOLS:
+            raise ValueError(f"protocol must be one of {', '.join(FIREWALL_PROTOCOLS)}, got '{self.protocol}'")
+        if self.ports and self.protocol not in ("tcp", "udp", "sctp"):
+            raise ValueError(f"ports can only be set for tcp, udp and sctp, not '{self.protocol}'")
+        for port in self.ports:
+            bounds = port.split("-")
+            if len(bounds) > 2 or not all(b.isdigit() and int(b) <= 65535 for b in bounds) \
+                    or int(bounds[0]) > int(bounds[-1]):
+                raise ValueError(f"'{port}' is not a valid port or port range")
+
+
+@dataclass(frozen=True, slots=True)
+class FirewallIntentSettings:
+    """
+    One declared flow: `sources` may reach `targets` with the `allow` protocols.
+    Intents are compiled into the smallest equivalent rule set by networking/firewall.py.
+    """
+    # Pulumi resource name; kept by the compiled rule this intent ends up in
+    name: str
+    # Cluster keys of network.clusters, "health_checks" or literal CIDRs
+    sources: Tuple[str, ...]
+    allow: Tuple[FirewallAllowSettings, ...]
+    # Cluster keys; empty means every instance in the VPC
+    targets: Tuple[str, ...] = ()
+    # Which ranges of a source cluster the traffic may come from
+    source_cluster_ranges: Tuple[str, ...] = FIREWALL_CLUSTER_RANGES
+
+    def __post_init__(self):
+        if not self.sources:
+            raise ValueError(f"firewall intent '{self.name}' has no sources")
+        if not self.allow:
+            raise ValueError(f"firewall intent '{self.name}' allows nothing")
+        for cluster_range in self.source_cluster_ranges:
+            if cluster_range not in FIREWALL_CLUSTER_RANGES:
+                raise ValueError(f"source_cluster_ranges must be among {', '.join(FIREWALL_CLUSTER_RANGES)}, "
+                                 f"got '{cluster_range}'")
+
+
+@dataclass(frozen=True, slots=True)
+class FirewallSettings:
+    intents: Tuple[FirewallIntentSettings, ...]
+
+
+FLOW_LOG_INTERVALS = ("INTERVAL_5_SEC", "INTERVAL_30_SEC", "INTERVAL_1_MIN",
+                      "INTERVAL_5_MIN", "INTERVAL_10_MIN", "INTERVAL_15_MIN")
+FLOW_LOG_METADATA = ("INCLUDE_ALL_METADATA", "EXCLUDE_ALL_METADATA")
+
+
+@dataclass(frozen=True, slots=True)
+class NetworkProfileSettings:
+    """Data plane trade-offs applied to the VPC, every subnet and every node pool."""
+    # VPC MTU; unset keeps the GCP default (1460), 8896 is the largest (jumbo frames).
+    # The MTU cannot be changed in place: setting it replaces the VPC
+    mtu: Optional[int] = None
+    # Google Virtual NIC on the nodes (higher bandwidth, needed above ~16 Gbps);
+    # only sent to GKE when enabled, so existing node pools are left as they are
+    gvnic: bool = False
+    flow_logs: bool = True
+    flow_log_interval: str = "INTERVAL_5_SEC"
+    flow_sampling: float = 0.5
+    flow_log_metadata: str = "INCLUDE_ALL_METADATA"
+
+    def __post_init__(self):
+        if self.mtu is not None and not 1300 <= self.mtu <= 8896:
+            raise ValueError(f"mtu must be between 1300 and 8896, got {self.mtu}")
+        if self.flow_log_interval not in FLOW_LOG_INTERVALS:
+            raise ValueError(f"flow_log_interval must be one of {', '.join(FLOW_LOG_INTERVALS)}, "
+                             f"got '{self.flow_log_interval}'")
+        if not 0.0 < self.flow_sampling <= 1.0:
+            raise ValueError(f"flow_sampling must be in (0, 1], got {self.flow_sampling}")
+        if self.flow_log_metadata not in FLOW_LOG_METADATA:
+            raise ValueError(f"flow_log_metadata must be one of {', '.join(FLOW_LOG_METADATA)}, "
+                             f"got '{self.flow_log_metadata}'")
+
+
+@dataclass(frozen=True, slots=True)
+class NetworkSettings:
+    name: str
+    clusters: Dict[str, ClusterNetworkSettings]
+    health_check_ranges: Tuple[str, ...]
+    firewall: FirewallSettings
+    # Name of the entry of `profiles` that is applied
+    profile: str
+    profiles: Dict[str, NetworkProfileSettings]
+    ipam: IpamSettings = IpamSettings()
+
+    @property
+    def active_profile(self) -> NetworkProfileSettings:
+        return self.profiles[self.profile]
+
+    def __post_init__(self):
+        for cidr in self.health_check_ranges:
+            _check_cidr(cidr, "health_check_ranges")
+        if not self.clusters:
+            raise ValueError("at least one cluster network is required")
+        if self.profile not in self.profiles:
+            raise ValueError(f"network profile '{self.profile}' is not defined; "
+                             f"known profiles: {', '.join(self.profiles) or 'none'}")
+
+        names = [intent.name for intent in self.firewall.intents]
+        if len(names) != len(set(names)):
+            raise ValueError("firewall intent names must be unique")
+        for intent in self.firewall.intents:
+            for source in intent.sources:
+                if source not in self.clusters and source != HEALTH_CHECK_SOURCE:
+                    _check_cidr(source, f"firewall intent '{intent.name}' source")
+            for target in intent.targets:
+                if target not in self.clusters:
+                    raise ValueError(f"firewall intent '{intent.name}' targets unknown cluster '{target}'")
+
+
+@dataclass(frozen=True, slots=True)
+class ClusterSettings:
+    name: str
+    region: str
+    zone: str
+
+    def __post_init__(self):
+        if not self.zone.startswith(f"{self.region}-"):
+            raise ValueError(f"zone '{self.zone}' is not in region '{self.region}'")
+
+
+LOCATION_POLICIES = ("BALANCED", "ANY")
+
+
+@dataclass(frozen=True, slots=True)
+class AutoscalingSettings:
+    """Cluster autoscaler bounds of a node pool (per zone)."""
+    enabled: bool = False
+    min_nodes: int = 1
+    max_nodes: int = 3
+    # "BALANCED" spreads nodes evenly across zones; "ANY" prefers zones with capacity (best for spot)
+    location_policy: str = "BALANCED"
+
+    def __post_init__(self):
+        if self.min_nodes < 0 or self.max_nodes < 1 or self.min_nodes > self.max_nodes:
+            raise ValueError(f"autoscaling needs 0 <= min_nodes <= max_nodes and max_nodes >= 1, "
+                             f"got {self.min_nodes}..{self.max_nodes}")
+        if self.location_policy not in LOCATION_POLICIES:
+            raise ValueError(f"location_policy must be one of {', '.join(LOCATION_POLICIES)}, "
+                             f"got '{self.location_policy}'")
+
+
+@dataclass(frozen=True, slots=True)
+class SpotPoolSettings:
+    """Optional pool of spot VMs next to the regular pool, scaled up from zero."""
+    enabled: bool = False
+    # Defaults to the machine type of the regular pool
+    machine_type: Optional[str] = None
+    autoscaling: AutoscalingSettings = AutoscalingSettings(
+        enabled=True, min_nodes=0, max_nodes=3, location_policy="ANY")
+
+
+@dataclass(frozen=True, slots=True)
+class MachineSettings:
+    machine_type: str
+    # Size of the pool when autoscaling is off (defaults to node_pool.node_count)
+    node_count: Optional[int] = None
+    autoscaling: AutoscalingSettings = AutoscalingSettings()
+    spot_pool: SpotPoolSettings = SpotPoolSettings()
+
+
+@dataclass(frozen=True, slots=True)
+class NodePoolSettings:
+    node_count: int
+    node_version: str
+    image_type: str
+    disk_size_gb: int
+    disk_type: str
+    app_cluster: MachineSettings
+    monitoring_cluster: MachineSettings
+
+
+@dataclass(frozen=True, slots=True)
+class ChartSettings:
+    """A Helm chart pinned to a version (and optionally to the sha256 of its archive)."""
+    chart: str
+    repo: str
+    version: str
+    digest: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class ReleaseSettings:
+    """Helm semantics used when charts are installed as single Helm releases."""
+    atomic: bool = True
+    wait: bool = True
+    timeout: int = 600
+    cleanup_on_fail: bool = True
+
+
+INSTALL_MODES = ("chart", "release")
+
+
+@dataclass(frozen=True, slots=True)
+class ChartsSettings:
+    ingress_nginx: ChartSettings
+    tailscale_operator: ChartSettings
+    cache_dir: str = "~/.cache/hungry-echoes/charts"
+    # Never touch the network; every chart must already be in the cache
+    offline: bool = False
+    # Render the add-on charts from the local cache during preview as well
+    render_in_preview: bool = True
+    # "chart": every rendered object is its own Pulumi resource
+    # "release": each chart is a single tracked Helm release
+    install_mode: str = "chart"
+    # Chart mode only: hand the rendered objects over to Helm (see utils/helm.py)
+    migrate_to_release: bool = False
+    release: ReleaseSettings = ReleaseSettings()
+
+    def __post_init__(self):
+        if self.install_mode not in INSTALL_MODES:
+            raise ValueError(f"install_mode must be one of {', '.join(INSTALL_MODES)}, got '{self.install_mode}'")
+
+
+_DURATION = re.compile(r"^(\d+)(ms|s|m|h|d|w)$")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def duration_seconds(value: str) -> float:
+    """Parses a Prometheus style duration ("500ms", "15s", "1m", "2h", "15d")."""
+    match = _DURATION.match(value)
+    if not match:
+        raise ValueError(f"'{value}' is not a duration like 15s, 1m or 500ms")
+    return int(match[1]) * _DURATION_SECONDS[match[2]]
+
+
+SCRAPE_MODES = ("discovery", "egress", "agent")
+
+
+@dataclass(frozen=True, slots=True)
+class ScrapeJobSettings:
+    """One scrape job for app cluster pods."""
+    name: str
+    namespace: str = "default"
+    # Kubernetes label selector of the pods; they also need the prometheus.io/scrape annotation
+    pod_selector: str = "app=hungry-echoes"
+    interval: str = "15s"
+    timeout: str = "10s"
+    # Target used in "egress" mode (a single tailnet service in front of the pods): the
+    # <service>.<namespace>.svc.cluster.local:<port> address of the egress Service that
+    # MonitoringClusterAddons creates for it in the monitoring namespace
+    egress_target: Optional[str] = None
+    # MagicDNS name of that tailnet service (tailnet specific, so there is no default;
+    # required in "egress" mode)
+    egress_tailnet_fqdn: Optional[str] = None
+    # TSDB sizing: most pods the job scrapes at once, and the series each one exposes
+    expected_targets: int = 5
+    series_per_target: int = 220
+
+    def __post_init__(self):
+        if duration_seconds(self.timeout) > duration_seconds(self.interval):
+            raise ValueError(f"scrape job '{self.name}': timeout {self.timeout} exceeds interval {self.interval}")
+        if self.expected_targets < 1 or self.series_per_target < 1:
+            raise ValueError(f"scrape job '{self.name}': expected_targets and series_per_target must be positive")
+
+
+@dataclass(frozen=True, slots=True)
+class ScrapeSettings:
+    # "egress" (default): each job's egress_target, load-balanced across the pods by the tailnet service
+    # "discovery" (opt-in): one target per app pod, found through the app cluster API with a
+    #   long-lived service account token exported as a stack output
+    # "agent": a Prometheus agent in the app cluster scrapes the pods and pushes (see RemoteWriteSettings)
+    mode: str = "egress"
+    scrape_interval: str = "15s"
+    evaluation_interval: str = "15s"
+    jobs: Tuple[ScrapeJobSettings, ...] = (
+        ScrapeJobSettings(name="hungry-echoes",
+                          egress_target="prometheus-egress.monitoring.svc.cluster.local:8081"),
+    )
+
+    def __post_init__(self):
+        if self.mode not in SCRAPE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SCRAPE_MODES)}, got '{self.mode}'")
+        duration_seconds(self.scrape_interval)
+        duration_seconds(self.evaluation_interval)
+        names = [job.name for job in self.jobs]
+        if len(names) != len(set(names)) or "prometheus" in names:
+            raise ValueError("scrape job names must be unique and not 'prometheus'")
+
+
+@dataclass(frozen=True, slots=True)
+class RemoteWriteQueueSettings:
+    """Prometheus remote-write queue tuning (queue_config)."""
+    # Samples buffered per shard; a few times max_samples_per_send
+    capacity: int = 10000
+    min_shards: int = 1
+    max_shards: int = 10
+    max_samples_per_send: int = 2000
+    batch_send_deadline: str = "5s"
+    min_backoff: str = "30ms"
+    max_backoff: str = "5s"
+
+    def __post_init__(self):
+        if not 1 <= self.min_shards <= self.max_shards:
+            raise ValueError(f"need 1 <= min_shards <= max_shards, got {self.min_shards}..{self.max_shards}")
+        if self.capacity < self.max_samples_per_send:
+            raise ValueError("capacity must be at least max_samples_per_send")
+        for value in (self.batch_send_deadline, self.min_backoff, self.max_backoff):
+            duration_seconds(value)
+
+
+@dataclass(frozen=True, slots=True)
+class RemoteWriteSettings:
+    """Agent mode: the app cluster agent pushes to the monitoring Prometheus over the tailnet."""
+    # Tailnet machine name of the receiver, and its full MagicDNS name for the app cluster egress
+    # (tailnet specific, so there is no default; required in agent mode)
+    receiver_hostname: str = "monitoring-prometheus"
+    receiver_tailnet_fqdn: Optional[str] = None
+    # Only series whose name matches are pushed
+    keep_metrics: str = "hungry_echoes_.*|go_sql_.*|process_cpu_seconds_total|up"
+    # The agent WAL lives on a persistent volume and keeps this much data while the receiver is unreachable
+    wal_size: str = "10Gi"
+    wal_max_time: str = "6h"
+    queue: RemoteWriteQueueSettings = RemoteWriteQueueSettings()
+
+    def __post_init__(self):
+        duration_seconds(self.wal_max_time)
+        try:
+            re.compile(self.keep_metrics)
+        except re.error as e:
+            raise ValueError(f"keep_metrics is not a valid regular expression: {e}")
+
+
+@dataclass(frozen=True, slots=True)
+class PrometheusSettings:
+    """The Prometheus server of the monitoring cluster."""
+    image: str = "prom/prometheus:v2.45.0"
+    # Sidecar that reloads Prometheus when the generated config changes
+    config_reloader_image: str = "quay.io/prometheus-operator/prometheus-config-reloader:v0.76.0"
+
+
+@dataclass(frozen=True, slots=True)
+class RecordingRuleSettings:
+    """Precomputed hungry_echoes_* aggregates (see monitoring_cluster/recording_rules.py)."""
+    enabled: bool = True
+    # One set of rules per rate window
+    windows: Tuple[str, ...] = ("5m", "1h")
+
+    def __post_init__(self):
+        if not self.windows:
+            raise ValueError("windows must not be empty")
+        for window in self.windows:
+            duration_seconds(window)
+
+
+@dataclass(frozen=True, slots=True)
+class TsdbSettings:
+    """Inputs of the TSDB sizing calculator (see monitoring_cluster/tsdb_sizing.py)."""
+    retention: str = "15d"
+    # Size limit of the TSDB volume (an emptyDir on the node boot disk)
+    max_disk_gb: int = 20
+    # Extra head series from pod churn (rollouts, rescheduling), as a fraction of the steady state
+    series_churn: float = 0.3
+    # Compressed block size per sample, and head memory per active series
+    bytes_per_sample: float = 1.7
+    memory_per_series_kib: float = 8.0
+    # Spare capacity on top of the estimates
+    headroom: float = 0.3
+    # Apply the estimate: Prometheus resources, retention size and the monitoring pool machine type
+    auto_size: bool = True
+
+    def __post_init__(self):
+        duration_seconds(self.retention)
+        if self.max_disk_gb < 1:
+            raise ValueError("max_disk_gb must be positive")
+        for name in ("series_churn", "headroom"):
+            if getattr(self, name) < 0:
+                raise ValueError(f"{name} must not be negative")
+        if self.bytes_per_sample <= 0 or self.memory_per_series_kib <= 0:
+            raise ValueError("bytes_per_sample and memory_per_series_kib must be positive")
+
+
+@dataclass(frozen=True, slots=True)
+class MonitoringSettings:
+    prometheus: PrometheusSettings = PrometheusSettings()
+    scrape: ScrapeSettings = ScrapeSettings()
+    remote_write: RemoteWriteSettings = RemoteWriteSettings()
+    rules: RecordingRuleSettings = RecordingRuleSettings()
+    tsdb: TsdbSettings = TsdbSettings()
+
+    def __post_init__(self):
+        if self.scrape.mode == "agent" and not self.remote_write.receiver_tailnet_fqdn:
+            raise ValueError("remote_write.receiver_tailnet_fqdn is required in agent mode")
+
+
+KUBERNETES_AUTH_MODES = ("exec", "token")
+
+
+@dataclass(frozen=True, slots=True)
+class KubernetesSettings:
+    """How the Kubernetes providers authenticate against the GKE clusters."""
+    # "exec": gke-gcloud-auth-plugin. "token" (opt-in): mint a cached access token
+    # in-process; it lands in the provider state and expires there, so refresh or
+    # destroy from state fails with 401 once it has expired
+    auth_mode: str = "exec"
+    # Re-mint a cached token when fewer than this many seconds of validity are left
+    token_refresh_margin: int = 300
+
+    def __post_init__(self):
+        if self.auth_mode not in KUBERNETES_AUTH_MODES:
+            raise ValueError(f"auth_mode must be one of {', '.join(KUBERNETES_AUTH_MODES)}, got '{self.auth_mode}'")
+
+
+EXTERNAL_TRAFFIC_POLICIES = ("Local", "Cluster")
+
+
+@dataclass(frozen=True, slots=True)
+class IngressProfileSettings:
+    """Sizing and tuning of the NGINX ingress controller (see app_cluster/ingress_profile.py)."""
+    # Horizontal pod autoscaler bounds and CPU target
+    min_replicas: int = 2
+    max_replicas: int = 4
+    target_cpu_utilization: int = 70
+    # PodDisruptionBudget; only created by the chart when min_replicas > 1
+    min_available: int = 1
+    # NGINX workers per pod ("auto" is one per vCPU of the node) and connections per worker
+    worker_processes: str = "auto"
+    worker_connections: int = 16384
+    # Idle keepalive connections each worker keeps to the upstream pods, and their reuse limits
+    upstream_keepalive_connections: int = 320
+    upstream_keepalive_requests: int = 10000
+    upstream_keepalive_timeout: int = 60
+    # "Local" keeps the client IP and skips the second kube-proxy hop between nodes
+    external_traffic_policy: str = "Local"
+    cpu_request: str = "100m"
+    memory_request: str = "128Mi"
+    # Unset means no limit: a throttled controller adds latency to every request
+    cpu_limit: Optional[str] = None
+    memory_limit: Optional[str] = "256Mi"
+    # Additional ingress-nginx ConfigMap keys (e.g. proxy-buffering)
+    extra_config: Optional[Dict[str, str]] = None
+
+    def __post_init__(self):
+        if not 1 <= self.min_replicas <= self.max_replicas:
+            raise ValueError(f"need 1 <= min_replicas <= max_replicas, got {self.min_replicas}..{self.max_replicas}")
+        if not 0 <= self.min_available < self.min_replicas:
+            raise ValueError("min_available must leave at least one replica disruptable")
+        if not 1 <= self.target_cpu_utilization <= 100:
+            raise ValueError("target_cpu_utilization must be a percentage")
+        if self.worker_processes != "auto" and not (self.worker_processes.isdigit() and int(self.worker_processes)):
+            raise ValueError(f"worker_processes must be 'auto' or a positive number, got '{self.worker_processes}'")
+        if self.worker_connections < 1024:
+            raise ValueError("worker_connections should be at least 1024")
+        if self.upstream_keepalive_connections < 0 or self.upstream_keepalive_requests < 1 \
+                or self.upstream_keepalive_timeout < 1:
+            raise ValueError("upstream keepalive settings must be positive")
+        if self.external_traffic_policy not in EXTERNAL_TRAFFIC_POLICIES:
+            raise ValueError(f"external_traffic_policy must be one of {', '.join(EXTERNAL_TRAFFIC_POLICIES)}, "
+                             f"got '{self.external_traffic_policy}'")
+
+
+@dataclass(frozen=True, slots=True)
+class GatewaySettings:
+    """Container-native load balancing through the GKE Gateway API (see app_cluster/gateway.py)."""
+    gateway_class: str = "gke-l7-global-external-managed"
+    hostnames: Tuple[str, ...] = ("hungryechoes.com",)
+    # The Service the route sends traffic to; its pods are the NEG endpoints
+    namespace: str = "default"
+    service: str = "hungry-echoes"
+    service_port: int = 80
+    # Container port the load balancer and its health checks reach on the pods
+    backend_port: int = 8080
+    health_check_path: str = "/?message=ready"
+    timeout_seconds: int = 30
+    connection_draining_seconds: int = 30
+
+    def __post_init__(self):
+        if not self.hostnames:
+            raise ValueError("the gateway needs at least one hostname")
+        for port in (self.service_port, self.backend_port):
+            if not 1 <= port <= 65535:
+                raise ValueError(f"{port} is not a valid port")
+        if not self.health_check_path.startswith("/"):
+            raise ValueError("health_check_path must start with '/'")
+
+
+INGRESS_MODES = ("nginx", "gateway")
+
+
+@dataclass(frozen=True, slots=True)
+class IngressSettings:
+    # "nginx": L4 load balancer -> NGINX controller -> kube-proxy -> pod
+    # "gateway": Google L7 load balancer -> pod, through NEGs (no in-cluster proxy)
+    mode: str = "nginx"
+    # Name of the entry of `profiles` that is applied (nginx mode)
+    profile: str = "default"
+    profiles: Optional[Dict[str, IngressProfileSettings]] = None
+    gateway: GatewaySettings = GatewaySettings()
+
+    @property
+    def active_profile(self) -> IngressProfileSettings:
+        return (self.profiles or {}).get(self.profile, IngressProfileSettings())
+
+    def __post_init__(self):
+        if self.mode not in INGRESS_MODES:
+            raise ValueError(f"mode must be one of {', '.join(INGRESS_MODES)}, got '{self.mode}'")
+        if self.profiles and self.profile not in self.profiles:
+            raise ValueError(f"ingress profile '{self.profile}' is not defined; "
+                             f"known profiles: {', '.join(self.profiles)}")
+
+
+@dataclass(frozen=True, slots=True)
+class PostgresSettings:
+    """The app's Postgres server (see app_cluster/database.py)."""
+    image: str = "postgres:16.4"
+    # Server parameters, passed to postgres as `-c` flags. PgBouncer holds the
+    # client connections, so max_connections only has to cover its server pools
+    max_connections: int = 100
+    shared_buffers_mb: int = 128
+    effective_cache_size_mb: int = 384
+    work_mem_mb: int = 4
+    maintenance_work_mem_mb: int = 64
+    # SSD: random reads cost about as much as sequential ones and many can be in flight
+    random_page_cost: float = 1.1
+    effective_io_concurrency: int = 200
+    # Additional parameters (e.g. log_min_duration_statement)
+    extra_parameters: Optional[Dict[str, str]] = None
+    cpu_request: str = "250m"
+    # Unset means no limit; a throttled database slows down every request
+    cpu_limit: Optional[str] = None
+    # Request and limit: the memory parameters above count on this much memory being there.
+    # The default leaves room for other pods on an e2-small node (checked by preflight)
+    memory: str = "512Mi"
+    # StorageClass created for the data volume, on SSD persistent disks
+    storage_class: str = "postgres-ssd"
+    disk_type: str = "pd-ssd"
+    storage_size: str = "10Gi"
+
+    def __post_init__(self):
+        if self.max_connections < 10:
+            raise ValueError("max_connections should be at least 10")
+        for name in ("shared_buffers_mb", "effective_cache_size_mb", "work_mem_mb", "maintenance_work_mem_mb"):
+            if getattr(self, name) < 1:
+                raise ValueError(f"'{name}' must be positive")
+        if self.disk_type not in ("pd-balanced", "pd-ssd", "hyperdisk-balanced"):
+            raise ValueError(f"disk_type should be an SSD-backed disk type, got '{self.disk_type}'")
+
+
+PGBOUNCER_POOL_MODES = ("session", "transaction", "statement")
+
+
+@dataclass(frozen=True, slots=True)
+class PgBouncerSettings:
+    """Connection pool in front of Postgres; the app connects to it instead of the server."""
+    image: str = "edoburu/pgbouncer:v1.23.1-p2"
+    replicas: int = 2
+    # "transaction": a server connection is only held for the duration of a transaction
+    pool_mode: str = "transaction"
+    max_client_conn: int = 1000
+    # Server connections per replica (for the single database/user pair)
+    default_pool_size: int = 20
+    min_pool_size: int = 5
+    # Extra connections a replica may open when clients wait longer than reserve_pool_timeout
+    reserve_pool_size: int = 5
+    reserve_pool_timeout: int = 3
+    server_idle_timeout: int = 600
+    cpu_request: str = "100m"
+    memory_request: str = "64Mi"
+    cpu_limit: Optional[str] = None
+    memory_limit: Optional[str] = "128Mi"
+
+    @property
+    def max_server_connections(self) -> int:
+        """Server connections all replicas may open at once."""
+        return self.replicas * (self.default_pool_size + self.reserve_pool_size)
+
+    def __post_init__(self):
+        if self.pool_mode not in PGBOUNCER_POOL_MODES:
+            raise ValueError(f"pool_mode must be one of {', '.join(PGBOUNCER_POOL_MODES)}, got '{self.pool_mode}'")
+        if self.replicas < 1:
+            raise ValueError("pgbouncer replicas must be positive")
+        if not 0 <= self.min_pool_size <= self.default_pool_size:
+            raise ValueError("need 0 <= min_pool_size <= default_pool_size")
+        if self.max_client_conn < self.default_pool_size:
+            raise ValueError("max_client_conn must be at least default_pool_size")
+
+
+@dataclass(frozen=True, slots=True)
+class DatabaseSettings:
+    """The app database: Postgres behind a PgBouncer pool (see app_cluster/database.py)."""
+    enabled: bool = False
+    namespace: str = "default"
+    name: str = "phrases"
+    user: str = "he-user"
+    postgres: PostgresSettings = PostgresSettings()
+    pgbouncer: PgBouncerSettings = PgBouncerSettings()
+
+
+TAILSCALE_PROXY_MODES = ("kernel", "userspace")
+
+
+@dataclass(frozen=True, slots=True)
+class TailscaleProxyClassSettings:
+    """ProxyClass applied to every proxy the operator of a cluster creates."""
+    name: str = "hungry-echoes"
+    # "kernel": privileged proxies routing through the kernel (iptables/nftables), the fastest path
+    # "userspace": unprivileged netstack proxies (slower, but no privileged pods)
+    mode: str = "kernel"
+    cpu_request: str = "100m"
+    memory_request: str = "128Mi"
+    # Unset means no limit; throttling a proxy throttles every flow through it
+    cpu_limit: Optional[str] = None
+    memory_limit: Optional[str] = "256Mi"
+    # Accept subnet routes advertised by other tailnet devices
+    accept_routes: bool = False
+
+    def __post_init__(self):
+        if self.mode not in TAILSCALE_PROXY_MODES:
+            raise ValueError(f"mode must be one of {', '.join(TAILSCALE_PROXY_MODES)}, got '{self.mode}'")
+
+
+@dataclass(frozen=True, slots=True)
+class TailscaleProxyGroupSettings:
+    """An HA egress ProxyGroup: egress Services annotated with it spread over its replicas."""
+    enabled: bool = False
+    name: str = "cross-cluster-egress"
+    replicas: int = 2
+
+    def __post_init__(self):
+        if self.replicas < 1:
+            raise ValueError("proxy group replicas must be positive")
+
+
+@dataclass(frozen=True, slots=True)
+class TailscaleConnectorSettings:
+    """A Connector that advertises cluster ranges as a subnet router (and optionally an exit node)."""
+    enabled: bool = False
+    hostname: Optional[str] = None
+    # CIDRs, e.g. the cluster's pod or service range
+    advertise_routes: Tuple[str, ...] = ()
+    exit_node: bool = False
+
+    def __post_init__(self):
+        for route in self.advertise_routes:
+            _check_cidr(route, "advertise_routes")
+        if self.enabled and not (self.advertise_routes or self.exit_node):
+            raise ValueError("an enabled connector needs advertise_routes or exit_node")
+
+
+@dataclass(frozen=True, slots=True)
+class TailscaleClusterSettings:
+    """Tailscale operator options of one cluster."""
+    operator_hostname: str
+    egress_group: TailscaleProxyGroupSettings = TailscaleProxyGroupSettings()
+    connector: TailscaleConnectorSettings = TailscaleConnectorSettings()
+
+
+@dataclass(frozen=True, slots=True)
+class TailscaleSettings:
+    """Proxies of the Tailscale operators that carry the cross-cluster traffic."""
+    app_cluster: TailscaleClusterSettings = TailscaleClusterSettings(operator_hostname="app-tailscale-operator")
+    monitoring_cluster: TailscaleClusterSettings = TailscaleClusterSettings(
+        operator_hostname="monitoring-tailscale-operator")
+    proxy_class: TailscaleProxyClassSettings = TailscaleProxyClassSettings()
+    # Tags of the proxy group and connector devices (must be owned by the operator's tag in the ACLs)
+    tags: Tuple[str, ...] = ("tag:k8s",)
+
+    def __post_init__(self):
+        for cluster in (self.app_cluster, self.monitoring_cluster):
+            if cluster.egress_group.enabled and self.proxy_class.mode != "kernel":
+                raise ValueError("egress proxy groups forward with iptables/nftables; "
+                                 "they need proxy_class.mode 'kernel'")
+
+
+@dataclass(frozen=True, slots=True)
+class PreflightSettings:
+    """Local validation of the settings before any cloud call (see preflight/)."""
+    enabled: bool = True
+    # Catalog of zones, machine types and GKE versions; defaults to preflight/catalog.json
+    catalog: Optional[str] = None
+    # Older catalogs still apply, with a warning to refresh them, but what they do not know only warns
+    catalog_max_age_days: int = 90
+
+    def __post_init__(self):
+        if self.catalog_max_age_days < 1:
+            raise ValueError("catalog_max_age_days must be positive")
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Root of the validated settings tree."""
+    project: ProjectSettings
+    pulumi_provider: ProviderNames
+    network: NetworkSettings
+    app_cluster: ClusterSettings
+    monitoring_cluster: ClusterSettings
+    node_pool: NodePoolSettings
+    charts: ChartsSettings
+    kubernetes: KubernetesSettings = KubernetesSettings()
+    monitoring: MonitoringSettings = MonitoringSettings()
+    ingress: IngressSettings = IngressSettings()
+    database: DatabaseSettings = DatabaseSettings()
+    tailscale: TailscaleSettings = TailscaleSettings()
+    preflight: PreflightSettings = PreflightSettings()
+
+
+_HINTS_CACHE: Dict[type, Dict[str, Any]] = {}
+
+
+def _hints(cls: type) -> Dict[str, Any]:
+    hints = _HINTS_CACHE.get(cls)
+    if hints is None:
+        hints = _HINTS_CACHE[cls] = get_type_hints(cls)
+    return hints
+
+
+def _convert(hint: Any, value: Any, path: str) -> Any:
+    """Converts a parsed YAML value into the type described by `hint`."""
+    origin = get_origin(hint)
+
+    if origin is Union:
+        args = [a for a in get_args(hint) if a is not type(None)]
+        if value is None:
+            return None
+        return _convert(args[0], value, path)
+
+    if is_dataclass(hint):
+        return build(hint, value, path)
+
+    if origin is tuple:
+        if not isinstance(value, (list, tuple)):
+            raise SettingsError(f"'{path}' must be a list, got {type(value).__name__}")
+        item_hint = get_args(hint)[0]
+        return tuple(_convert(item_hint, item, f"{path}[{i}]") for i, item in enumerate(value))
+
+    if origin is dict:
+        if not isinstance(value, dict):
+            raise SettingsError(f"'{path}' must be a mapping, got {type(value).__name__}")
+        value_hint = get_args(hint)[1]
+        return {str(k): _convert(value_hint, v, f"{path}.{k}") for k, v in value.items()}
+
+    if hint is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise SettingsError(f"'{path}' must be a number, got {value!r}")
+        return float(value)
+
+    if hint is int and isinstance(value, bool):
+        raise SettingsError(f"'{path}' must be an integer, got {value!r}")
+
+    if hint is Any or isinstance(value, hint):
+        return value
+
+    raise SettingsError(f"'{path}' must be of type {hint.__name__}, got {value!r}")
+
+
+def build(cls: type, data: Any, path: str = ""):
+    """
+    Builds an instance of the settings dataclass `cls` from parsed YAML.
+
+    Unknown keys are rejected so typos fail loudly instead of being ignored.
+    """
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise SettingsError(f"'{path or '<root>'}' must be a mapping, got {type(data).__name__}")
+
+    hints = _hints(cls)
+    known = set()
+    kwargs = {}
+    for f in fields(cls):
+        known.add(f.name)
+        key_path = f"{path}.{f.name}" if path else f.name
+        if f.name in data:
+            kwargs[f.name] = _convert(hints[f.name], data[f.name], key_path)
+        elif f.default is MISSING and f.default_factory is MISSING:
+            if is_dataclass(hints[f.name]):
+                # Allow whole sections to be omitted when every field has a default
+                kwargs[f.name] = build(hints[f.name], {}, key_path)
+            else:
+                raise SettingsError(f"Missing required setting '{key_path}'")
+
+    unknown = sorted(set(data) - known)
+    if unknown:
+        raise SettingsError(f"Unknown setting(s) under '{path or '<root>'}': {', '.join(unknown)}")
+
+    try:
+        return cls(**kwargs)
+    except ValueError as e:
+        raise SettingsError(f"Invalid setting under '{path or '<root>'}': {e}") from e
+
+
+def to_dict(obj: Any) -> Any:
+    """Converts a settings object back into plain dicts and lists (e.g. for exports)."""
+    if is_dataclass(obj):
+        return {f.name: to_dict(getattr(obj, f.name)) for f in fields(obj)}
+    if isinstance(obj, tuple):
+        return [to_dict(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: to_dict(value) for key, value in obj.items()}
+    return obj
@@ -1,8 +1,11 @@
 # monitoring_cluster/monitoring_cluster.py
 from pulumi import ComponentResource, ResourceOptions, Output
 from pulumi_gcp import container, compute
-import yaml
-import os
+
+from config.schema import Settings
+from networking.ipam import ClusterAllocation
+from monitoring_cluster import tsdb_sizing
+from utils.node_pools import RELEASE_CHANNEL, node_pool_args
 
 class MonitoringCluster(ComponentResource):
     """
@@ -10,24 +13,34 @@ class MonitoringCluster(ComponentResource):
     for monitoring workloads. Uses networking configuration from
     the shared network component.
     """
-    
+
+    # GCP APIs the cluster needs, enabled by the project bootstrap (see bootstrap/)
+    REQUIRED_SERVICES = (
+        "container.googleapis.com",
+        "compute.googleapis.com",
+        "monitoring.googleapis.com",
+        "logging.googleapis.com",
+    )
+
     def __init__(self, 
                  name: str, 
+                 settings: Settings,
                  vpc_id: Output,            # Add network parameters
                  subnet_id: Output,         # Add subnet parameters
+                 allocation: ClusterAllocation,
                  opts: ResourceOptions = None):
         super().__init__('hungry-echoes:monitoring', name, None, opts)
 
-        # Load cluster configuration
-        config_path = os.path.join(os.path.dirname(__file__), '../settings.yaml')
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        # Shared, already validated settings
+        self.settings = settings
+        # Range names and control plane block, as allocated by the network
+        self.allocation = allocation
 
         # Create the monitoring GKE cluster
         self.cluster = container.Cluster(
             name,
-            name=self.config['monitoring_cluster']['name'],
-            location=self.config['monitoring_cluster']['zone'],
+            name=self.settings.monitoring_cluster.name,
+            location=self.settings.monitoring_cluster.zone,
             
             # Remove default node pool
             initial_node_count=1,
@@ -39,20 +52,20 @@ class MonitoringCluster(ComponentResource):
 
             # IP allocation policy
             ip_allocation_policy={
-                "cluster_secondary_range_name": "monitoring-pods",
-                "services_secondary_range_name": "monitoring-services"
+                "cluster_secondary_range_name": self.allocation.pods_range_name,
+                "services_secondary_range_name": self.allocation.services_range_name
             },
 
             # Private cluster configuration
             private_cluster_config={
                 "enable_private_nodes": False,
                 "enable_private_endpoint": False,
-                "master_ipv4_cidr_block": "172.16.1.0/28"  # Different from app cluster
+                "master_ipv4_cidr_block": self.allocation.master_ipv4_cidr_block
             },
 
             # Use STABLE release channel for monitoring
             release_channel={
-                "channel": "STABLE"
+                "channel": RELEASE_CHANNEL
             },
 
             # Improve maintenance window configuration
@@ -64,7 +77,7 @@ class MonitoringCluster(ComponentResource):
 
             # Enable workload identity
             workload_identity_config={
-                "workload_pool": f"{self.config['project']['id']}.svc.id.goog"
+                "workload_pool": f"{self.settings.project.id}.svc.id.goog"
             },
 
             # Disable deletion protection for development
@@ -74,40 +87,34 @@ class MonitoringCluster(ComponentResource):
         )
 
         # Create node pool
-        self.node_pool = container.NodePool(
-            f"{name}-node-pool",
-            name=f"{self.config['monitoring_cluster']['name']}-node-pool",
-            location=self.config['monitoring_cluster']['zone'],
-            cluster=self.cluster.name,
-            node_count=self.config['node_pool']['node_count'],
-
-            version=self.config['node_pool']['node_version'],
-
-            node_config={
-                "machine_type": self.config['node_pool']['monitoring_cluster']['machine_type'],
-                "disk_size_gb": self.config['node_pool']['disk_size_gb'],
-                "disk_type": self.config['node_pool']['disk_type'],
-                "image_type": self.config['node_pool']['image_type'],
-
-                # OAuth scopes
-                "oauth_scopes": [
-                    "https://www.googleapis.com/auth/logging.write",
-                    "https://www.googleapis.com/auth/monitoring",
-                    "https://www.googleapis.com/auth/devstorage.read_only"
-                ],
-
-                # Enable workload identity
-                "workload_metadata_config": {
-                    "mode": "GKE_METADATA"
-                }
-            },
+        self.node_pool = self._create_node_pool(name)
 
-            opts=ResourceOptions(parent=self)
-        )
+        # Optional spot VM pool for burst capacity
+        self.spot_node_pool = None
+        if self.settings.node_pool.monitoring_cluster.spot_pool.enabled:
+            self.spot_node_pool = self._create_node_pool(name, spot=True)
 
         # Register outputs
         self.register_outputs({
             "cluster_endpoint": self.cluster.endpoint,
             "cluster_name": self.cluster.name,
             "cluster_location": self.cluster.location
-        })
\ No newline at end of file
+        })
+
+    def _create_node_pool(self, name: str, spot: bool = False):
+        """
+        Creates the regular node pool, or the spot VM pool when `spot` is set.
+        """
+        machine = self.settings.node_pool.monitoring_cluster
+        machine_type = machine.machine_type
+        if self.settings.monitoring.tsdb.auto_size:
+            # Large enough for Prometheus as sized from the scrape settings
+            machine_type = tsdb_sizing.estimate(self.settings).machine_type
+        suffix = "spot-node-pool" if spot else "node-pool"
+        return container.NodePool(
+            f"{name}-{suffix}",
+            cluster=self.cluster.name,
+            # Size, version and node configuration (see utils/node_pools.py)
+            **node_pool_args(self.settings, self.settings.monitoring_cluster, machine, machine_type, spot),
+            opts=ResourceOptions(parent=self)
+        )
\ No newline at end of file
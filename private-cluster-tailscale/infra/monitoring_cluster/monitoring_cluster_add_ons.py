@@ -1,17 +1,42 @@
-from pulumi import ComponentResource, ResourceOptions, runtime
-from pulumi_kubernetes.helm.v3 import Chart, ChartOpts
-from pulumi_kubernetes.core.v1 import Namespace
+# monitoring_cluster/monitoring_cluster_add_ons.py
+from pulumi import ComponentResource, Output, ResourceOptions, export, runtime, log
+from pulumi_kubernetes.apps.v1 import Deployment
+from pulumi_kubernetes.core.v1 import ConfigMap, Namespace, Secret, Service
+import base64
 import os
+from typing import List
+
+from config.schema import Settings, to_dict
+from monitoring_cluster import recording_rules, scrape_config, tsdb_sizing
+from monitoring_cluster.scrape_config import APP_CLUSTER_SECRET_DIR, AppClusterDiscovery
+from utils.prometheus import CONFIG_DIR, config_reloader_container
+from utils.tailscale import deploy_proxies, egress_annotations, install_operator
 
 class MonitoringClusterAddons(ComponentResource):
     """
     Installs monitoring components (Prometheus) on the GKE monitoring cluster
-    using Helm charts for easier management and updates.
+    using Helm charts for easier management and updates. Charts are rendered
+    from the local chart cache, so they also take part in previews.
+
+    Prometheus itself, its generated scrape config and recording rules are
+    managed here too (see monitoring_cluster/scrape_config.py and
+    recording_rules.py). Its retention and resources come from the TSDB sizing
+    calculator (monitoring_cluster/tsdb_sizing.py) unless auto sizing is off.
     """
 
-    def __init__(self, name: str, opts: ResourceOptions = None):
+    def __init__(self, name: str, settings: Settings, discovery: AppClusterDiscovery = None,
+                 opts: ResourceOptions = None):
         super().__init__('hungry-echoes:monitoring-addons', name, None, opts)
 
+        self.settings = settings
+        render_charts = settings.charts.render_in_preview or not runtime.is_dry_run()
+
+        self.tsdb_sizing = tsdb_sizing.estimate(settings)
+        log.info(self.tsdb_sizing.summary(), resource=self)
+        for warning in self.tsdb_sizing.warnings:
+            log.warn(warning, resource=self)
+        export('tsdb_sizing', to_dict(self.tsdb_sizing))
+
         # Create monitoring namespace
         self.monitoring_namespace = Namespace(
             "monitoring-namespace",
@@ -21,6 +46,13 @@ class MonitoringClusterAddons(ComponentResource):
             opts=ResourceOptions(parent=self)
         )
 
+        # Prometheus with a scrape config generated from the app cluster's pods
+        if settings.monitoring.scrape.mode == "discovery" and discovery is None:
+            raise ValueError("monitoring.scrape.mode 'discovery' needs the app cluster discovery settings")
+        self.prometheus = self._deploy_prometheus(discovery)
+        if settings.monitoring.scrape.mode == "egress":
+            self.egress_services = self._deploy_egress_services()
+
         #### Opted for a simpler deployment via static manifests; will revisit this if needed!
 
         # # Deploy Prometheus only during apply phase
@@ -90,40 +122,194 @@ class MonitoringClusterAddons(ComponentResource):
             opts=ResourceOptions(parent=self)
         )
 
-        # Deploy Tailscale Operator only during apply phase
-        if not runtime.is_dry_run():
-            # Fetch Tailscale OAuth credentials from environment variables
-            monitoring_tailscale_client_id = os.getenv('MONITORING_TAILSCALE_OAUTH_CLIENT_ID')
-            monitoring_tailscale_client_secret = os.getenv('MONITORING_TAILSCALE_OAUTH_SECRET')
-
-            if not monitoring_tailscale_client_id or not monitoring_tailscale_client_secret:
-                raise ValueError(
-                    "MONITORING_TAILSCALE_OAUTH_CLIENT_ID and MONITORING_TAILSCALE_OAUTH_SECRET "
-                    "environment variables must be set"
-                )
+        # Fetch Tailscale OAuth credentials from environment variables
+        monitoring_tailscale_client_id = os.getenv('MONITORING_TAILSCALE_OAUTH_CLIENT_ID')
+        monitoring_tailscale_client_secret = os.getenv('MONITORING_TAILSCALE_OAUTH_SECRET')
+        has_credentials = bool(monitoring_tailscale_client_id and monitoring_tailscale_client_secret)
 
+        if not has_credentials and not runtime.is_dry_run():
+            raise ValueError(
+                "MONITORING_TAILSCALE_OAUTH_CLIENT_ID and MONITORING_TAILSCALE_OAUTH_SECRET "
+                "environment variables must be set"
+            )
 
-        if not runtime.is_dry_run():
+        # Deploy Tailscale Operator from the local chart cache
+        self.tailscale_proxies = []
+        if render_charts and has_credentials:
             # Install Tailscale Operator
-            self.tailscale = Chart(
-                "tailscale-monitoring",  
-                ChartOpts(
-                    chart="tailscale-operator",
-                    fetch_opts={
-                        "repo": "https://pkgs.tailscale.com/helmcharts/"
-                    },
-                    namespace=self.tailscale_namespace.metadata["name"],
-                    values={
-                        "oauth": {
-                            "clientId": monitoring_tailscale_client_id,
-                            "clientSecret": monitoring_tailscale_client_secret
-                        },
-                        "operator": {
-                            "hostname": "monitoring-tailscale-operator"
-                        }
-                    }
-                ),
+            self.tailscale = install_operator(
+                "tailscale-monitoring",
+                settings,
+                settings.tailscale.monitoring_cluster,
+                monitoring_tailscale_client_id,
+                monitoring_tailscale_client_secret,
                 opts=ResourceOptions(parent=self, depends_on=[self.tailscale_namespace])
             )
+            # Proxy defaults (also for the remote-write receiver), HA egress group and connector
+            self.tailscale_proxies = deploy_proxies(
+                "monitoring", settings, settings.tailscale.monitoring_cluster,
+                opts=ResourceOptions(parent=self, depends_on=[self.tailscale])
+            )
+        else:
+            log.warn("Skipping Tailscale deployment during preview (charts.render_in_preview is off "
+                     "or the Tailscale OAuth credentials are not set).")
+
+        self.register_outputs({})
+
+    def _deploy_prometheus(self, discovery: AppClusterDiscovery = None) -> Deployment:
+        """
+        Deploys Prometheus with its generated config. A config-reloader sidecar
+        applies config changes (e.g. a new API server address) without
+        restarting the pod, so the emptyDir TSDB survives them.
+        """
+        monitoring = self.settings.monitoring
+        prometheus, scrape, tsdb = monitoring.prometheus, monitoring.scrape, monitoring.tsdb
+        namespace = self.monitoring_namespace.metadata["name"]
+        child_opts = ResourceOptions(parent=self, depends_on=[self.monitoring_namespace])
+
+        rule_files = [f"{CONFIG_DIR}/{recording_rules.RULES_FILE}"] if monitoring.rules.enabled else []
+        if tsdb.auto_size:
+            retention = [f"--storage.tsdb.retention.time={self.tsdb_sizing.retention}",
+                         f"--storage.tsdb.retention.size={self.tsdb_sizing.retention_size_gb}GB"]
+            resources = self.tsdb_sizing.resources()
+        else:
+            retention = [f"--storage.tsdb.retention.time={tsdb.retention}"]
+            resources = {
+                "requests": {"cpu": "500m", "memory": "500Mi"},
+                "limits": {"cpu": "1", "memory": "1Gi"}
+            }
+
+        volumes = [
+            {"name": "prometheus-config", "config_map": {"name": "prometheus-config"}},
+            # Over its size limit the emptyDir gets the pod evicted; retention.size stays below it
+            {"name": "prometheus-storage", "empty_dir": {"size_limit": f"{tsdb.max_disk_gb}Gi"}},
+        ]
+        mounts = [
+            {"name": "prometheus-config", "mount_path": "/etc/prometheus/"},
+            {"name": "prometheus-storage", "mount_path": "/prometheus"},
+        ]
+
+        if scrape.mode == "discovery":
+            config = discovery.api_server.apply(
+                lambda api_server: scrape_config.render(scrape, api_server, rule_files))
+            Secret(
+                "prometheus-app-cluster",
+                metadata={"name": "prometheus-app-cluster", "namespace": namespace},
+                string_data={
+                    "token": discovery.token,
+                    "ca.crt": discovery.ca_certificate.apply(
+                        lambda ca: base64.b64decode(ca).decode()),
+                },
+                opts=child_opts
+            )
+            volumes.append({"name": "app-cluster", "secret": {"secret_name": "prometheus-app-cluster"}})
+            mounts.append({"name": "app-cluster", "mount_path": APP_CLUSTER_SECRET_DIR, "read_only": True})
+        else:
+            config = Output.from_input(scrape_config.render(scrape, rule_files=rule_files))
+
+        data = {"prometheus.yml": config}
+        if monitoring.rules.enabled:
+            data[recording_rules.RULES_FILE] = recording_rules.render(monitoring.rules, scrape)
+        config_map = ConfigMap(
+            "prometheus-config",
+            metadata={"name": "prometheus-config", "namespace": namespace},
+            data=data,
+            opts=child_opts
+        )
+
+        deployment = Deployment(
+            "prometheus",
+            metadata={"name": "prometheus", "namespace": namespace},
+            spec={
+                "replicas": 1,
+                "selector": {"match_labels": {"app": "prometheus"}},
+                "template": {
+                    "metadata": {"labels": {"app": "prometheus"}},
+                    "spec": {
+                        "containers": [
+                            {
+                                "name": "prometheus",
+                                "image": prometheus.image,
+                                "args": [
+                                    "--config.file=/etc/prometheus/prometheus.yml",
+                                    "--storage.tsdb.path=/prometheus",
+                                    *retention,
+                                    "--log.level=debug",
+                                    # Lets the reloader apply config changes in place
+                                    "--web.enable-lifecycle",
+                                    # Agent mode: accept the samples pushed by the app cluster agent
+                                    *(["--web.enable-remote-write-receiver"] if scrape.mode == "agent" else []),
+                                ],
+                                "ports": [{"container_port": 9090, "name": "http"}],
+                                "volume_mounts": mounts,
+                                "resources": resources
+                            },
+                            config_reloader_container(prometheus.config_reloader_image)
+                        ],
+                        "volumes": volumes
+                    }
+                }
+            },
+            opts=ResourceOptions(parent=self, depends_on=[config_map])
+        )
+
+        Service(
+            "prometheus-service",
+            metadata={"name": "prometheus", "namespace": namespace},
+            spec={
+                "selector": {"app": "prometheus"},
+                "ports": [{"port": 9090, "target_port": 9090, "name": "http"}],
+                "type": "ClusterIP"
+            },
+            opts=child_opts
+        )
+
+        if scrape.mode == "agent":
+            # Remote-write receiver, reachable from the app cluster over the tailnet
+            Service(
+                "prometheus-receiver",
+                metadata={
+                    "name": "prometheus-receiver",
+                    "namespace": namespace,
+                    "annotations": {"tailscale.com/hostname": self.settings.monitoring.remote_write.receiver_hostname}
+                },
+                spec={
+                    "type": "LoadBalancer",
+                    "load_balancer_class": "tailscale",
+                    "selector": {"app": "prometheus"},
+                    "ports": [{"port": 9090, "target_port": 9090, "name": "http"}]
+                },
+                opts=child_opts
+            )
+        return deployment
 
-        self.register_outputs({})
\ No newline at end of file
+    def _deploy_egress_services(self) -> List[Service]:
+        """
+        Creates the egress Service behind each job's egress_target. The operator
+        points it at the tailnet service in front of the app pods, through the
+        HA egress group when tailscale.monitoring_cluster.egress_group is enabled.
+        """
+        namespace = self.monitoring_namespace.metadata["name"]
+        services = []
+        for job in self.settings.monitoring.scrape.jobs:
+            if not job.egress_target:
+                continue
+            if not job.egress_tailnet_fqdn:
+                raise ValueError(f"scrape job '{job.name}': egress_tailnet_fqdn is required in 'egress' mode")
+            host, port = job.egress_target.rsplit(":", 1)
+            services.append(Service(
+                f"{job.name}-egress",
+                metadata={
+                    "name": host.split(".")[0],
+                    "namespace": namespace,
+                    "annotations": egress_annotations(job.egress_tailnet_fqdn,
+                                                      self.settings.tailscale.monitoring_cluster)
+                },
+                spec={
+                    "type": "ExternalName",
+                    "external_name": "unused",  # any value - will be overwritten by operator
+                    "ports": [{"port": int(port), "protocol": "TCP", "target_port": int(port)}]
+                },
+                opts=ResourceOptions(parent=self, depends_on=[self.monitoring_namespace])
+            ))
+        return services
@@ -0,0 +1,85 @@
+# monitoring_cluster/recording_rules.py
+"""
+Recording rules of the monitoring Prometheus.
+
+Dashboards and the capacity planner ask for request rates and error ratios
+over long ranges. Running `rate()` over the raw hungry_echoes_* counters for
+every panel refresh touches every sample of every pod; these rules precompute
+the aggregates once per evaluation, so queries read one small series per job
+instead. Latency quantiles come from the duration histograms the same way.
+Rule names follow the `level:metric:operations` convention.
+"""
+from typing import List
+
+import yaml
+
+from config.schema import RecordingRuleSettings, ScrapeSettings, duration_seconds
+
+RULES_FILE = "rules.yml"
+
+# Values of the status label of hungry_echoes_requests_total (see main.go)
+REQUEST_STATUSES = ("success", "error")
+# Recorded for the request and DB query duration histograms (see metrics.go)
+LATENCY_QUANTILES = (0.5, 0.99)
+
+
+def _rules(window: str, per_pod: bool) -> List[dict]:
+    requests = f"job:hungry_echoes_requests:rate{window}"
+    by_status = f"job_status:hungry_echoes_requests:rate{window}"
+    db_errors = f"job:hungry_echoes_db_errors:rate{window}"
+    rules = [
+        {"record": by_status,
+         "expr": f"sum by (cluster, job, status) (rate(hungry_echoes_requests_total[{window}]))"},
+        # Built from the rule above; rules of a group are evaluated in order
+        {"record": requests, "expr": f"sum without (status) ({by_status})"},
+        {"record": f"job:hungry_echoes_request_errors:ratio_rate{window}",
+         "expr": f'sum without (status) ({by_status}{{status="error"}}) / {requests}'},
+        {"record": db_errors,
+         "expr": f"sum by (cluster, job) (rate(hungry_echoes_db_errors_total[{window}]))"},
+        {"record": f"job:hungry_echoes_db_errors:ratio_rate{window}", "expr": f"{db_errors} / {requests}"},
+    ]
+    # Latency quantiles of the request and DB query duration histograms. The latter
+    # only times phrase cache reloads, so its quantiles rest on few samples
+    for quantile in LATENCY_QUANTILES:
+        for level, metric, labels in (("job", "hungry_echoes_request_duration_seconds", "cluster, job"),
+                                      ("job_query", "hungry_echoes_db_query_duration_seconds", "cluster, job, query")):
+            rules.append({
+                "record": f"{level}:{metric}:p{int(quantile * 100)}_rate{window}",
+                "expr": f"histogram_quantile({quantile}, sum by ({labels}, le) (rate({metric}_bucket[{window}])))",
+            })
+    if per_pod:
+        # Per-replica balance; only for the shortest window, where it is actually looked at
+        rules.append({"record": f"pod:hungry_echoes_requests:rate{window}",
+                      "expr": f"sum by (cluster, job, namespace, pod) (rate(hungry_echoes_requests_total[{window}]))"})
+    return rules
+
+
+def _group_interval(window: str, evaluation_interval: str) -> str:
+    """Long windows change slowly, so they are evaluated less often (at most 60 times per window)."""
+    seconds = max(duration_seconds(evaluation_interval), duration_seconds(window) / 60)
+    return f"{int(seconds)}s"
+
+
+def render(rules: RecordingRuleSettings, scrape: ScrapeSettings) -> str:
+    """Renders the rules file, one group per rate window."""
+    windows = sorted(rules.windows, key=duration_seconds)
+    groups = [
+        {
+            "name": f"hungry-echoes-{window}",
+            "interval": _group_interval(window, scrape.evaluation_interval),
+            "rules": _rules(window, per_pod=window == windows[0]),
+        }
+        for window in windows
+    ]
+    return yaml.safe_dump({"groups": groups}, sort_keys=False)
+
+
+def series_count(rules: RecordingRuleSettings, scrape: ScrapeSettings) -> int:
+    """Series the rules add to the TSDB (used by the sizing calculator)."""
+    if not rules.enabled:
+        return 0
+    # Per job and window: one per status, plus total, error ratio, DB errors and DB error ratio,
+    # and each latency quantile of the request and (single) DB query histograms
+    per_job = len(REQUEST_STATUSES) + 4 + 2 * len(LATENCY_QUANTILES)
+    pods = sum(job.expected_targets for job in scrape.jobs)
+    return len(scrape.jobs) * per_job * len(rules.windows) + pods
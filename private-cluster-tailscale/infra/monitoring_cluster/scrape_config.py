@@ -0,0 +1,152 @@
+# monitoring_cluster/scrape_config.py
+"""
+Generates the Prometheus configuration of the monitoring cluster.
+
+In "discovery" mode each job uses Kubernetes service discovery against the
+app cluster's API server, so every app pod becomes its own target (labelled
+with its pod, namespace and node) and is scraped directly over the shared VPC.
+Targets follow the deployment as it scales; there is no load balancer in the
+path that would make each scrape land on a random replica.
+
+In "agent" mode the same jobs run inside the app cluster (in-cluster service
+discovery) on a Prometheus agent, which pushes the kept series to the
+monitoring Prometheus with remote write.
+"""
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import yaml
+from pulumi import Output
+
+from config.schema import RemoteWriteSettings, ScrapeJobSettings, ScrapeSettings
+
+# Where the app cluster credentials are mounted in the Prometheus pod
+APP_CLUSTER_SECRET_DIR = "/etc/prometheus-secrets/app-cluster"
+APP_CLUSTER_LABEL = "app-cluster"
+
+
+@dataclass
+class AppClusterDiscovery:
+    """How the monitoring Prometheus reaches the app cluster API (all Outputs)."""
+    # https://<endpoint>
+    api_server: Output
+    # PEM, base64 encoded as in the GKE master auth
+    ca_certificate: Output
+    # Token of the read-only metrics discovery service account
+    token: Output
+
+
+def _discovery_job(job: ScrapeJobSettings, api_server: Optional[str]) -> dict:
+    """Pod discovery job; without `api_server` it uses the in-cluster service account."""
+    sd_config = {
+        "role": "pod",
+        "namespaces": {"names": [job.namespace]},
+        "selectors": [{"role": "pod", "label": job.pod_selector}],
+    }
+    if api_server is not None:
+        sd_config.update({
+            "api_server": api_server,
+            "authorization": {"credentials_file": f"{APP_CLUSTER_SECRET_DIR}/token"},
+            "tls_config": {"ca_file": f"{APP_CLUSTER_SECRET_DIR}/ca.crt"},
+        })
+    return {
+        "job_name": job.name,
+        "scrape_interval": job.interval,
+        "scrape_timeout": job.timeout,
+        "kubernetes_sd_configs": [sd_config],
+        "relabel_configs": [
+            # Only running pods that opt in through their annotations
+            {"source_labels": ["__meta_kubernetes_pod_phase"], "regex": "Running", "action": "keep"},
+            {"source_labels": ["__meta_kubernetes_pod_annotation_prometheus_io_scrape"],
+             "regex": "true", "action": "keep"},
+            {"source_labels": ["__meta_kubernetes_pod_annotation_prometheus_io_path"],
+             "regex": "(.+)", "target_label": "__metrics_path__"},
+            # Scrape the pod IP on the annotated port (one target per pod, not per container port)
+            {"source_labels": ["__meta_kubernetes_pod_ip", "__meta_kubernetes_pod_annotation_prometheus_io_port"],
+             "regex": "(.+);(.+)", "replacement": "$1:$2", "target_label": "__address__"},
+            {"source_labels": ["__meta_kubernetes_namespace"], "target_label": "namespace"},
+            {"source_labels": ["__meta_kubernetes_pod_name"], "target_label": "pod"},
+            {"source_labels": ["__meta_kubernetes_pod_node_name"], "target_label": "node"},
+            {"target_label": "cluster", "replacement": APP_CLUSTER_LABEL},
+        ],
+    }
+
+
+def _egress_job(job: ScrapeJobSettings) -> Optional[dict]:
+    if not job.egress_target:
+        return None
+    return {
+        "job_name": job.name,
+        "scrape_interval": job.interval,
+        "scrape_timeout": job.timeout,
+        "metrics_path": "/metrics",
+        "scheme": "http",
+        "static_configs": [{"targets": [job.egress_target], "labels": {"cluster": APP_CLUSTER_LABEL}}],
+    }
+
+
+def render(scrape: ScrapeSettings, api_server: Optional[str] = None, rule_files: Sequence[str] = ()) -> str:
+    """
+    Renders prometheus.yml.
+
+    Args:
+        scrape: Scrape settings (mode, global intervals and per-job intervals/timeouts)
+        api_server: App cluster API server URL; required in "discovery" mode
+        rule_files: Paths of the rule files to load (see recording_rules.py)
+    """
+    jobs = [{"job_name": "prometheus", "static_configs": [{"targets": ["localhost:9090"]}]}]
+    for job in scrape.jobs:
+        if scrape.mode == "agent":
+            # The app cluster agent scrapes these jobs and pushes the results here
+            continue
+        if scrape.mode == "discovery":
+            jobs.append(_discovery_job(job, api_server))
+        else:
+            rendered = _egress_job(job)
+            if rendered is not None:
+                jobs.append(rendered)
+
+    config = {
+        "global": {
+            "scrape_interval": scrape.scrape_interval,
+            "evaluation_interval": scrape.evaluation_interval,
+        },
+        "scrape_configs": jobs,
+    }
+    if rule_files:
+        config["rule_files"] = list(rule_files)
+    return yaml.safe_dump(config, sort_keys=False)
+
+
+def render_agent(scrape: ScrapeSettings, remote_write: RemoteWriteSettings, receiver_url: str) -> str:
+    """
+    Renders prometheus.yml for the app cluster agent.
+
+    Args:
+        scrape: Scrape settings; every job is discovered in-cluster
+        remote_write: Receiver, metric filter and queue tuning
+        receiver_url: Remote-write URL of the monitoring Prometheus
+    """
+    queue = remote_write.queue
+    config = {
+        "global": {"scrape_interval": scrape.scrape_interval},
+        "scrape_configs": [_discovery_job(job, None) for job in scrape.jobs],
+        "remote_write": [{
+            "url": receiver_url,
+            "write_relabel_configs": [
+                {"source_labels": ["__name__"], "regex": remote_write.keep_metrics, "action": "keep"},
+            ],
+            "queue_config": {
+                "capacity": queue.capacity,
+                "min_shards": queue.min_shards,
+                "max_shards": queue.max_shards,
+                "max_samples_per_send": queue.max_samples_per_send,
+                "batch_send_deadline": queue.batch_send_deadline,
+                "min_backoff": queue.min_backoff,
+                "max_backoff": queue.max_backoff,
+                # Keep retrying on 429s instead of dropping samples during receiver pressure
+                "retry_on_http_429": True,
+            },
+        }],
+    }
+    return yaml.safe_dump(config, sort_keys=False)
@@ -0,0 +1,150 @@
+# monitoring_cluster/tsdb_sizing.py
+"""
+Sizing calculator for the monitoring Prometheus.
+
+Estimates the active series and ingestion rate from the scrape jobs (expected
+targets, series per target, intervals) and the recording rules, and derives
+from them:
+
+- memory: the head block holds every active series (plus the churned ones
+  from rollouts) in memory, so memory grows with series, not with history;
+- disk: compressed blocks for the retention period plus the WAL;
+- the retention Prometheus is started with, capped so the TSDB stays inside
+  its volume (an emptyDir over its size limit gets the pod evicted);
+- the smallest monitoring node pool machine type that fits the pod.
+
+These are planning numbers for a small deployment, not a benchmark; check
+them against prometheus_tsdb_head_series and the TSDB size after a rollout.
+"""
+import math
+from dataclasses import dataclass
+from typing import Tuple
+
+from config.schema import Settings, duration_seconds
+from monitoring_cluster import recording_rules
+from utils.node_pools import DAEMONSET_MEMORY_MIB, DAEMONSET_MILLICORES, MACHINE_TYPES
+
+# Series exposed by Prometheus itself (the "prometheus" job)
+SELF_SERIES = 1000
+# Memory of an idle Prometheus plus room for query evaluation, before any series
+BASE_MEMORY_MIB = 400
+# Ingestion throughput per millicore, and the floor left for queries and compaction
+SAMPLES_PER_MILLICORE = 100
+MIN_MILLICORES = 200
+# The WAL keeps about three hours of uncompressed samples (two-hour blocks plus the open head)
+WAL_SECONDS = 3 * 3600
+WAL_BYTES_PER_SAMPLE = 8
+# Share of the volume handed to --storage.tsdb.retention.size; the rest absorbs compaction
+RETENTION_SIZE_FRACTION = 0.85
+# Other pods on the monitoring nodes (config reloader, Tailscale operator and proxies)
+OTHER_PODS_MEMORY_MIB = 300
+OTHER_PODS_MILLICORES = 200
+
+_GIB = 1024 ** 3
+
+
+@dataclass(frozen=True)
+class TsdbSizing:
+    active_series: int
+    samples_per_second: float
+    cpu_millicores: int
+    memory_mib: int
+    memory_limit_mib: int
+    # Disk needed for the configured retention, and what the volume allows
+    disk_needed_gb: float
+    retention: str
+    retention_size_gb: int
+    machine_type: str
+    warnings: Tuple[str, ...] = ()
+
+    def resources(self) -> dict:
+        """Container resources of the Prometheus server."""
+        return {
+            "requests": {"cpu": f"{self.cpu_millicores}m", "memory": f"{self.memory_mib}Mi"},
+            "limits": {"cpu": f"{self.cpu_millicores * 2}m", "memory": f"{self.memory_limit_mib}Mi"},
+        }
+
+    def summary(self) -> str:
+        return (f"tsdb sizing: {self.active_series} active series, {self.samples_per_second:.0f} samples/s, "
+                f"{self.memory_mib}-{self.memory_limit_mib}Mi memory, {self.cpu_millicores}m CPU, "
+                f"{self.disk_needed_gb:.1f}GB disk for the retention, keeping {self.retention} "
+                f"(at most {self.retention_size_gb}GB) on {self.machine_type}")
+
+
+def _format_retention(seconds: float) -> str:
+    if seconds >= 86400:
+        return f"{int(seconds // 86400)}d"
+    return f"{max(1, int(seconds // 3600))}h"
+
+
+def _machine_type(settings: Settings, millicores: int, memory_mib: int, warnings: list) -> str:
+    """The smallest known machine type that fits, never smaller than the configured one."""
+    configured = settings.node_pool.monitoring_cluster.machine_type
+    if configured not in MACHINE_TYPES:
+        warnings.append(f"machine type '{configured}' is not in the sizing table; keeping it unchecked")
+        return configured
+
+    candidates = list(MACHINE_TYPES)
+    for machine_type in candidates[candidates.index(configured):]:
+        _, allocatable_millicores, allocatable_memory = MACHINE_TYPES[machine_type]
+        if (allocatable_millicores - DAEMONSET_MILLICORES - OTHER_PODS_MILLICORES >= millicores
+                and allocatable_memory - DAEMONSET_MEMORY_MIB - OTHER_PODS_MEMORY_MIB >= memory_mib):
+            return machine_type
+    warnings.append(f"Prometheus needs {millicores}m CPU and {memory_mib}Mi memory, "
+                    f"more than any known machine type offers")
+    return candidates[-1]
+
+
+def estimate(settings: Settings) -> TsdbSizing:
+    """Estimates the TSDB footprint of the current monitoring settings."""
+    monitoring = settings.monitoring
+    scrape, tsdb = monitoring.scrape, monitoring.tsdb
+    warnings = []
+
+    # Prometheus scrapes itself at the global interval
+    series = float(SELF_SERIES)
+    samples_per_second = SELF_SERIES / duration_seconds(scrape.scrape_interval)
+    for job in scrape.jobs:
+        # In agent mode the receiver only gets what keep_metrics lets through; sized as if all of it
+        steady = job.expected_targets * job.series_per_target
+        series += steady * (1 + tsdb.series_churn)
+        samples_per_second += steady / duration_seconds(job.interval)
+    rule_series = recording_rules.series_count(monitoring.rules, scrape)
+    series += rule_series
+    samples_per_second += rule_series / duration_seconds(scrape.evaluation_interval)
+
+    memory_mib = math.ceil(BASE_MEMORY_MIB + series * tsdb.memory_per_series_kib / 1024)
+    memory_limit_mib = math.ceil(memory_mib * (1 + tsdb.headroom))
+    millicores = max(MIN_MILLICORES, math.ceil(samples_per_second / SAMPLES_PER_MILLICORE))
+
+    # Disk: compressed blocks for the retention period, plus the WAL
+    retention_seconds = duration_seconds(tsdb.retention)
+    block_bytes_per_second = samples_per_second * tsdb.bytes_per_sample * (1 + tsdb.headroom)
+    wal_bytes = samples_per_second * WAL_SECONDS * WAL_BYTES_PER_SAMPLE
+    disk_needed_gb = (block_bytes_per_second * retention_seconds + wal_bytes) / _GIB
+
+    retention_size_gb = max(1, int(tsdb.max_disk_gb * RETENTION_SIZE_FRACTION))
+    retention = tsdb.retention
+    if disk_needed_gb > retention_size_gb:
+        fits = max(0.0, retention_size_gb * _GIB - wal_bytes) / block_bytes_per_second
+        retention = _format_retention(fits)
+        warnings.append(f"{tsdb.retention} of retention needs {disk_needed_gb:.1f}GB but the TSDB volume allows "
+                        f"{retention_size_gb}GB; retention is shortened to {retention} "
+                        f"(raise monitoring.tsdb.max_disk_gb to keep {tsdb.retention})")
+    if tsdb.max_disk_gb >= settings.node_pool.disk_size_gb:
+        warnings.append(f"monitoring.tsdb.max_disk_gb ({tsdb.max_disk_gb}) does not fit on the "
+                        f"{settings.node_pool.disk_size_gb}GB node boot disk")
+
+    machine_type = _machine_type(settings, millicores, memory_limit_mib, warnings)
+    return TsdbSizing(
+        active_series=math.ceil(series),
+        samples_per_second=round(samples_per_second, 1),
+        cpu_millicores=millicores,
+        memory_mib=memory_mib,
+        memory_limit_mib=memory_limit_mib,
+        disk_needed_gb=round(disk_needed_gb, 2),
+        retention=retention,
+        retention_size_gb=retention_size_gb,
+        machine_type=machine_type,
+        warnings=tuple(warnings),
+    )
@@ -0,0 +1,298 @@
+# networking/firewall.py
+"""
+Firewall rule compiler for the shared VPC.
+
+Flows are declared as intents in settings.yaml (`network.firewall.intents`).
+The compiler expands them against the IPAM allocations and emits the smallest
+equivalent set of ingress rules:
+
+    1. source and destination CIDRs are aggregated (adjacent and contained
+       blocks collapse into their covering block)
+    2. port lists are merged into disjoint intervals per protocol
+    3. rules with the same sources and destinations are merged into one rule,
+       and so are rules with the same ports and destinations
+    4. rules fully shadowed by a broader rule are dropped
+
+Steps 3 and 4 repeat until nothing changes. Every compiled rule keeps the
+resource name of the first intent it absorbed, so existing rules are updated
+in place rather than replaced.
+"""
+import dataclasses
+import ipaddress
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from config.schema import HEALTH_CHECK_SOURCE, FirewallAllowSettings, FirewallIntentSettings, NetworkSettings
+from networking.ipam import ClusterAllocation
+
+# GCP accepts at most this many source (or destination) ranges per rule
+MAX_RANGES_PER_RULE = 256
+
+ALL_PORTS = ((0, 65535),)
+
+Networks = FrozenSet[ipaddress.IPv4Network]
+# Port intervals per protocol; ALL_PORTS for "every port", the "all" protocol covers everything
+Allows = FrozenSet[Tuple[str, Tuple[Tuple[int, int], ...]]]
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    name: str
+    sources: Networks
+    # None means every instance in the VPC
+    destinations: Optional[Networks]
+    allows: Allows
+    # Intents this rule implements, in declaration order
+    intents: Tuple[str, ...]
+
+    def to_args(self) -> dict:
+        """Keyword arguments for compute.Firewall (besides the network)."""
+        args = {
+            "allows": [_allow_arg(protocol, ports) for protocol, ports in sorted(self.allows)],
+            "source_ranges": [str(network) for network in sorted(self.sources)],
+        }
+        if self.destinations is not None:
+            args["destination_ranges"] = [str(network) for network in sorted(self.destinations)]
+        return args
+
+
+@dataclass(frozen=True, slots=True)
+class CompactionReport:
+    intents: int
+    rules_before: int
+    rules_after: int
+    ranges_before: int
+    ranges_after: int
+
+    def summary(self) -> str:
+        return (f"firewall: {self.intents} intents compiled from {self.rules_before} to {self.rules_after} rules, "
+                f"{self.ranges_before} to {self.ranges_after} source ranges")
+
+
+def _allow_arg(protocol: str, ports: Tuple[Tuple[int, int], ...]) -> dict:
+    if ports == ALL_PORTS:
+        return {"protocol": protocol}
+    return {"protocol": protocol,
+            "ports": [str(low) if low == high else f"{low}-{high}" for low, high in ports]}
+
+
+def _merge_intervals(intervals) -> Tuple[Tuple[int, int], ...]:
+    """Sorts and merges overlapping or adjacent port intervals."""
+    merged: List[List[int]] = []
+    for low, high in sorted(intervals):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return tuple((low, high) for low, high in merged)
+
+
+def _subtract_intervals(intervals, removed) -> Tuple[Tuple[int, int], ...]:
+    result = []
+    for low, high in intervals:
+        for r_low, r_high in removed:
+            if r_high < low or r_low > high:
+                continue
+            if r_low > low:
+                result.append((low, r_low - 1))
+            low = r_high + 1
+            if low > high:
+                break
+        if low <= high:
+            result.append((low, high))
+    return tuple(result)
+
+
+def _normalize_allows(intent: FirewallIntentSettings) -> Allows:
+    ports: Dict[str, List[Tuple[int, int]]] = {}
+    for allow in intent.allow:
+        if not allow.ports:
+            ports[allow.protocol] = list(ALL_PORTS)
+            continue
+        for port in allow.ports:
+            bounds = [int(b) for b in port.split("-")]
+            ports.setdefault(allow.protocol, []).append((bounds[0], bounds[-1]))
+    if "all" in ports:
+        return frozenset({("all", ALL_PORTS)})
+    return frozenset((protocol, _merge_intervals(intervals)) for protocol, intervals in ports.items())
+
+
+def _union_allows(a: Allows, b: Allows) -> Allows:
+    ports: Dict[str, List[Tuple[int, int]]] = {}
+    for protocol, intervals in (*a, *b):
+        ports.setdefault(protocol, []).extend(intervals)
+    if "all" in ports:
+        return frozenset({("all", ALL_PORTS)})
+    return frozenset((protocol, _merge_intervals(intervals)) for protocol, intervals in ports.items())
+
+
+def _subtract_allows(allows: Allows, removed: Allows) -> Allows:
+    """What `allows` still permits once `removed` is already permitted elsewhere."""
+    removed_ports = dict(removed)
+    if "all" in removed_ports:
+        return frozenset()
+    remaining = set()
+    for protocol, intervals in allows:
+        if protocol == "all":
+            # The complement of a protocol set cannot be expressed; keep it whole
+            return allows
+        left = _subtract_intervals(intervals, removed_ports.get(protocol, ()))
+        if left:
+            remaining.add((protocol, left))
+    return frozenset(remaining)
+
+
+def _port_entries(allows: Allows) -> int:
+    return sum(1 if intervals == ALL_PORTS else len(intervals) for _, intervals in allows)
+
+
+def _collapse(networks) -> Networks:
+    return frozenset(ipaddress.collapse_addresses(networks))
+
+
+def _networks_cover(outer: Optional[Networks], inner: Optional[Networks]) -> bool:
+    """True when every address of `inner` is in `outer` (None is the whole VPC)."""
+    if outer is None:
+        return True
+    if inner is None:
+        return False
+    return all(any(network.subnet_of(candidate) for candidate in outer) for network in inner)
+
+
+def _cluster_ranges(allocation: ClusterAllocation, which) -> List[ipaddress.IPv4Network]:
+    cidrs = {"subnet": allocation.subnet_cidr, "pods": allocation.pods_cidr, "services": allocation.services_cidr}
+    return [ipaddress.IPv4Network(cidrs[name]) for name in which]
+
+
+def _raw_sources(intent: FirewallIntentSettings, network: NetworkSettings,
+                 allocations: Dict[str, ClusterAllocation]) -> List[ipaddress.IPv4Network]:
+    sources = []
+    for source in intent.sources:
+        if source == HEALTH_CHECK_SOURCE:
+            sources.extend(ipaddress.IPv4Network(cidr) for cidr in network.health_check_ranges)
+        elif source in allocations:
+            sources.extend(_cluster_ranges(allocations[source], intent.source_cluster_ranges))
+        else:
+            sources.append(ipaddress.IPv4Network(source))
+    return sources
+
+
+def expand(network: NetworkSettings, allocations: Dict[str, ClusterAllocation]) -> List[CompiledRule]:
+    """Turns every intent into one normalized rule (the uncompacted rule set)."""
+    rules = []
+    for intent in network.firewall.intents:
+        destinations = None
+        if intent.targets:
+            # Nodes live in the subnet and pods in the pod range; service VIPs are never filtered
+            destinations = _collapse(cidr for target in intent.targets
+                                     for cidr in _cluster_ranges(allocations[target], ("subnet", "pods")))
+
+        rules.append(CompiledRule(intent.name, _collapse(_raw_sources(intent, network, allocations)), destinations,
+                                  _normalize_allows(intent), (intent.name,)))
+    return rules
+
+
+def _merge(rules: List[CompiledRule], order: Dict[str, int]) -> List[CompiledRule]:
+    """Merges rules that differ in exactly one of sources, destinations or allows."""
+    def combined(a: CompiledRule, b: CompiledRule, **changes) -> CompiledRule:
+        intents = tuple(sorted(set(a.intents) | set(b.intents), key=order.__getitem__))
+        fields = {"sources": a.sources, "destinations": a.destinations, "allows": a.allows, **changes}
+        return CompiledRule(name=intents[0], intents=intents, **fields)
+
+    merged: List[CompiledRule] = []
+    for rule in rules:
+        for i, other in enumerate(merged):
+            if other.destinations == rule.destinations and other.sources == rule.sources:
+                merged[i] = combined(other, rule, allows=_union_allows(other.allows, rule.allows))
+            elif other.destinations == rule.destinations and other.allows == rule.allows:
+                merged[i] = combined(other, rule, sources=_collapse(other.sources | rule.sources))
+            elif (other.sources == rule.sources and other.allows == rule.allows
+                  and other.destinations is not None and rule.destinations is not None):
+                merged[i] = combined(other, rule, destinations=_collapse(other.destinations | rule.destinations))
+            else:
+                continue
+            break
+        else:
+            merged.append(rule)
+    return merged
+
+
+def _drop_shadowed(rules: List[CompiledRule]) -> List[CompiledRule]:
+    """
+    Removes what broader rules already allow. A rule is reduced by every other
+    rule whose sources and destinations contain its own; it is dropped when
+    nothing is left, and only trimmed when that does not add port entries.
+    """
+    kept = []
+    for rule in rules:
+        allows = rule.allows
+        for other in rules:
+            if other is rule or (other.sources, other.destinations) == (rule.sources, rule.destinations):
+                continue
+            if _networks_cover(other.sources, rule.sources) and _networks_cover(other.destinations, rule.destinations):
+                allows = _subtract_allows(allows, other.allows)
+        if not allows:
+            continue
+        if _port_entries(allows) <= _port_entries(rule.allows):
+            rule = CompiledRule(rule.name, rule.sources, rule.destinations, allows, rule.intents)
+        kept.append(rule)
+    return kept
+
+
+def _split(rule: CompiledRule) -> List[CompiledRule]:
+    """Splits rules over the per-rule range quota (rare; named <name>, <name>-2, ...)."""
+    sources = sorted(rule.sources)
+    if len(sources) <= MAX_RANGES_PER_RULE:
+        return [rule]
+    chunks = [sources[i:i + MAX_RANGES_PER_RULE] for i in range(0, len(sources), MAX_RANGES_PER_RULE)]
+    return [CompiledRule(rule.name if i == 0 else f"{rule.name}-{i + 1}", frozenset(chunk),
+                         rule.destinations, rule.allows, rule.intents)
+            for i, chunk in enumerate(chunks)]
+
+
+def with_health_check_ports(network: NetworkSettings, ports: Tuple[str, ...]) -> NetworkSettings:
+    """
+    Returns `network` with TCP `ports` added to every intent that admits the
+    health check ranges, e.g. the pod port a container-native load balancer
+    health checks (and sends traffic to). The compiled rule keeps its name, so
+    the existing rule is updated in place.
+    """
+    intents = tuple(
+        dataclasses.replace(intent, allow=intent.allow + (FirewallAllowSettings("tcp", ports),))
+        if HEALTH_CHECK_SOURCE in intent.sources else intent
+        for intent in network.firewall.intents
+    )
+    return dataclasses.replace(network, firewall=dataclasses.replace(network.firewall, intents=intents))
+
+
+def compile_rules(network: NetworkSettings,
+                  allocations: Dict[str, ClusterAllocation]) -> Tuple[List[CompiledRule], CompactionReport]:
+    """
+    Compiles the firewall intents of `network` into a minimal rule set.
+
+    Args:
+        network: Network settings holding the intents and health check ranges
+        allocations: IPAM allocations the cluster names resolve to
+
+    Returns:
+        The compiled rules (in intent declaration order) and a before/after report
+    """
+    expanded = expand(network, allocations)
+    order = {intent.name: i for i, intent in enumerate(network.firewall.intents)}
+
+    rules = expanded
+    while True:
+        compacted = _drop_shadowed(_merge(rules, order))
+        if compacted == rules:
+            break
+        rules = compacted
+
+    rules = [chunk for rule in sorted(rules, key=lambda r: order[r.name]) for chunk in _split(rule)]
+    report = CompactionReport(
+        intents=len(network.firewall.intents),
+        rules_before=len(expanded),
+        rules_after=len(rules),
+        ranges_before=sum(len(_raw_sources(intent, network, allocations)) for intent in network.firewall.intents),
+        ranges_after=sum(len(rule.sources) for rule in rules),
+    )
+    return rules, report
@@ -0,0 +1,233 @@
+# networking/ipam.py
+"""
+IP address management for the shared VPC.
+
+Every cluster needs a primary subnet range, a pod range, a service range and,
+for private control planes, a /28 for the control plane. Ranges pinned in
+settings.yaml are reserved first, then ranges remembered from the previous run
+(exported as the `ipam_allocations` stack output and recorded in the
+`ipam:allocations` stack config by automation/ipam.py), and only then are new
+ranges carved out of the configured supernets. Any overlap is rejected before a
+single cloud call is made.
+"""
+import bisect
+import ipaddress
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import pulumi
+
+from config.schema import ClusterNetworkSettings, NetworkSettings
+
+IPAM_OUTPUT = "ipam_allocations"
+# Stack config holding the previous run's allocations, written by automation/ipam.py
+IPAM_CONFIG_NAMESPACE = "ipam"
+IPAM_CONFIG_KEY = "allocations"
+
+_RANGE_FIELDS = ("subnet_cidr", "pods_cidr", "services_cidr")
+
+
+class IpamError(ValueError):
+    """Raised when ranges overlap or a supernet has no room left."""
+
+
+class FreeIntervals:
+    """
+    Free address space of one supernet, kept as sorted, disjoint [start, end)
+    integer intervals. Reservations locate their interval with a binary search;
+    allocations pick the smallest free interval that fits an aligned block
+    (best fit), which keeps large blocks available for later /16 pod ranges.
+    """
+
+    def __init__(self, supernet: ipaddress.IPv4Network):
+        self.supernet = supernet
+        self._starts: List[int] = [int(supernet.network_address)]
+        self._ends: List[int] = [int(supernet.broadcast_address) + 1]
+        self._owners: Dict[ipaddress.IPv4Network, str] = {}
+
+    def _owner_of(self, network: ipaddress.IPv4Network) -> str:
+        for allocated, owner in self._owners.items():
+            if allocated.overlaps(network):
+                return f"{owner} ({allocated})"
+        return "an unknown range"
+
+    def _take(self, index: int, start: int, end: int):
+        free_start, free_end = self._starts[index], self._ends[index]
+        del self._starts[index], self._ends[index]
+        # Put back what is left on either side, keeping the lists sorted
+        if end < free_end:
+            self._starts.insert(index, end)
+            self._ends.insert(index, free_end)
+        if free_start < start:
+            self._starts.insert(index, free_start)
+            self._ends.insert(index, start)
+
+    def reserve(self, network: ipaddress.IPv4Network, owner: str):
+        """Marks `network` as used by `owner`."""
+        if not network.subnet_of(self.supernet):
+            raise IpamError(f"{owner}: {network} is outside the supernet {self.supernet}")
+        start, end = int(network.network_address), int(network.broadcast_address) + 1
+        index = bisect.bisect_right(self._starts, start) - 1
+        if index < 0 or self._ends[index] < end:
+            raise IpamError(f"{owner}: {network} overlaps {self._owner_of(network)}")
+        self._take(index, start, end)
+        self._owners[network] = owner
+
+    def allocate(self, prefixlen: int, owner: str) -> ipaddress.IPv4Network:
+        """Allocates an aligned block of the given prefix length."""
+        if prefixlen < self.supernet.prefixlen:
+            raise IpamError(f"{owner}: a /{prefixlen} does not fit in {self.supernet}")
+        size = 1 << (32 - prefixlen)
+
+        best: Optional[Tuple[int, int, int]] = None  # (free size, index, aligned start)
+        for index, (free_start, free_end) in enumerate(zip(self._starts, self._ends)):
+            aligned = (free_start + size - 1) // size * size
+            if aligned + size <= free_end and (best is None or free_end - free_start < best[0]):
+                best = (free_end - free_start, index, aligned)
+
+        if best is None:
+            raise IpamError(f"{owner}: no free /{prefixlen} left in {self.supernet}")
+        _, index, start = best
+        self._take(index, start, start + size)
+        network = ipaddress.IPv4Network((start, prefixlen))
+        self._owners[network] = owner
+        return network
+
+
+@dataclass(frozen=True, slots=True)
+class ClusterAllocation:
+    subnet_cidr: str
+    pods_cidr: str
+    services_cidr: str
+    pods_range_name: str
+    services_range_name: str
+    master_ipv4_cidr_block: Optional[str] = None
+
+    def to_output(self) -> Dict[str, Optional[str]]:
+        return {
+            "subnet_cidr": self.subnet_cidr,
+            "pods_cidr": self.pods_cidr,
+            "services_cidr": self.services_cidr,
+            "master_ipv4_cidr_block": self.master_ipv4_cidr_block,
+        }
+
+
+def range_prefix(key: str, cluster: ClusterNetworkSettings) -> str:
+    """Prefix of the secondary range names, e.g. "app" -> app-pods / app-services."""
+    return cluster.range_prefix or key
+
+
+def allocate(network: NetworkSettings,
+             previous: Optional[Dict[str, Dict[str, Optional[str]]]] = None) -> Dict[str, ClusterAllocation]:
+    """
+    Allocates ranges for every cluster in `network.clusters`.
+
+    Args:
+        network: Network settings (supernets, per-cluster pins and sizes)
+        previous: Allocations exported by the previous run, keyed by cluster
+
+    Raises:
+        IpamError: If pinned/previous ranges overlap or a supernet is exhausted
+    """
+    previous = previous or {}
+    space = FreeIntervals(ipaddress.IPv4Network(network.ipam.supernet))
+    control_space = FreeIntervals(ipaddress.IPv4Network(network.ipam.control_plane_supernet))
+
+    def space_for(field: str) -> FreeIntervals:
+        return control_space if field == "master_ipv4_cidr_block" else space
+
+    wanted: Dict[str, Dict[str, int]] = {}
+    for key, cluster in network.clusters.items():
+        wanted[key] = {
+            "subnet_cidr": cluster.subnet_prefix,
+            "pods_cidr": cluster.pods_prefix,
+            "services_cidr": cluster.services_prefix,
+        }
+        if cluster.control_plane_prefix is not None or cluster.master_ipv4_cidr_block:
+            wanted[key]["master_ipv4_cidr_block"] = cluster.control_plane_prefix or 28
+
+    chosen: Dict[str, Dict[str, str]] = {key: {} for key in wanted}
+
+    # 1. Ranges pinned in settings.yaml
+    for key, cluster in network.clusters.items():
+        for field in wanted[key]:
+            pinned = getattr(cluster, field)
+            if pinned:
+                space_for(field).reserve(ipaddress.IPv4Network(pinned), f"{key}.{field}")
+                chosen[key][field] = pinned
+
+    # 2. Ranges remembered from the previous run, as long as they still fit the request
+    for key in wanted:
+        for field, prefixlen in wanted[key].items():
+            remembered = (previous.get(key) or {}).get(field)
+            if field in chosen[key] or not remembered:
+                continue
+            remembered_network = ipaddress.IPv4Network(remembered)
+            if remembered_network.prefixlen != prefixlen:
+                continue
+            try:
+                space_for(field).reserve(remembered_network, f"{key}.{field}")
+            except IpamError:
+                # Taken by a newly pinned range; allocate a fresh one below
+                continue
+            chosen[key][field] = remembered
+
+    # 3. New ranges, largest blocks first to limit fragmentation
+    missing = [(prefixlen, key, field) for key in wanted
+               for field, prefixlen in wanted[key].items() if field not in chosen[key]]
+    for prefixlen, key, field in sorted(missing):
+        chosen[key][field] = str(space_for(field).allocate(prefixlen, f"{key}.{field}"))
+
+    allocations = {}
+    for key, cluster in network.clusters.items():
+        prefix = range_prefix(key, cluster)
+        allocations[key] = ClusterAllocation(
+            subnet_cidr=chosen[key]["subnet_cidr"],
+            pods_cidr=chosen[key]["pods_cidr"],
+            services_cidr=chosen[key]["services_cidr"],
+            pods_range_name=f"{prefix}-pods",
+            services_range_name=f"{prefix}-services",
+            master_ipv4_cidr_block=chosen[key].get("master_ipv4_cidr_block"),
+        )
+    return allocations
+
+
+def all_pinned(network: NetworkSettings) -> bool:
+    """Whether settings.yaml pins every range, so the allocation does not depend on a previous run."""
+    for cluster in network.clusters.values():
+        if not (cluster.subnet_cidr and cluster.pods_cidr and cluster.services_cidr):
+            return False
+        if cluster.control_plane_prefix is not None and not cluster.master_ipv4_cidr_block:
+            return False
+    return True
+
+
+def load_previous_allocations(network: NetworkSettings) -> Optional[Dict[str, Dict[str, Optional[str]]]]:
+    """
+    Reads the allocations of the previous run from the `ipam:allocations` stack config.
+
+    The allocation decides how many ranges and rules get created, so it needs a
+    plain value before the first resource is registered. The Automation API
+    records it from the stack outputs (`python -m automation ipam --stack <stack>`,
+    which the rollout, targeted, profile and split-stack commands run first); a
+    new stack gets an empty record. In the cluster layers (see stacks/) it holds
+    the network layer's allocations.
+
+    Returns:
+        The recorded allocations, or None when nothing is recorded (e.g. a plain
+        `pulumi up`); the ranges then come from the settings alone, which is only
+        guaranteed to match a deployed stack when every range is pinned
+    """
+    previous = pulumi.Config(IPAM_CONFIG_NAMESPACE).get_object(IPAM_CONFIG_KEY)
+    if previous is None:
+        if all_pinned(network):
+            pulumi.log.info("No IPAM allocations recorded; every range is pinned in settings.yaml")
+        else:
+            pulumi.log.warn(f"No IPAM allocations recorded in the '{IPAM_CONFIG_NAMESPACE}:{IPAM_CONFIG_KEY}' "
+                            f"stack config; the unpinned ranges come from the settings alone and may move on a "
+                            f"deployed stack. Run `python -m automation ipam --stack {pulumi.get_stack()}` "
+                            f"(with --layer for a layer stack) to record them")
+        return None
+    if not previous:
+        pulumi.log.info("No previous IPAM allocations; allocating from settings only")
+    return previous
@@ -1,162 +1,112 @@
 # networking/network.py
-from typing import Any, Dict
-from pulumi import ComponentResource, ResourceOptions, export
+from pulumi import ComponentResource, ResourceOptions, export, log
 from pulumi_gcp import compute
-import yaml
-import os
+
+from config.schema import ClusterNetworkSettings, Settings, to_dict
+from networking.firewall import compile_rules, with_health_check_ports
+from networking.ipam import IPAM_OUTPUT, ClusterAllocation, allocate, load_previous_allocations
 
 class Network(ComponentResource):
     """
     Network infrastructure component that creates and manages:
     - Shared VPC
-    - Subnets for both clusters
-    - Firewall rules
+    - One subnet per cluster in `network.clusters`, with ranges from the IPAM engine
+    - Firewall rules, compiled from the intents in `network.firewall`
     """
-    
-    def __init__(self, config: Dict[str, Any], opts: ResourceOptions = None):
-        super().__init__('hungry-echoes:network', config['network']['name'], None, opts)
 
-        # Set the config object
-        self.config = config
+    # GCP APIs the network needs, enabled by the project bootstrap (see bootstrap/)
+    REQUIRED_SERVICES = ("compute.googleapis.com",)
+
+    def __init__(self, settings: Settings, opts: ResourceOptions = None):
+        super().__init__('hungry-echoes:network', settings.network.name, None, opts)
+
+        # Set the settings object
+        self.settings = settings
+
+        # Allocate (or re-use) the ranges of every cluster before creating anything
+        previous = {}
+        if settings.network.ipam.persist:
+            previous = load_previous_allocations(settings.network) or {}
+        self.allocations = allocate(settings.network, previous)
 
         # Create shared VPC
         self.vpc = compute.Network(
-            resource_name=self.config['pulumi_provider']['network_provider_name'],
-            name=self.config['network']['name'],
+            resource_name=self.settings.pulumi_provider.network_provider_name,
+            name=self.settings.network.name,
             auto_create_subnetworks=False,
+            # Unset (None) keeps the GCP default; a change replaces the VPC
+            mtu=self.settings.network.active_profile.mtu,
             opts=ResourceOptions(parent=self)
         )
 
-        # Create firewall rules for internal communication
-        self._create_internal_firewall_rules()
-        
-        # Create firewall rules for health checks and metrics
-        self._create_external_firewall_rules()
+        # Create the smallest rule set that implements the firewall intents
+        self._create_firewall_rules()
 
-        # Create subnets for both clusters
-        # Note: Regions are hardcoded for demo purposes. In production,
-        # you might want to make these configurable in settings.yaml
-        self.app_subnet = self._create_app_subnet()
-        self.monitoring_subnet = self._create_monitoring_subnet()
+        # Create one subnet per cluster, in the region configured for it
+        self.subnets = {
+            key: self._create_subnet(key, cluster, self.allocations[key])
+            for key, cluster in self.settings.network.clusters.items()
+        }
+        self.app_subnet = self.subnets.get('app_cluster')
+        self.monitoring_subnet = self.subnets.get('monitoring_cluster')
 
         # Export network information for other components
         export('vpc_id', self.vpc.id)
         export('vpc_name', self.vpc.name)
-        export('network_config', self.config['network'])
-        export('app_subnet_id', self.app_subnet.id)
-        export('monitoring_subnet_id', self.monitoring_subnet.id)
+        export('network_config', to_dict(self.settings.network))
+        export('firewall_compaction', to_dict(self.firewall_report))
+        export(IPAM_OUTPUT, {key: allocation.to_output() for key, allocation in self.allocations.items()})
+        for key, subnet in self.subnets.items():
+            export(f"{key.removesuffix('_cluster')}_subnet_id", subnet.id)
 
-    def _create_internal_firewall_rules(self):
-        """Create firewall rules for internal cluster communication."""
-        
-        # Collect all CIDR ranges
-        internal_ranges = [
-            self.config['network']['app_cluster']['subnet_cidr'],
-            self.config['network']['app_cluster']['pods_cidr'],
-            self.config['network']['app_cluster']['services_cidr'],
-            self.config['network']['monitoring_cluster']['subnet_cidr'],
-            self.config['network']['monitoring_cluster']['pods_cidr'],
-            self.config['network']['monitoring_cluster']['services_cidr']
-        ]
+    def _create_firewall_rules(self):
+        """Create the compiled firewall rules for the declared intents."""
+        network = self.settings.network
+        if self.settings.ingress.mode == "gateway":
+            # The load balancer health checks (and serves) the pods directly on the backend port
+            network = with_health_check_ports(network, (str(self.settings.ingress.gateway.backend_port),))
+        rules, self.firewall_report = compile_rules(network, self.allocations)
+        log.info(self.firewall_report.summary(), resource=self)
 
+        self.firewall_rules = {
+            rule.name: compute.Firewall(
+                rule.name,
+                network=self.vpc.name,
+                **rule.to_args(),
+                opts=ResourceOptions(parent=self)
+            )
+            for rule in rules
+        }
 
-        self.allow_internal = compute.Firewall(
-            self.config['pulumi_provider']['firewall_cluster_internal_allow_rule_provider_name'],
-            network=self.vpc.name,
-            allows=[
-                {"protocol": "icmp"},
-                {"protocol": "tcp", "ports": ["0-65535"]},
-                {"protocol": "udp", "ports": ["0-65535"]}
-            ],
-            source_ranges=internal_ranges,
-            opts=ResourceOptions(parent=self)
-        )
-
-    def _create_external_firewall_rules(self):
-        """Create firewall rules for health checks and metrics."""
-        
-        # Create firewall rule for health checks
-        self.allow_health_checks = compute.Firewall(
-            self.config['pulumi_provider']['firewall_health_check_allow_rule_provider_name'],
-            network=self.vpc.name,
-            allows=[
-                {
-                    "protocol": "tcp",
-                    "ports": ["80", "443", "8081"]  # Include metrics port
-                }
-            ],
-            source_ranges=self.config['network']['health_check_ranges'],
-            opts=ResourceOptions(parent=self)
-        )
-
-        # Create firewall rule for metrics
-        self.allow_metrics = compute.Firewall(
-            self.config['pulumi_provider']['firewall_metrics_allow_rule_provider_name'],
-            network=self.vpc.name,
-            allows=[
-                {
-                    "protocol": "tcp",
-                    "ports": ["8081"]  # Metrics port
-                }
-            ],
-            source_ranges=[
-                self.config['network']['app_cluster']['subnet_cidr'],
-                self.config['network']['app_cluster']['pods_cidr'], 
-                self.config['network']['monitoring_cluster']['subnet_cidr'],
-                self.config['network']['monitoring_cluster']['pods_cidr']
-            ],
-            opts=ResourceOptions(parent=self)
-        )
-
-    def _create_app_subnet(self):
-        """Create subnet for app cluster in the specified region."""
+    def _flow_log_config(self):
+        """Subnet flow log configuration of the active network profile (None disables flow logs)."""
+        profile = self.settings.network.active_profile
+        if not profile.flow_logs:
+            return None
+        return {
+            "aggregation_interval": profile.flow_log_interval,
+            "flow_sampling": profile.flow_sampling,
+            "metadata": profile.flow_log_metadata
+        }
 
+    def _create_subnet(self, key: str, cluster: ClusterNetworkSettings, allocation: ClusterAllocation):
+        """Create the subnet of one cluster in the cluster's region."""
         return compute.Subnetwork(
-            self.config['pulumi_provider']['app_subnet_provider_name'],
+            cluster.resource_name or f"{key}-subnet",
             network=self.vpc.id,
-            region=self.config['app_cluster']['region'],
-            ip_cidr_range=self.config['network']['app_cluster']['subnet_cidr'],
+            region=cluster.region,
+            ip_cidr_range=allocation.subnet_cidr,
             secondary_ip_ranges=[
                 {
-                    "range_name": "app-pods",
-                    "ip_cidr_range": self.config['network']['app_cluster']['pods_cidr']
+                    "range_name": allocation.pods_range_name,
+                    "ip_cidr_range": allocation.pods_cidr
                 },
                 {
-                    "range_name": "app-services",
-                    "ip_cidr_range": self.config['network']['app_cluster']['services_cidr']
+                    "range_name": allocation.services_range_name,
+                    "ip_cidr_range": allocation.services_cidr
                 }
             ],
-            # Enable flow logs for monitoring
-            log_config={
-                "aggregation_interval": "INTERVAL_5_SEC",
-                "flow_sampling": 0.5,
-                "metadata": "INCLUDE_ALL_METADATA"
-            },
+            # Flow logs as set by the network profile
+            log_config=self._flow_log_config(),
             opts=ResourceOptions(parent=self)
         )
-
-    def _create_monitoring_subnet(self):
-        """Create subnet for monitoring cluster in the specified region."""
-        return compute.Subnetwork(
-            self.config['pulumi_provider']['monitoring_subnet_provider_name'],
-            network=self.vpc.id,
-            region=self.config['monitoring_cluster']['region'],
-            ip_cidr_range=self.config['network']['monitoring_cluster']['subnet_cidr'],
-            secondary_ip_ranges=[
-                {
-                    "range_name": "monitoring-pods",
-                    "ip_cidr_range": self.config['network']['monitoring_cluster']['pods_cidr']
-                },
-                {
-                    "range_name": "monitoring-services",
-                    "ip_cidr_range": self.config['network']['monitoring_cluster']['services_cidr']
-                }
-            ],
-            # Enable flow logs for monitoring
-            log_config={
-                "aggregation_interval": "INTERVAL_5_SEC",
-                "flow_sampling": 0.5,
-                "metadata": "INCLUDE_ALL_METADATA"
-            },
-            opts=ResourceOptions(parent=self)
-        )
\ No newline at end of file
@@ -0,0 +1,145 @@
+# preflight/catalog.py
+"""
+Static catalog of the GCP facts the preflight rules check against: regions and
+their zones, the machine types offered per zone, and the GKE versions each
+release channel offers per location.
+
+The catalog is a JSON file in the repository, so preflight never makes a
+cloud call. `refresh` rebuilds it with gcloud (run it from a machine with
+credentials, then commit the file); zones and locations that are not in the
+settings keep their previous entries.
+"""
+import datetime
+import json
+import os
+import subprocess
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json")
+
+
+class CatalogError(RuntimeError):
+    """Raised when the catalog cannot be read or refreshed."""
+
+
+@dataclass(frozen=True)
+class ChannelVersions:
+    default_version: str
+    valid_versions: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Catalog:
+    fetched_at: datetime.date
+    # region -> zones
+    regions: Dict[str, Tuple[str, ...]]
+    # zone -> machine types offered there
+    machine_types: Dict[str, Tuple[str, ...]]
+    # location (zone or region) -> release channel -> versions
+    gke_versions: Dict[str, Dict[str, ChannelVersions]]
+
+    def zones(self) -> Dict[str, str]:
+        """zone -> region"""
+        return {zone: region for region, zones in self.regions.items() for zone in zones}
+
+    def age_days(self, today: Optional[datetime.date] = None) -> int:
+        return ((today or datetime.date.today()) - self.fetched_at).days
+
+
+_lock = threading.Lock()
+# path -> (mtime, catalog)
+_cache: Dict[str, Tuple[int, Catalog]] = {}
+
+
+def _parse(document: dict) -> Catalog:
+    return Catalog(
+        fetched_at=datetime.date.fromisoformat(document["fetched_at"]),
+        regions={region: tuple(zones) for region, zones in document["regions"].items()},
+        machine_types={zone: tuple(types) for zone, types in document["machine_types"].items()},
+        gke_versions={
+            location: {channel: ChannelVersions(versions["default_version"], tuple(versions["valid_versions"]))
+                       for channel, versions in channels.items()}
+            for location, channels in document["gke_versions"].items()
+        },
+    )
+
+
+def load_catalog(path: Optional[str] = None) -> Catalog:
+    """
+    Returns the catalog at `path` (the bundled one by default), parsed once per process.
+
+    Raises:
+        CatalogError: If the file is missing or malformed
+    """
+    path = os.path.abspath(os.path.expanduser(path or DEFAULT_CATALOG_PATH))
+    with _lock:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            cached = _cache.get(path)
+            if cached is None or cached[0] != mtime:
+                with open(path) as f:
+                    cached = _cache[path] = (mtime, _parse(json.load(f)))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            raise CatalogError(f"Could not load the preflight catalog {path}: {e}") from e
+        return cached[1]
+
+
+def _gcloud_json(*args: str) -> object:
+    try:
+        result = subprocess.run(["gcloud", *args, "--format=json"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        stderr = getattr(e, "stderr", "") or ""
+        raise CatalogError(f"gcloud {' '.join(args)} failed: {stderr.strip() or e}") from e
+    return json.loads(result.stdout)
+
+
+def refresh(project_id: str, zones: Iterable[str], path: Optional[str] = None) -> List[str]:
+    """
+    Rebuilds the catalog from the live APIs and writes it to `path`.
+
+    Args:
+        project_id: Project whose view of the APIs is recorded
+        zones: Zones to record machine types and GKE versions for (the ones the settings use)
+        path: Catalog file; defaults to the bundled one
+
+    Returns:
+        One line per refreshed section, for printing
+
+    Raises:
+        CatalogError: If a gcloud call fails
+    """
+    path = os.path.abspath(os.path.expanduser(path or DEFAULT_CATALOG_PATH))
+    try:
+        with open(path) as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        document = {"regions": {}, "machine_types": {}, "gke_versions": {}}
+
+    regions = {}
+    for region in _gcloud_json("compute", "regions", "list", f"--project={project_id}"):
+        regions[region["name"]] = sorted(zone.rsplit("/", 1)[-1] for zone in region.get("zones", []))
+    document["regions"] = regions
+    report = [f"regions: {len(regions)}"]
+
+    for zone in sorted(set(zones)):
+        types = _gcloud_json("compute", "machine-types", "list", f"--project={project_id}",
+                             f"--filter=zone:{zone}")
+        document["machine_types"][zone] = sorted(machine_type["name"] for machine_type in types)
+
+        config = _gcloud_json("container", "get-server-config", f"--project={project_id}", f"--zone={zone}")
+        document["gke_versions"][zone] = {
+            channel["channel"]: {"default_version": channel["defaultVersion"],
+                                 "valid_versions": channel.get("validVersions", [])}
+            for channel in config.get("channels", [])
+        }
+        report.append(f"{zone}: {len(document['machine_types'][zone])} machine types, "
+                      f"channels {', '.join(sorted(document['gke_versions'][zone]))}")
+
+    document["fetched_at"] = datetime.date.today().isoformat()
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(f"{path}.tmp", path)
+    return report
@@ -0,0 +1,88 @@
+# preflight/engine.py
+"""
+Runs the preflight rules (preflight/rules.py) against the settings before any
+cloud call is made.
+
+Every rule runs, so a single pass reports every violation instead of the first
+one GKE happens to reject 40 minutes into a cluster create. `enforce` is called
+by the program; `python -m automation preflight` runs the same check on its own.
+"""
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import pulumi
+
+from config.schema import Settings
+from preflight.catalog import Catalog, CatalogError, load_catalog
+from preflight.rules import ERROR, RULES, WARNING, Violation
+from utils.providers import InitializationError
+
+
+@dataclass(frozen=True)
+class Report:
+    violations: Tuple[Violation, ...]
+    seconds: float
+
+    @property
+    def errors(self) -> Tuple[Violation, ...]:
+        return tuple(v for v in self.violations if v.severity == ERROR)
+
+    @property
+    def warnings(self) -> Tuple[Violation, ...]:
+        return tuple(v for v in self.violations if v.severity == WARNING)
+
+    def summary(self) -> str:
+        return (f"preflight: {len(RULES)} rules, {len(self.errors)} errors, {len(self.warnings)} warnings "
+                f"in {self.seconds * 1000:.0f} ms")
+
+
+def run(settings: Settings, catalog: Optional[Catalog] = None, rules: Sequence[str] = ()) -> Report:
+    """
+    Runs the preflight rules.
+
+    Args:
+        settings: Validated settings
+        catalog: Static catalog; loaded from `preflight.catalog` when omitted
+        rules: Names of the rules to run (see rules.RULES); all of them when empty
+
+    Returns:
+        Every violation found, errors first
+
+    Raises:
+        CatalogError: If the catalog cannot be loaded
+    """
+    start = time.perf_counter()
+    if catalog is None:
+        catalog = load_catalog(settings.preflight.catalog)
+
+    violations = []
+    for name, rule in RULES.items():
+        if rules and name not in rules:
+            continue
+        try:
+            violations.extend(rule(settings, catalog))
+        except Exception as e:
+            # A broken rule must not hide the others
+            violations.append(Violation(ERROR, name, "<rule>", f"the rule failed: {e!r}"))
+
+    violations.sort(key=lambda v: v.severity != ERROR)
+    return Report(tuple(violations), time.perf_counter() - start)
+
+
+def enforce(settings: Settings):
+    """
+    Runs every rule and stops the program on errors; warnings are logged.
+
+    Raises:
+        InitializationError: Listing every error, when there is at least one
+    """
+    try:
+        report = run(settings)
+    except CatalogError as e:
+        raise InitializationError(str(e))
+    for warning in report.warnings:
+        pulumi.log.warn(f"preflight {warning}")
+    if report.errors:
+        raise InitializationError("Preflight found invalid settings:\n  " +
+                                  "\n  ".join(str(error) for error in report.errors))
@@ -0,0 +1,358 @@
+# preflight/rules.py
+"""
+The preflight rule set.
+
+Each rule looks at the validated settings (and the static catalog) and yields
+every violation it finds instead of stopping at the first one. Errors are
+mistakes GCP or GKE would reject, usually only after a long wait; warnings are
+settings that deploy but are likely wrong. Lookups in the catalog (regions,
+zones, machine types, GKE versions) are only errors while the catalog is
+younger than `preflight.catalog_max_age_days`; an older one may simply not
+know what GCP offers today, so they become warnings. Rules are pure and make
+no cloud calls, so the whole set runs in milliseconds.
+"""
+import ipaddress
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from config.schema import Settings
+from monitoring_cluster import tsdb_sizing
+from networking.ipam import IpamError, allocate
+from preflight.catalog import Catalog
+from utils.node_pools import DAEMONSET_MEMORY_MIB, DAEMONSET_MILLICORES, MACHINE_TYPES, RELEASE_CHANNEL
+
+ERROR = "error"
+WARNING = "warning"
+
+# Keys shared by the cluster settings, their subnet (network.clusters) and their node pool settings
+CLUSTERS = ("app_cluster", "monitoring_cluster")
+
+# https://cloud.google.com/resource-manager/docs/creating-managing-projects
+_PROJECT_ID = re.compile(r"^[a-z][a-z0-9-]{4,28}[a-z0-9]$")
+# GKE cluster names: lowercase letters, digits and hyphens, at most 40 characters
+_CLUSTER_NAME = re.compile(r"^[a-z](?:[-a-z0-9]{0,38}[a-z0-9])?$")
+_GKE_VERSION = re.compile(r"^(\d+)\.(\d+)\.(\d+)-gke\.(\d+)$")
+
+NODE_IMAGE_TYPES = ("COS_CONTAINERD", "UBUNTU_CONTAINERD", "WINDOWS_LTSC_CONTAINERD")
+NODE_DISK_TYPES = ("pd-standard", "pd-balanced", "pd-ssd")
+MIN_NODE_DISK_GB = 10
+# GKE hands every node a /24 of the pod range (110 pods per node by default)
+POD_PREFIX_PER_NODE = 24
+# Used by the Docker bridge on the nodes; GKE rejects cluster ranges that overlap it
+DOCKER_BRIDGE = ipaddress.IPv4Network("172.17.0.0/16")
+_RFC1918 = tuple(ipaddress.IPv4Network(cidr) for cidr in ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"))
+
+
+@dataclass(frozen=True)
+class Violation:
+    severity: str
+    rule: str
+    # Settings key the violation is about, e.g. "network.clusters.app_cluster.pods_cidr"
+    path: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.severity}: [{self.rule}] {self.path}: {self.message}"
+
+
+Rule = Callable[[Settings, Catalog], Iterable[Violation]]
+
+
+def _error(rule: str, path: str, message: str) -> Violation:
+    return Violation(ERROR, rule, path, message)
+
+
+def _warning(rule: str, path: str, message: str) -> Violation:
+    return Violation(WARNING, rule, path, message)
+
+
+def _catalog_finding(settings: Settings, catalog: Catalog) -> Callable[[str, str, str], Violation]:
+    """Severity of a value the catalog does not know: an error, or a warning once the catalog is stale."""
+    age = catalog.age_days()
+    if age > settings.preflight.catalog_max_age_days:
+        return lambda rule, path, message: _warning(rule, path, f"{message} (per a {age} day old catalog)")
+    return _error
+
+
+def _clusters(settings: Settings) -> List[str]:
+    """Keys of the clusters the program deploys that also have a subnet."""
+    return [key for key in CLUSTERS if key in settings.network.clusters]
+
+
+def check_names(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    if not _PROJECT_ID.match(settings.project.id):
+        yield _error("names", "project.id", f"'{settings.project.id}' is not a valid project ID")
+    for key in CLUSTERS:
+        name = getattr(settings, key).name
+        if not _CLUSTER_NAME.match(name):
+            yield _error("names", f"{key}.name", f"'{name}' is not a valid GKE cluster name "
+                                                 f"(lowercase letters, digits and hyphens, at most 40)")
+    if settings.app_cluster.name == settings.monitoring_cluster.name \
+            and settings.app_cluster.zone == settings.monitoring_cluster.zone:
+        yield _error("names", "monitoring_cluster.name", "both clusters have the same name in the same zone")
+
+
+def check_locations(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    zones = catalog.zones()
+    finding = _catalog_finding(settings, catalog)
+    for key in CLUSTERS:
+        cluster = getattr(settings, key)
+        if cluster.region not in catalog.regions:
+            yield finding("locations", f"{key}.region", f"unknown region '{cluster.region}'")
+        elif cluster.zone not in zones:
+            yield finding("locations", f"{key}.zone", f"zone '{cluster.zone}' does not exist; {cluster.region} has "
+                                                      f"{', '.join(catalog.regions[cluster.region])}")
+    for key, subnet in settings.network.clusters.items():
+        if subnet.region not in catalog.regions:
+            yield finding("locations", f"network.clusters.{key}.region", f"unknown region '{subnet.region}'")
+
+
+def check_subnet_regions(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    for key in CLUSTERS:
+        cluster = getattr(settings, key)
+        subnet = settings.network.clusters.get(key)
+        if subnet is None:
+            yield _error("subnet-regions", f"network.clusters.{key}", f"{key} has no subnet")
+        elif subnet.region != cluster.region:
+            yield _error("subnet-regions", f"network.clusters.{key}.region",
+                         f"the subnet is in {subnet.region} but the cluster is in {cluster.region}; "
+                         f"a cluster can only use a subnet of its own region")
+
+
+def _pinned_ranges(settings: Settings) -> List[Tuple[str, ipaddress.IPv4Network]]:
+    ranges = []
+    for key, subnet in settings.network.clusters.items():
+        for field in ("subnet_cidr", "pods_cidr", "services_cidr", "master_ipv4_cidr_block"):
+            if getattr(subnet, field):
+                ranges.append((f"network.clusters.{key}.{field}", ipaddress.IPv4Network(getattr(subnet, field))))
+    return ranges
+
+
+def check_ranges(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    """
+    Pinned ranges must not overlap each other, whichever supernet they come
+    from: the IPAM engine keeps VPC and control plane ranges in separate
+    spaces, but GKE rejects a control plane block that collides with any
+    range in the VPC.
+    """
+    ranges = _pinned_ranges(settings)
+    overlapping = False
+    for i, (path, network) in enumerate(ranges):
+        for other_path, other in ranges[i + 1:]:
+            if network.overlaps(other):
+                overlapping = True
+                yield _error("ranges", path, f"{network} overlaps {other_path} ({other})")
+        if network.overlaps(DOCKER_BRIDGE):
+            yield _error("ranges", path, f"{network} overlaps {DOCKER_BRIDGE}, which GKE reserves for Docker")
+        for cidr in settings.network.health_check_ranges:
+            if network.overlaps(ipaddress.IPv4Network(cidr)):
+                yield _warning("ranges", path, f"{network} overlaps the health check range {cidr}")
+
+    for key, subnet in settings.network.clusters.items():
+        if subnet.master_ipv4_cidr_block:
+            block = ipaddress.IPv4Network(subnet.master_ipv4_cidr_block)
+            path = f"network.clusters.{key}.master_ipv4_cidr_block"
+            if block.prefixlen != 28:
+                yield _error("ranges", path, f"GKE needs a /28 for the control plane, got /{block.prefixlen}")
+            if not any(block.subnet_of(private) for private in _RFC1918):
+                yield _error("ranges", path, f"{block} is not a private (RFC 1918) range")
+
+    # Overlaps are already reported above; the allocator would only repeat the first one
+    if not overlapping:
+        try:
+            allocate(settings.network, {})
+        except IpamError as e:
+            yield _error("ranges", "network.ipam", str(e))
+
+
+def _max_nodes(settings: Settings, key: str) -> int:
+    machine = getattr(settings.node_pool, key)
+    nodes = machine.autoscaling.max_nodes if machine.autoscaling.enabled \
+        else machine.node_count if machine.node_count is not None else settings.node_pool.node_count
+    if machine.spot_pool.enabled:
+        spot = machine.spot_pool.autoscaling
+        nodes += spot.max_nodes if spot.enabled else spot.min_nodes
+    return nodes
+
+
+def check_pod_capacity(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    for key in _clusters(settings):
+        subnet = settings.network.clusters[key]
+        prefix = ipaddress.IPv4Network(subnet.pods_cidr).prefixlen if subnet.pods_cidr else subnet.pods_prefix
+        capacity = 2 ** max(0, POD_PREFIX_PER_NODE - prefix)
+        nodes = _max_nodes(settings, key)
+        if nodes > capacity:
+            yield _error("pod-capacity", f"network.clusters.{key}.pods_cidr",
+                         f"a /{prefix} pod range fits {capacity} nodes but the pools of {key} can grow to {nodes}")
+
+
+def _machine_types(settings: Settings, key: str) -> List[Tuple[str, str]]:
+    machine = getattr(settings.node_pool, key)
+    types = [(f"node_pool.{key}.machine_type", machine.machine_type)]
+    if machine.spot_pool.enabled and machine.spot_pool.machine_type:
+        types.append((f"node_pool.{key}.spot_pool.machine_type", machine.spot_pool.machine_type))
+    return types
+
+
+def check_machine_types(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    sizing = tsdb_sizing.estimate(settings)
+    finding = _catalog_finding(settings, catalog)
+    for key in CLUSTERS:
+        zone = getattr(settings, key).zone
+        offered = catalog.machine_types.get(zone)
+        if offered is None:
+            yield _warning("machine-types", f"{key}.zone", f"the catalog has no machine types for {zone}; "
+                                                           f"refresh it to check them")
+            continue
+        types = _machine_types(settings, key)
+        if key == "monitoring_cluster" and settings.monitoring.tsdb.auto_size:
+            types.append(("monitoring.tsdb.auto_size", sizing.machine_type))
+        for path, machine_type in types:
+            if machine_type not in offered:
+                yield finding("machine-types", path, f"machine type '{machine_type}' is not offered in {zone}")
+
+
+def _version_key(version: str) -> Tuple[int, ...]:
+    match = _GKE_VERSION.match(version)
+    return tuple(int(part) for part in match.groups()) if match else ()
+
+
+def check_node_version(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    version = settings.node_pool.node_version
+    if not _GKE_VERSION.match(version):
+        yield _error("node-version", "node_pool.node_version",
+                     f"'{version}' is not a GKE version like 1.30.5-gke.1699000")
+        return
+    finding = _catalog_finding(settings, catalog)
+    for key in CLUSTERS:
+        zone = getattr(settings, key).zone
+        channel = catalog.gke_versions.get(zone, {}).get(RELEASE_CHANNEL)
+        if channel is None:
+            yield _warning("node-version", f"{key}.zone", f"the catalog has no {RELEASE_CHANNEL} versions for {zone}; "
+                                                          f"refresh it to check node_version")
+            continue
+        if version not in channel.valid_versions:
+            newest = ", ".join(channel.valid_versions[:3])
+            yield finding("node-version", "node_pool.node_version",
+                          f"{version} is not offered by the {RELEASE_CHANNEL} channel in {zone} (newest: {newest})")
+        elif _version_key(version) > _version_key(channel.default_version):
+            # An existing cluster's control plane may have been upgraded past the default, so this only warns
+            yield _warning("node-version", "node_pool.node_version",
+                           f"{version} is newer than the control plane of a new {key} ({channel.default_version}); "
+                           f"node pools cannot run ahead of the control plane")
+
+
+def check_node_disks(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    node_pool = settings.node_pool
+    if node_pool.image_type not in NODE_IMAGE_TYPES:
+        yield _error("node-disks", "node_pool.image_type",
+                     f"'{node_pool.image_type}' must be one of {', '.join(NODE_IMAGE_TYPES)}")
+    if node_pool.disk_type not in NODE_DISK_TYPES:
+        yield _error("node-disks", "node_pool.disk_type",
+                     f"'{node_pool.disk_type}' must be one of {', '.join(NODE_DISK_TYPES)}")
+    if node_pool.disk_size_gb < MIN_NODE_DISK_GB:
+        yield _error("node-disks", "node_pool.disk_size_gb", f"GKE needs at least {MIN_NODE_DISK_GB}GB boot disks")
+
+
+def _millicores(quantity: str) -> int:
+    return int(quantity[:-1]) if quantity.endswith("m") else int(float(quantity) * 1000)
+
+
+def check_ingress(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    """The ingress controller's autoscaler can only reach max_replicas if the app pool has room for them."""
+    profile = settings.ingress.active_profile
+    machine = settings.node_pool.app_cluster
+    if machine.machine_type not in MACHINE_TYPES:
+        return
+    nodes = _max_nodes(settings, "app_cluster")
+    allocatable = (MACHINE_TYPES[machine.machine_type][1] - DAEMONSET_MILLICORES) * nodes
+    needed = _millicores(profile.cpu_request) * profile.max_replicas
+    if needed > allocatable:
+        yield _warning("ingress", f"ingress.profiles.{settings.ingress.profile}.max_replicas",
+                       f"{profile.max_replicas} controllers request {needed}m CPU, more than the "
+                       f"{allocatable}m the app pool offers at {nodes} nodes")
+
+
+def _mib(quantity: str) -> int:
+    units = {"Ki": 1 / 1024, "Mi": 1, "Gi": 1024, "Ti": 1024 * 1024}
+    return int(float(quantity[:-2]) * units[quantity[-2:]]) if quantity[-2:] in units else int(quantity) // 2 ** 20
+
+
+def _check_database_requests(settings: Settings) -> Iterable[Violation]:
+    """Postgres must fit on one app node, and the database and ingress pods in the whole app pool."""
+    postgres, pgbouncer = settings.database.postgres, settings.database.pgbouncer
+    machine = settings.node_pool.app_cluster
+    if machine.machine_type not in MACHINE_TYPES:
+        return
+    _, millicores, memory = MACHINE_TYPES[machine.machine_type]
+    node_cpu, node_memory = millicores - DAEMONSET_MILLICORES, memory - DAEMONSET_MEMORY_MIB
+    if _millicores(postgres.cpu_request) > node_cpu or _mib(postgres.memory) > node_memory:
+        yield _warning("database", "database.postgres.memory",
+                       f"the Postgres pod requests {postgres.cpu_request} CPU and {postgres.memory}, more than the "
+                       f"{node_cpu}m and {node_memory}Mi an {machine.machine_type} node leaves to pods; it would "
+                       f"never be scheduled")
+    profile = settings.ingress.active_profile
+    nodes = _max_nodes(settings, "app_cluster")
+    needed_cpu = (_millicores(postgres.cpu_request) + _millicores(pgbouncer.cpu_request) * pgbouncer.replicas
+                  + _millicores(profile.cpu_request) * profile.min_replicas)
+    needed_memory = (_mib(postgres.memory) + _mib(pgbouncer.memory_request) * pgbouncer.replicas
+                     + _mib(profile.memory_request) * profile.min_replicas)
+    if needed_cpu > node_cpu * nodes or needed_memory > node_memory * nodes:
+        yield _warning("database", "database.pgbouncer.replicas",
+                       f"Postgres, {pgbouncer.replicas} PgBouncer replicas and {profile.min_replicas} ingress "
+                       f"controllers request {needed_cpu}m CPU and {needed_memory}Mi, more than the "
+                       f"{node_cpu * nodes}m and {node_memory * nodes}Mi the app pool offers at {nodes} nodes")
+
+
+def check_database(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    """The pools must fit in max_connections, the memory parameters in the Postgres pod, and the pods in the app pool."""
+    database = settings.database
+    if not database.enabled:
+        return
+    postgres, pgbouncer = database.postgres, database.pgbouncer
+    yield from _check_database_requests(settings)
+    # Postgres keeps superuser_reserved_connections (3 by default) for administration
+    available = postgres.max_connections - 3
+    if pgbouncer.max_server_connections > available:
+        yield _warning("database", "database.pgbouncer.default_pool_size",
+                       f"{pgbouncer.replicas} PgBouncer replicas may open {pgbouncer.max_server_connections} "
+                       f"server connections (with their reserve pools), more than the {available} "
+                       f"postgres.max_connections leaves to clients")
+    memory = _mib(postgres.memory)
+    if postgres.shared_buffers_mb > memory * 0.4:
+        yield _warning("database", "database.postgres.shared_buffers_mb",
+                       f"{postgres.shared_buffers_mb}MB of shared buffers is more than 40% of the "
+                       f"{memory}Mi pod; backends and the page cache need the rest")
+    if postgres.effective_cache_size_mb > memory:
+        yield _warning("database", "database.postgres.effective_cache_size_mb",
+                       f"effective_cache_size ({postgres.effective_cache_size_mb}MB) exceeds the {memory}Mi "
+                       f"the pod may use, so the planner overestimates the cache")
+
+
+def check_tsdb(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    for warning in tsdb_sizing.estimate(settings).warnings:
+        yield _warning("tsdb", "monitoring.tsdb", warning)
+
+
+def check_catalog_age(settings: Settings, catalog: Catalog) -> Iterable[Violation]:
+    age = catalog.age_days()
+    if age > settings.preflight.catalog_max_age_days:
+        yield _warning("catalog", "preflight.catalog",
+                       f"the catalog is {age} days old; refresh it with `python -m automation preflight --refresh-catalog`")
+
+
+RULES: Dict[str, Rule] = {
+    "names": check_names,
+    "locations": check_locations,
+    "subnet-regions": check_subnet_regions,
+    "ranges": check_ranges,
+    "pod-capacity": check_pod_capacity,
+    "machine-types": check_machine_types,
+    "node-version": check_node_version,
+    "node-disks": check_node_disks,
+    "ingress": check_ingress,
+    "database": check_database,
+    "tsdb": check_tsdb,
+    "catalog": check_catalog_age,
+}
@@ -0,0 +1,95 @@
+# stacks/layers.py
+"""
+The layered (micro-stack) layout of the infrastructure.
+
+Each layer is its own Pulumi project under stacks/<layer>/, running this same
+program (`main: ../../`). The program looks at the project name to decide
+which layer to deploy; the original `hungry-echoes` project still deploys the
+whole graph. Layers read what they need from the layers below them through
+StackReferences to the stack of the same name, e.g. organization/hungry-echoes-
+app-cluster/dev reads organization/hungry-echoes-network/dev. The one plain
+value they need up front, the IPAM allocation of the cluster layers, is
+recorded in their stack config by automation/ipam.py instead.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import pulumi
+
+# The project that still deploys everything (and the source of the migration)
+MONOLITH_PROJECT = "hungry-echoes"
+
+STACKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass(frozen=True)
+class Layer:
+    name: str
+    # ComponentResource type tokens of the components the layer owns
+    component_types: Tuple[str, ...]
+    # Layers whose outputs this one reads
+    depends_on: Tuple[str, ...] = ()
+
+    @property
+    def project(self) -> str:
+        return f"{MONOLITH_PROJECT}-{self.name}"
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(STACKS_DIR, self.name)
+
+
+# Dependencies first
+LAYERS: Tuple[Layer, ...] = (
+    # The project bootstrap enables the APIs of every layer above
+    Layer("network", ("hungry-echoes:project", "hungry-echoes:network")),
+    Layer("app-cluster", ("hungry-echoes:app",), ("network",)),
+    Layer("monitoring-cluster", ("hungry-echoes:monitoring",), ("network",)),
+    # The app database shares the app cluster's provider with the add-ons
+    Layer("app-addons", ("hungry-echoes:addons", "hungry-echoes:database"), ("app-cluster",)),
+    # The app cluster side is only read in monitoring.scrape.mode "discovery"
+    Layer("monitoring-addons", ("hungry-echoes:monitoring-addons",),
+          ("monitoring-cluster", "app-cluster", "app-addons")),
+)
+
+_BY_NAME = {layer.name: layer for layer in LAYERS}
+
+
+def get_layer(name: str) -> Layer:
+    return _BY_NAME[name]
+
+
+def layer_for_project(project: str) -> Optional[Layer]:
+    """The layer deployed by `project`, or None for the monolithic project."""
+    for layer in LAYERS:
+        if layer.project == project:
+            return layer
+    return None
+
+
+def layer_stack_name(layer: Layer, stack: str, organization: str) -> str:
+    return f"{organization}/{layer.project}/{stack}"
+
+
+class LayerReferences:
+    """
+    Lazily created StackReferences to the layers below the current one.
+
+    `output` returns an Output for wiring into resources.
+    """
+
+    def __init__(self, layer: Layer):
+        self.layer = layer
+        self._references: Dict[str, pulumi.StackReference] = {}
+
+    def _reference(self, name: str) -> pulumi.StackReference:
+        if name not in self.layer.depends_on:
+            raise ValueError(f"layer '{self.layer.name}' does not depend on layer '{name}'")
+        if name not in self._references:
+            stack_name = layer_stack_name(get_layer(name), pulumi.get_stack(), pulumi.get_organization())
+            self._references[name] = pulumi.StackReference(f"{name}-layer", stack_name=stack_name)
+        return self._references[name]
+
+    def output(self, name: str, key: str) -> pulumi.Output:
+        return self._reference(name).require_output(key)
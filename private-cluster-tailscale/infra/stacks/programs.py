@@ -0,0 +1,230 @@
+# stacks/programs.py
+"""
+Building blocks of the program, shared by the monolithic project and the layer
+projects (see stacks/layers.py).
+
+The `deploy_*` functions create one component each with the resource options
+it always had, so a resource moved from the monolithic stack into a layer
+stack is created with identical inputs and is not replaced. `run` deploys a
+single layer, reading its inputs from the layers below it.
+"""
+from typing import Dict, Sequence
+
+import pulumi
+
+from app_cluster.app_cluster import AppCluster
+from app_cluster.app_cluster_add_ons import AppClusterAddons
+from app_cluster.database import AppDatabase
+from bootstrap.project_bootstrap import ProjectBootstrap, required_services
+from config.schema import Settings
+from monitoring_cluster.monitoring_cluster import MonitoringCluster
+from monitoring_cluster.monitoring_cluster_add_ons import MonitoringClusterAddons
+from monitoring_cluster.scrape_config import AppClusterDiscovery
+from networking.ipam import allocate, load_previous_allocations
+from networking.network import Network
+from stacks.layers import Layer, LayerReferences
+from utils.providers import InitializationError, create_gcp_provider, create_kube_provider
+
+
+def _timeouts(duration: str) -> pulumi.CustomTimeouts:
+    return pulumi.CustomTimeouts(create=duration, update=duration, delete=duration)
+
+
+def _addons_opts(provider, depends_on: Sequence[pulumi.Resource]) -> pulumi.ResourceOptions:
+    return pulumi.ResourceOptions(
+        provider=provider,
+        depends_on=list(depends_on),
+        # Add custom timeouts for add-on operations
+        custom_timeouts=_timeouts("20m"),
+        # Ensure proper cleanup
+        delete_before_replace=True,
+        # Add ignore_changes for specific fields that cause unnecessary updates
+        ignore_changes=["metadata.annotations", "metadata.labels"]
+    )
+
+
+def deploy_project_bootstrap(settings: Settings, gcp_provider) -> ProjectBootstrap:
+    """Enables the APIs of every GCP component, once for the project."""
+    return ProjectBootstrap(
+        settings.pulumi_provider.project_bootstrap_name,
+        settings,
+        services=required_services([Network, AppCluster, MonitoringCluster]),
+        # The app cluster used to enable the APIs itself
+        legacy_parent=settings.pulumi_provider.app_cluster_provider_name,
+        opts=pulumi.ResourceOptions(provider=gcp_provider)
+    )
+
+
+def deploy_network(settings: Settings, gcp_provider, depends_on: Sequence[pulumi.Resource] = ()) -> Network:
+    return Network(settings, opts=pulumi.ResourceOptions(
+        provider=gcp_provider,
+        depends_on=list(depends_on),
+        # Add custom timeouts for network operations
+        custom_timeouts=_timeouts("30m"),
+        # Add proper deletion strategy
+        delete_before_replace=True,
+    ))
+
+
+def deploy_app_cluster(settings: Settings, gcp_provider, vpc_id, subnet_id, allocation,
+                       depends_on: Sequence[pulumi.Resource] = ()) -> AppCluster:
+    return AppCluster(
+        settings.pulumi_provider.app_cluster_provider_name,
+        settings,
+        vpc_id=vpc_id,
+        subnet_id=subnet_id,
+        allocation=allocation,
+        opts=pulumi.ResourceOptions(
+            provider=gcp_provider,
+            depends_on=list(depends_on),
+            # Add custom timeouts for cluster operations
+            custom_timeouts=_timeouts("45m"),
+            # Ensure proper cleanup on failure
+            delete_before_replace=True,
+        )
+    )
+
+
+def deploy_monitoring_cluster(settings: Settings, gcp_provider, vpc_id, subnet_id, allocation,
+                              depends_on: Sequence[pulumi.Resource] = ()) -> MonitoringCluster:
+    return MonitoringCluster(
+        settings.pulumi_provider.monitoring_cluster_provider_name,
+        settings,
+        vpc_id=vpc_id,
+        subnet_id=subnet_id,
+        allocation=allocation,
+        opts=pulumi.ResourceOptions(
+            provider=gcp_provider,
+            depends_on=list(depends_on),
+            # Add custom timeouts
+            custom_timeouts=_timeouts("45m"),
+            # Ensure proper cleanup
+            delete_before_replace=True,
+        )
+    )
+
+
+def deploy_app_addons(settings: Settings, k8s_provider,
+                      depends_on: Sequence[pulumi.Resource] = ()) -> AppClusterAddons:
+    return AppClusterAddons(
+        settings.pulumi_provider.app_addons_provider_name,
+        settings,
+        opts=_addons_opts(k8s_provider, depends_on)
+    )
+
+
+def deploy_app_database(settings: Settings, k8s_provider,
+                        depends_on: Sequence[pulumi.Resource] = ()) -> AppDatabase:
+    return AppDatabase(
+        settings.pulumi_provider.app_database_name,
+        settings,
+        opts=_addons_opts(k8s_provider, depends_on)
+    )
+
+
+def deploy_monitoring_addons(settings: Settings, k8s_provider, discovery: AppClusterDiscovery = None,
+                             depends_on: Sequence[pulumi.Resource] = ()) -> MonitoringClusterAddons:
+    return MonitoringClusterAddons(
+        settings.pulumi_provider.monitoring_addons_provider_name,
+        settings,
+        discovery=discovery,
+        opts=_addons_opts(k8s_provider, depends_on)
+    )
+
+
+def _export_cluster(cluster):
+    """Outputs the layers above a cluster layer need to build a Kubernetes provider."""
+    pulumi.export("cluster_name", cluster.cluster.name)
+    pulumi.export("cluster_endpoint", cluster.cluster.endpoint)
+    pulumi.export("cluster_ca_certificate", cluster.cluster.master_auth.cluster_ca_certificate)
+
+
+def _kube_provider(references: LayerReferences, cluster_layer: str, zone: str, name: str, settings: Settings):
+    return create_kube_provider(
+        references.output(cluster_layer, "cluster_name"),
+        references.output(cluster_layer, "cluster_endpoint"),
+        # Shaped like the cluster's master_auth, which is all the kubeconfig reads from it
+        references.output(cluster_layer, "cluster_ca_certificate").apply(lambda ca: {"cluster_ca_certificate": ca}),
+        settings.project.id,
+        zone,
+        name,
+        settings.kubernetes
+    )
+
+
+def _allocation(settings: Settings, key: str):
+    """
+    The cluster's ranges as allocated by the network layer. automation/ipam.py
+    records the network's exported ranges in this stack's config; re-running
+    the allocation with them as the previous run yields the network's result,
+    and a difference means the network layer is behind. Without a record (a
+    plain `pulumi up`) the ranges come from the settings alone.
+    """
+    exported = load_previous_allocations(settings.network)
+    allocation = allocate(settings.network, exported)[key]
+    if exported is None:
+        return allocation
+    # Unset ranges (None) may not survive the round trip through the stack outputs
+    ranges = {field: value for field, value in allocation.to_output().items() if value is not None}
+    if ranges != {field: value for field, value in (exported.get(key) or {}).items() if value is not None}:
+        raise InitializationError(f"The network layer's ranges for {key} do not match the settings; "
+                                  f"update the network layer first")
+    return allocation
+
+
+def run(layer: Layer, settings: Settings) -> Dict[str, pulumi.Resource]:
+    """
+    Deploys one layer.
+
+    Returns:
+        The components created by the layer, by name
+    """
+    references = LayerReferences(layer)
+
+    if layer.name == "network":
+        gcp_provider = create_gcp_provider(settings)
+        # The APIs of the clusters too: the layers above only start once this one is up
+        bootstrap = deploy_project_bootstrap(settings, gcp_provider)
+        pulumi.export("enabled_services", bootstrap.ready)
+        # Until the first layered run, automation/ipam.py records the monolithic stack's ranges
+        network = deploy_network(settings, gcp_provider, depends_on=[bootstrap])
+        return {"project_bootstrap": bootstrap, "network": network}
+
+    if layer.name in ("app-cluster", "monitoring-cluster"):
+        key = layer.name.replace("-", "_")
+        deploy = deploy_app_cluster if key == "app_cluster" else deploy_monitoring_cluster
+        cluster = deploy(
+            settings,
+            create_gcp_provider(settings),
+            vpc_id=references.output("network", "vpc_id"),
+            subnet_id=references.output("network", f"{key.removesuffix('_cluster')}_subnet_id"),
+            allocation=_allocation(settings, key),
+        )
+        _export_cluster(cluster)
+        return {key: cluster}
+
+    if layer.name == "app-addons":
+        provider = _kube_provider(references, "app-cluster", settings.app_cluster.zone,
+                                  settings.pulumi_provider.app_cluster_k8s_provider_name, settings)
+        app_addons = deploy_app_addons(settings, provider)
+        if app_addons.metrics_discovery_token is not None:
+            pulumi.export("metrics_discovery_token", app_addons.metrics_discovery_token)
+        components = {"app_addons": app_addons}
+        if settings.database.enabled:
+            components["app_database"] = deploy_app_database(settings, provider)
+        return components
+
+    if layer.name == "monitoring-addons":
+        provider = _kube_provider(references, "monitoring-cluster", settings.monitoring_cluster.zone,
+                                  settings.pulumi_provider.monitoring_cluster_k8s_provider_name, settings)
+        discovery = None
+        if settings.monitoring.scrape.mode == "discovery":
+            discovery = AppClusterDiscovery(
+                api_server=references.output("app-cluster", "cluster_endpoint").apply(
+                    lambda endpoint: f"https://{endpoint}"),
+                ca_certificate=references.output("app-cluster", "cluster_ca_certificate"),
+                token=references.output("app-addons", "metrics_discovery_token")
+            )
+        return {"monitoring_addons": deploy_monitoring_addons(settings, provider, discovery)}
+
+    raise ValueError(f"Unknown layer '{layer.name}'")
@@ -0,0 +1,249 @@
+# utils/helm.py
+"""
+Content-addressed local cache for the Helm charts used by the add-on components.
+
+Charts are pinned by version in settings.yaml and verified by the sha256 digest
+published in the repository index (and, when set, the digest pinned in
+settings.yaml). Archives are stored under their digest and unpacked once, so every
+run and every stack on the machine reuses the same copy. With `charts.offline`
+the network is never touched and a cache miss is an error.
+
+`install_chart` deploys a cached chart either as individually tracked objects
+(`helm.v3.Chart`) or as a single tracked Helm release (`helm.v3.Release`),
+depending on `charts.install_mode`.
+
+Migrating an existing stack from "chart" to "release" mode without recreating
+the add-ons:
+    1. Set `charts.migrate_to_release: true` and run `pulumi up`. The rendered
+       objects get Helm's ownership metadata and `retain_on_delete`.
+    2. Set `charts.install_mode: release` and run `pulumi up`. Pulumi drops the
+       per-object resources from state (they stay in the cluster) and Helm adopts
+       them into the release, which uses the same release name.
+    3. Set `charts.migrate_to_release` back to false.
+"""
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import urllib.request
+from typing import Any, Dict, Optional, Union
+from urllib.parse import urljoin
+
+import yaml
+from pulumi import ResourceOptions
+from pulumi_kubernetes.helm.v3 import Chart, LocalChartOpts, Release, ReleaseArgs
+
+from config.schema import ChartSettings, ChartsSettings
+
+
+class ChartCacheError(Exception):
+    pass
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """
+    Layout under `cache_dir`:
+        index/<chart>-<version>   digest of the archive for that pinned version
+        blobs/<digest>.tgz        chart archive, named by its sha256
+        charts/<digest>/<chart>/  unpacked chart, usable as a local chart path
+    """
+
+    def __init__(self, cache_dir: str, offline: bool = False):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.offline = offline
+        self._resolved: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def _index_file(self, chart: ChartSettings) -> str:
+        return os.path.join(self.cache_dir, 'index', f"{chart.chart}-{chart.version}")
+
+    def _blob_file(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, 'blobs', f"{digest}.tgz")
+
+    def _chart_dir(self, digest: str, chart: ChartSettings) -> str:
+        return os.path.join(self.cache_dir, 'charts', digest, chart.chart)
+
+    def _cached_digest(self, chart: ChartSettings) -> Optional[str]:
+        try:
+            with open(self._index_file(chart)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # Atomic, so concurrent stacks sharing the cache never see partial files
+        os.replace(tmp, path)
+
+    def _download(self, chart: ChartSettings) -> str:
+        """Downloads the pinned version, verifies it and returns its digest."""
+        if self.offline:
+            raise ChartCacheError(
+                f"Chart {chart.chart} {chart.version} is not cached and charts.offline is set; "
+                f"run `python -m automation charts pull` with network access first")
+
+        repo = chart.repo.rstrip('/') + '/'
+        with urllib.request.urlopen(urljoin(repo, 'index.yaml'), timeout=60) as response:
+            index = yaml.safe_load(response.read())
+
+        entries = [e for e in index.get('entries', {}).get(chart.chart, []) if e.get('version') == chart.version]
+        if not entries:
+            raise ChartCacheError(f"Chart {chart.chart} {chart.version} not found in {chart.repo}")
+        entry = entries[0]
+
+        with urllib.request.urlopen(urljoin(repo, entry['urls'][0]), timeout=120) as response:
+            data = response.read()
+        digest = hashlib.sha256(data).hexdigest()
+
+        if entry.get('digest') and entry['digest'] != digest:
+            raise ChartCacheError(
+                f"Chart {chart.chart} {chart.version}: downloaded digest {digest} does not match "
+                f"the repository index ({entry['digest']})")
+
+        self._write_atomic(self._blob_file(digest), data)
+        self._write_atomic(self._index_file(chart), digest.encode())
+        return digest
+
+    def _unpack(self, digest: str, chart: ChartSettings) -> str:
+        target = self._chart_dir(digest, chart)
+        if os.path.isdir(target):
+            return target
+
+        parent = os.path.dirname(target)
+        os.makedirs(os.path.dirname(parent), exist_ok=True)
+        staging = tempfile.mkdtemp(dir=os.path.dirname(parent))
+        try:
+            with tarfile.open(self._blob_file(digest)) as archive:
+                if hasattr(tarfile, 'data_filter'):
+                    archive.extractall(staging, filter='data')
+                else:
+                    archive.extractall(staging)
+            if not os.path.isdir(os.path.join(staging, chart.chart)):
+                raise ChartCacheError(f"Archive {digest} does not contain a '{chart.chart}' chart")
+            os.rename(staging, parent)
+        except OSError:
+            # Another process unpacked the same digest first
+            if not os.path.isdir(target):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return target
+
+    def resolve(self, chart: ChartSettings) -> str:
+        """
+        Returns the path of the unpacked chart, downloading it on a cache miss.
+
+        Raises:
+            ChartCacheError: If the chart cannot be fetched or fails digest verification
+        """
+        key = (chart.chart, chart.version, chart.digest)
+        with self._lock:
+            if key in self._resolved:
+                return self._resolved[key]
+
+            digest = self._cached_digest(chart)
+            if digest is None or not os.path.exists(self._blob_file(digest)):
+                digest = self._download(chart)
+            elif _sha256(self._blob_file(digest)) != digest:
+                # Corrupted cache entry; fetch it again
+                digest = self._download(chart)
+
+            if chart.digest and chart.digest != digest:
+                raise ChartCacheError(
+                    f"Chart {chart.chart} {chart.version} has digest {digest}, "
+                    f"but settings.yaml pins {chart.digest}")
+
+            path = self._resolved[key] = self._unpack(digest, chart)
+            return path
+
+    def digest(self, chart: ChartSettings) -> Optional[str]:
+        """Returns the cached digest of `chart`, if any."""
+        return self._cached_digest(chart)
+
+
+_caches: Dict[tuple, ChartCache] = {}
+
+
+def get_chart_cache(charts: ChartsSettings) -> ChartCache:
+    """Returns the process-wide cache for the given chart settings."""
+    key = (charts.cache_dir, charts.offline)
+    if key not in _caches:
+        _caches[key] = ChartCache(charts.cache_dir, charts.offline)
+    return _caches[key]
+
+
+def _helm_ownership(release_name: str, namespace: str):
+    """Chart transformation that marks rendered objects as owned by a Helm release."""
+    def transform(obj: Dict[str, Any], opts: ResourceOptions):
+        metadata = obj.setdefault("metadata", {})
+        annotations = metadata.get("annotations") or {}
+        annotations["meta.helm.sh/release-name"] = release_name
+        annotations["meta.helm.sh/release-namespace"] = namespace
+        metadata["annotations"] = annotations
+        labels = metadata.get("labels") or {}
+        labels["app.kubernetes.io/managed-by"] = "Helm"
+        metadata["labels"] = labels
+        # Keep the object in the cluster when it leaves Pulumi state
+        opts.retain_on_delete = True
+    return transform
+
+
+def install_chart(name: str, chart: ChartSettings, charts: ChartsSettings, namespace: str,
+                  values: Dict[str, Any], opts: ResourceOptions) -> Union[Chart, Release]:
+    """
+    Installs a cached chart according to `charts.install_mode`.
+
+    Args:
+        name: Pulumi resource name; also used as the Helm release name in both modes,
+              so rendered object names stay identical when switching modes
+        chart: The pinned chart to install
+        charts: Chart settings (cache, install mode, release semantics)
+        namespace: Namespace the chart is installed into
+        values: Helm values
+        opts: Resource options for the Chart/Release
+
+    Returns:
+        The `Chart` or `Release` resource
+    """
+    path = get_chart_cache(charts).resolve(chart)
+
+    if charts.install_mode == "release":
+        return Release(
+            name,
+            ReleaseArgs(
+                name=name,
+                chart=path,
+                namespace=namespace,
+                values=values,
+                atomic=charts.release.atomic,
+                cleanup_on_fail=charts.release.cleanup_on_fail,
+                skip_await=not charts.release.wait,
+                timeout=charts.release.timeout,
+            ),
+            opts=opts
+        )
+
+    transformations = [_helm_ownership(name, namespace)] if charts.migrate_to_release else None
+    return Chart(
+        name,
+        LocalChartOpts(
+            path=path,
+            namespace=namespace,
+            values=values,
+            transformations=transformations,
+        ),
+        opts=opts
+    )
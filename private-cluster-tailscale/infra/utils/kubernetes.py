@@ -1,20 +1,86 @@
 # app_cluster/utils/kubernetes.py
+import datetime
+import threading
 import yaml
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
-def create_kubeconfig_from_promise(args, project_id, zone):
+import pulumi
+
+AUTH_MODE_EXEC = "exec"
+AUTH_MODE_TOKEN = "token"
+
+_CLOUD_PLATFORM_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
+
+
+class _AccessTokenCache:
+    """
+    Process-wide cache of a Google OAuth access token.
+
+    Every kubeconfig built in this process (app and monitoring providers alike)
+    shares the same token, which is only re-minted shortly before it expires.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._token: Optional[str] = None
+        self._expiry: Optional[datetime.datetime] = None
+
+    def get(self, refresh_margin: int) -> Tuple[str, datetime.datetime]:
+        # Imported lazily so the exec mode keeps working without google-auth installed
+        import google.auth
+        import google.auth.transport.requests
+
+        with self._lock:
+            # google-auth reports expiry as a naive UTC datetime
+            now = datetime.datetime.utcnow()
+            margin = datetime.timedelta(seconds=refresh_margin)
+            if self._token is None or self._expiry is None or self._expiry - margin <= now:
+                if self._credentials is None:
+                    self._credentials, _ = google.auth.default(scopes=[_CLOUD_PLATFORM_SCOPE])
+                self._credentials.refresh(google.auth.transport.requests.Request())
+                self._token = self._credentials.token
+                self._expiry = self._credentials.expiry or now + datetime.timedelta(minutes=55)
+            return self._token, self._expiry
+
+
+_token_cache = _AccessTokenCache()
+
+
+def get_access_token(refresh_margin: int = 300) -> str:
+    """
+    Returns a cached access token for the ambient Google credentials, minting a
+    new one when fewer than `refresh_margin` seconds of validity are left.
+    """
+    return _token_cache.get(refresh_margin)[0]
+
+
+def create_kubeconfig_from_promise(args, project_id, zone, auth_mode=AUTH_MODE_EXEC, refresh_margin=300):
     return create_kubeconfig(
                     cluster_name=args[0],
                     endpoint=args[1],
                     cluster_ca=args[2]["cluster_ca_certificate"],
                     project_id=project_id,
-                    zone=zone
+                    zone=zone,
+                    auth_mode=auth_mode,
+                    refresh_margin=refresh_margin
                 )
 
-def create_kubeconfig(cluster_name: str, endpoint: str, cluster_ca: str, project_id: str, zone: str) -> str:
+def create_kubeconfig(cluster_name: str, endpoint: str, cluster_ca: str, project_id: str, zone: str,
+                      auth_mode: str = AUTH_MODE_EXEC, refresh_margin: int = 300) -> str:
     """
-    Creates a kubeconfig string for GKE cluster authentication using the new
-    gke-gcloud-auth-plugin.
+    Creates a kubeconfig string for GKE cluster authentication.
+
+    In "token" mode the kubeconfig carries a bearer token minted in-process (and
+    cached, see `get_access_token`), so the Kubernetes provider does not spawn
+    gke-gcloud-auth-plugin for every client it builds. If no token can be minted
+    (google-auth missing, no ambient credentials) it falls back to "exec" mode,
+    which uses the gke-gcloud-auth-plugin.
+
+    "token" mode is opt-in: the kubeconfig is a provider input and ends up in the
+    state with the token in it. The token expires after about an hour, so a
+    `pulumi refresh` or `destroy` that reads the provider from state fails with
+    401, and the kubeconfig (and so the provider) differs on every run.
     
     Args:
         cluster_name: Name of the GKE cluster
@@ -22,19 +88,30 @@ def create_kubeconfig(cluster_name: str, endpoint: str, cluster_ca: str, project
         cluster_ca: Cluster CA certificate data
         project_id: GCP project ID
         zone: GCP zone where cluster is located
+        auth_mode: "token" or "exec"
+        refresh_margin: Seconds before expiry at which a cached token is re-minted
         
     Returns:
         A YAML string containing the kubeconfig
     """
+    token = None
+    if auth_mode == AUTH_MODE_TOKEN:
+        try:
+            token = get_access_token(refresh_margin)
+        except Exception as e:
+            pulumi.log.warn(f"Could not mint a GKE access token in-process ({e}); "
+                            f"falling back to gke-gcloud-auth-plugin")
+
     return yaml.dump(_build_kubeconfig_dict(
-        cluster_name, endpoint, cluster_ca, project_id, zone))
+        cluster_name, endpoint, cluster_ca, project_id, zone, token))
 
 def _build_kubeconfig_dict(cluster_name: str, endpoint: str, cluster_ca: str,
-                          project_id: str, zone: str) -> Dict[str, Any]:
+                          project_id: str, zone: str, token: Optional[str] = None) -> Dict[str, Any]:
     """
-    Builds the kubeconfig dictionary structure with the new GKE auth plugin.
+    Builds the kubeconfig dictionary structure, authenticating with a bearer
+    token when one is given and with the GKE auth plugin otherwise.
     
-    This implementation uses the gke-gcloud-auth-plugin which is the new
+    The exec path uses the gke-gcloud-auth-plugin which is the new
     standard for GKE authentication as of 2023.
     """
     context_name = f"gke_{project_id}_{zone}_{cluster_name}"
@@ -59,7 +136,7 @@ def _build_kubeconfig_dict(cluster_name: str, endpoint: str, cluster_ca: str,
         }],
         "users": [{
             "name": context_name,
-            "user": {
+            "user": {"token": token} if token else {
                 "exec": {
                     "apiVersion": "client.authentication.k8s.io/v1beta1",
                     "command": "gke-gcloud-auth-plugin",
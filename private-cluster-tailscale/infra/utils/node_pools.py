@@ -0,0 +1,102 @@
+# utils/node_pools.py
+"""
+Sizing and configuration arguments shared by the node pools of both clusters.
+"""
+from typing import Any, Dict, Tuple
+
+from config.schema import AutoscalingSettings, ClusterSettings, MachineSettings, NodePoolSettings, Settings
+
+# Allocatable resources of GKE nodes, after the kubelet, system and eviction reservations.
+# Ordered from smallest to largest; the planners pick the first type that fits.
+MACHINE_TYPES: Dict[str, Tuple[int, int, int]] = {
+    # machine type: (vCPUs, allocatable millicores, allocatable memory MiB)
+    "e2-small": (2, 940, 1433),
+    "e2-medium": (2, 940, 2970),
+    "e2-standard-2": (2, 1930, 6246),
+    "e2-standard-4": (4, 3920, 13619),
+    "e2-standard-8": (8, 7910, 29020),
+    "e2-standard-16": (16, 15890, 59822),
+}
+
+# Release channel of both clusters; node_pool.node_version must be offered in it
+RELEASE_CHANNEL = "STABLE"
+
+# Taken on every node by kube-system daemonsets (logging, metrics, kube-proxy, tailscale)
+DAEMONSET_MILLICORES = 250
+DAEMONSET_MEMORY_MIB = 400
+
+
+def scaling_args(autoscaling: AutoscalingSettings, node_count: int) -> Dict[str, Any]:
+    """
+    Returns the container.NodePool arguments that size a pool.
+
+    With autoscaling on, `node_count` is left out entirely: it is computed by the
+    provider, so the autoscaler can resize the pool without Pulumi fighting it.
+    """
+    if not autoscaling.enabled:
+        return {"node_count": node_count}
+    return {
+        "autoscaling": {
+            "min_node_count": autoscaling.min_nodes,
+            "max_node_count": autoscaling.max_nodes,
+            "location_policy": autoscaling.location_policy,
+        }
+    }
+
+
+def pool_scaling_args(node_pool: NodePoolSettings, machine: MachineSettings) -> Dict[str, Any]:
+    """Sizing of the regular pool of a cluster."""
+    node_count = machine.node_count if machine.node_count is not None else node_pool.node_count
+    return scaling_args(machine.autoscaling, node_count)
+
+
+def spot_pool_scaling_args(machine: MachineSettings) -> Dict[str, Any]:
+    """Sizing of the optional spot pool of a cluster."""
+    autoscaling = machine.spot_pool.autoscaling
+    return scaling_args(autoscaling, autoscaling.min_nodes)
+
+
+def node_pool_args(settings: Settings, cluster: ClusterSettings, machine: MachineSettings, machine_type: str,
+                   spot: bool = False) -> Dict[str, Any]:
+    """
+    Returns the container.NodePool arguments of a cluster's regular pool, or of
+    its spot pool when `spot` is set; the caller adds the cluster and options.
+
+    Args:
+        settings: Shared settings (node version, disks, network profile)
+        cluster: The cluster the pool belongs to
+        machine: The cluster's entry in `node_pool` (app_cluster or monitoring_cluster)
+        machine_type: Machine type of the regular pool; the spot pool may override it
+    """
+    suffix = "spot-node-pool" if spot else "node-pool"
+    return {
+        "name": f"{cluster.name}-{suffix}",
+        "location": cluster.zone,
+
+        # Fixed size, or autoscaler bounds
+        **(spot_pool_scaling_args(machine) if spot else pool_scaling_args(settings.node_pool, machine)),
+
+        "version": settings.node_pool.node_version,
+
+        "node_config": {
+            "machine_type": (machine.spot_pool.machine_type or machine_type) if spot else machine_type,
+            "spot": spot,
+            # gVNIC as set by the network profile (omitted when off, as before profiles existed)
+            **({"gvnic": {"enabled": True}} if settings.network.active_profile.gvnic else {}),
+            "disk_size_gb": settings.node_pool.disk_size_gb,
+            "disk_type": settings.node_pool.disk_type,
+            "image_type": settings.node_pool.image_type,
+
+            # OAuth scopes
+            "oauth_scopes": [
+                "https://www.googleapis.com/auth/logging.write",
+                "https://www.googleapis.com/auth/monitoring",
+                "https://www.googleapis.com/auth/devstorage.read_only"
+            ],
+
+            # Enable workload identity
+            "workload_metadata_config": {
+                "mode": "GKE_METADATA"
+            },
+        },
+    }
@@ -0,0 +1,29 @@
+# utils/prometheus.py
+"""
+Pod spec pieces shared by the Prometheus server (monitoring cluster) and the
+Prometheus agent (app cluster).
+"""
+from typing import Any, Dict
+
+CONFIG_DIR = "/etc/prometheus"
+CONFIG_VOLUME = "prometheus-config"
+
+
+def config_reloader_container(image: str) -> Dict[str, Any]:
+    """
+    Sidecar that calls /-/reload when the mounted config changes, so config
+    updates apply without restarting the pod (Prometheus needs --web.enable-lifecycle).
+    """
+    return {
+        "name": "config-reloader",
+        "image": image,
+        "args": [
+            f"--watched-dir={CONFIG_DIR}",
+            "--reload-url=http://127.0.0.1:9090/-/reload",
+        ],
+        "volume_mounts": [{"name": CONFIG_VOLUME, "mount_path": f"{CONFIG_DIR}/"}],
+        "resources": {
+            "requests": {"cpu": "10m", "memory": "16Mi"},
+            "limits": {"cpu": "50m", "memory": "32Mi"}
+        }
+    }
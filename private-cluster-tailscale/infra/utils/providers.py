@@ -0,0 +1,58 @@
+# utils/providers.py
+"""
+Provider factories shared by the monolithic program and the layer programs
+(see stacks/).
+"""
+import pulumi
+from pulumi_gcp import Provider as GCPProvider
+from pulumi_kubernetes import Provider as K8sProvider
+
+from config.schema import KubernetesSettings, Settings
+from utils.kubernetes import create_kubeconfig_from_promise
+
+
+# Custom exception for initialization failures
+class InitializationError(Exception):
+    pass
+
+
+def create_gcp_provider(settings: Settings, timeout="120s", gcp_provider_name="gcp-provider"):
+    """
+    Creates and configures the GCP provider with proper error handling.
+    Returns tuple of (gcp_provider, project_id)
+    """
+    try:
+        # Configure the GCP provider with project settings
+        gcp_provider = GCPProvider(gcp_provider_name,
+            project=settings.project.id,
+            # Add retry configurations for API calls
+            request_timeout=timeout,  # Increase timeout for API calls
+        )
+        return gcp_provider
+    except Exception as e:
+        raise InitializationError(f"Failed to create GCP provider: {str(e)}")
+
+
+def create_kube_provider(cluster_name, cluster_endpoint, cluster_master_auth, project_id, zone,
+                         kube_provider_name, auth: KubernetesSettings):
+    """
+    Creates the Kubernetes provider with proper error handling and retry logic.
+    The cluster name, endpoint and master auth may come from a cluster in this
+    program or from another stack's outputs.
+    With `auth.auth_mode == "token"` the kubeconfig embeds a cached, in-process
+    minted access token instead of the gke-gcloud-auth-plugin exec entry (opt-in;
+    the token is stored in, and expires in, the provider state).
+    """
+
+    try:
+        kubeconfig = pulumi.Output.all(
+                cluster_name,
+                cluster_endpoint,
+                cluster_master_auth
+            ).apply(lambda args: create_kubeconfig_from_promise(
+                args, project_id, zone, auth.auth_mode, auth.token_refresh_margin))
+        # The kubeconfig may carry a bearer token; keep it out of plaintext state
+        return K8sProvider(kube_provider_name, kubeconfig=pulumi.Output.secret(kubeconfig))
+
+    except Exception as e:
+        raise InitializationError(f"Failed to create Kubernetes provider: {str(e)}")
@@ -0,0 +1,145 @@
+# utils/tailscale.py
+"""
+Tailscale operator and proxy resources shared by the add-ons of both clusters.
+
+Without extra configuration the operator gives every tailnet Service its own
+single proxy pod with default resources, so each cross-cluster flow depends on
+one pod. From the `tailscale` settings this module adds:
+
+- a ProxyClass, made the operator's default, with resource requests and the
+  kernel or userspace networking mode for every proxy;
+- an optional egress ProxyGroup whose replicas share the egress Services that
+  are annotated with it (see `egress_annotations`), for throughput and failover;
+- an optional Connector acting as a subnet router and/or exit node.
+
+The custom resources need the CRDs of the operator chart, so they are only
+created together with the chart.
+"""
+from typing import Any, Dict, List, Optional
+
+from pulumi import ResourceOptions
+from pulumi.resource import Resource
+from pulumi_kubernetes.apiextensions import CustomResource
+
+from config.schema import Settings, TailscaleClusterSettings
+from utils.helm import install_chart
+
+API_VERSION = "tailscale.com/v1alpha1"
+
+
+def _proxy_class_spec(settings: Settings) -> Dict[str, Any]:
+    proxy_class = settings.tailscale.proxy_class
+    requests = {"cpu": proxy_class.cpu_request, "memory": proxy_class.memory_request}
+    limits = {key: value for key, value in (("cpu", proxy_class.cpu_limit), ("memory", proxy_class.memory_limit))
+              if value}
+    container: Dict[str, Any] = {"resources": {"requests": requests, **({"limits": limits} if limits else {})}}
+    if proxy_class.mode == "userspace":
+        # Overrides the operator's own TS_USERSPACE=false; the proxy then needs no privileges
+        container["env"] = [{"name": "TS_USERSPACE", "value": "true"}]
+    spec: Dict[str, Any] = {"statefulSet": {"pod": {"tailscaleContainer": container}}}
+    if proxy_class.accept_routes:
+        spec["tailscale"] = {"acceptRoutes": True}
+    return spec
+
+
+def install_operator(name: str, settings: Settings, cluster: TailscaleClusterSettings,
+                     client_id: str, client_secret: str, opts: ResourceOptions) -> Resource:
+    """
+    Installs the operator chart with the shared ProxyClass as the default for every proxy.
+
+    Args:
+        name: Pulumi resource name (and Helm release name) of the chart
+        settings: Shared, already validated settings
+        cluster: Tailscale options of the cluster the chart goes to
+        client_id: OAuth client ID of the operator
+        client_secret: OAuth client secret of the operator
+        opts: Resource options of the chart
+    """
+    return install_chart(
+        name,
+        settings.charts.tailscale_operator,
+        settings.charts,
+        namespace="tailscale",
+        values={
+            "oauth": {
+                "clientId": client_id,
+                "clientSecret": client_secret
+            },
+            "operator": {
+                "hostname": cluster.operator_hostname
+            },
+            "proxyConfig": {
+                "defaultProxyClass": settings.tailscale.proxy_class.name
+            }
+        },
+        opts=opts
+    )
+
+
+def deploy_proxies(prefix: str, settings: Settings, cluster: TailscaleClusterSettings,
+                   opts: ResourceOptions) -> List[CustomResource]:
+    """
+    Creates the ProxyClass and, when enabled, the egress ProxyGroup and the Connector.
+
+    Args:
+        prefix: Prefix of the Pulumi resource names, unique per cluster
+        settings: Shared, already validated settings
+        cluster: Tailscale options of this cluster
+        opts: Resource options; should depend on the operator chart (for its CRDs)
+
+    Returns:
+        The created custom resources
+    """
+    tailscale = settings.tailscale
+    proxy_class = CustomResource(
+        f"{prefix}-tailscale-proxy-class",
+        api_version=API_VERSION,
+        kind="ProxyClass",
+        metadata={"name": tailscale.proxy_class.name},
+        spec=_proxy_class_spec(settings),
+        opts=opts
+    )
+    resources = [proxy_class]
+    proxy_opts = ResourceOptions.merge(opts, ResourceOptions(depends_on=[proxy_class]))
+
+    if cluster.egress_group.enabled:
+        resources.append(CustomResource(
+            f"{prefix}-tailscale-egress-group",
+            api_version=API_VERSION,
+            kind="ProxyGroup",
+            metadata={"name": cluster.egress_group.name},
+            spec={
+                "type": "egress",
+                "replicas": cluster.egress_group.replicas,
+                "tags": list(tailscale.tags),
+                "proxyClass": tailscale.proxy_class.name,
+            },
+            opts=proxy_opts
+        ))
+
+    connector = cluster.connector
+    if connector.enabled:
+        spec: Dict[str, Any] = {"tags": list(tailscale.tags), "proxyClass": tailscale.proxy_class.name}
+        if connector.hostname:
+            spec["hostname"] = connector.hostname
+        if connector.advertise_routes:
+            spec["subnetRouter"] = {"advertiseRoutes": list(connector.advertise_routes)}
+        if connector.exit_node:
+            spec["exitNode"] = True
+        resources.append(CustomResource(
+            f"{prefix}-tailscale-connector",
+            api_version=API_VERSION,
+            kind="Connector",
+            metadata={"name": connector.hostname or f"{prefix}-connector"},
+            spec=spec,
+            opts=proxy_opts
+        ))
+    return resources
+
+
+def egress_annotations(tailnet_fqdn: str, cluster: Optional[TailscaleClusterSettings] = None) -> Dict[str, str]:
+    """Annotations of an egress Service to `tailnet_fqdn`, served by the egress group when it is enabled."""
+    annotations = {"tailscale.com/tailnet-fqdn": tailnet_fqdn}
+    if cluster is not None and cluster.egress_group.enabled:
+        annotations["tailscale.com/proxy-group"] = cluster.egress_group.name
+    return annotations
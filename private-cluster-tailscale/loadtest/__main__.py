@@ -0,0 +1,125 @@
+# loadtest/__main__.py
+"""
+Load generator and latency benchmark for the echo endpoint.
+
+Run from the repository root (next to main.go):
+    python -m loadtest local up                                   # Postgres + server on this machine
+    python -m loadtest run --mode open --rate 200 --duration 60 --output before.json
+    python -m loadtest run --mode closed --concurrency 32 --compare before.json
+    python -m loadtest local down
+
+Against a cluster, point --url at the ingress and pass one --metrics-url per
+replica (e.g. through the Tailscale metrics service) to correlate the numbers
+with hungry_echoes_requests_total and hungry_echoes_db_errors_total.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from urllib.parse import quote
+
+from loadtest import local
+from loadtest.generator import CLOSED_LOOP, OPEN_LOOP, RunConfig, run
+
+# Metrics compared by --compare: (report path, label, lower is better)
+_COMPARED = (
+    (("achieved_rps",), "throughput (rps)", False),
+    (("error_rate",), "error rate", True),
+    (("latency", "p50_ms"), "p50 (ms)", True),
+    (("latency", "p99_ms"), "p99 (ms)", True),
+    (("latency", "p999_ms"), "p99.9 (ms)", True),
+)
+
+
+def print_report(report: dict):
+    latency = report["latency"]
+    load = (f"{report['offered_rps']:.0f} rps offered" if report["mode"] == OPEN_LOOP
+            else f"{report['concurrency']} clients")
+    print(f"{report['mode']}-loop, {load}, {report['duration_s']:.1f}s against {report['target']}")
+    print(f"  requests:     {report['requests']} ({report['achieved_rps']:.1f} rps), "
+          f"{report['connections_opened']} connections opened")
+    print(f"  errors:       {report['error_rate'] * 100:.2f}%  {report['outcomes']}"
+          + (f", {report['dropped']} dropped by the client" if report["dropped"] else ""))
+    print(f"  latency (ms): p50 {latency['p50_ms']:.2f}  p90 {latency['p90_ms']:.2f}  "
+          f"p99 {latency['p99_ms']:.2f}  p99.9 {latency['p999_ms']:.2f}  max {latency['max_ms']:.2f}")
+    server = report["server"]
+    if server is None:
+        print("  server:       metrics not scraped")
+        return
+    print(f"  server:       requests {server['requests']}, db errors {server['db_errors']:.0f} "
+          f"({server['db_error_rate'] * 100:.2f}%), {server['unaccounted']:.0f} sent requests not counted")
+
+
+def _lookup(report: dict, path):
+    for key in path:
+        report = report[key]
+    return report
+
+
+def print_comparison(report: dict, previous: dict):
+    print("\nCompared with the previous run:")
+    for path, label, lower_is_better in _COMPARED:
+        old, new = _lookup(previous, path), _lookup(report, path)
+        change = (new - old) / old * 100 if old else 0.0
+        better = (change < 0) == lower_is_better or change == 0
+        print(f"  {label:<17} {old:10.3f} -> {new:10.3f}  ({change:+.1f}%{'' if better else ', worse'})")
+
+
+def _run(args) -> int:
+    config = RunConfig(
+        url=args.url,
+        path=f"/?message={quote(args.message)}",
+        mode=args.mode,
+        rate=args.rate,
+        concurrency=args.concurrency,
+        think_time=args.think_time,
+        connections=args.connections,
+        duration=args.duration,
+        warmup=args.warmup,
+        timeout=args.timeout,
+        metrics_urls=args.metrics_url or [],
+    )
+    report = asyncio.run(run(config))
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run one load test")
+    run_parser.add_argument("--url", default="http://localhost:8080", help="Base URL of the echo server")
+    run_parser.add_argument("--message", default="loadtest", help="Value of the message query parameter")
+    run_parser.add_argument("--mode", choices=[OPEN_LOOP, CLOSED_LOOP], default=OPEN_LOOP)
+    run_parser.add_argument("--rate", type=float, default=100.0, help="Open loop: requests per second")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="Closed loop: concurrent clients")
+    run_parser.add_argument("--think-time", type=float, default=0.0, help="Closed loop: seconds between requests")
+    run_parser.add_argument("--connections", type=int, default=64, help="Keep-alive connection pool size")
+    run_parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before the run")
+    run_parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    run_parser.add_argument("--metrics-url", action="append",
+                            help="Prometheus endpoint of a replica (repeatable), e.g. http://localhost:8081/metrics")
+    run_parser.add_argument("--output", help="Write the report as JSON")
+    run_parser.add_argument("--compare", help="Report written by an earlier run to compare against")
+    run_parser.set_defaults(func=_run)
+
+    local_parser = commands.add_parser("local", help="Start or stop the local Postgres + server stand-in")
+    local_parser.add_argument("action", choices=["up", "down"])
+    local_parser.set_defaults(func=lambda args: local.up() if args.action == "up" else local.down())
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# loadtest/client.py
+"""
+Minimal HTTP/1.1 client on asyncio streams with a keep-alive connection pool.
+
+The echo server only needs plain GETs, so this avoids a third-party HTTP client
+while still reusing connections the way a real client (or NGINX) would.
+Connections are handed out LIFO so a warm connection is preferred.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class HttpError(Exception):
+    """Raised for malformed responses and connection failures."""
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes
+
+
+class _Connection:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+
+    def __init__(self, url: str, size: int, timeout: float = 10.0):
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise ValueError(f"only http:// URLs are supported, got '{url}'")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        # Bounds the connections open at once; requests beyond it wait for a free one
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[_Connection] = []
+        self.opened = 0
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.opened += 1
+        return _Connection(reader, writer)
+
+    async def get(self, path: str) -> Response:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            try:
+                response, keep_alive = await asyncio.wait_for(self._exchange(connection, path), self.timeout)
+            except BaseException:
+                connection.close()
+                raise
+            if keep_alive:
+                self._idle.append(connection)
+            else:
+                connection.close()
+            return response
+
+    async def _exchange(self, connection: _Connection, path: str) -> Tuple[Response, bool]:
+        request = (f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                   f"User-Agent: hungry-echoes-loadtest\r\nAccept: */*\r\n\r\n")
+        connection.writer.write(request.encode("latin-1"))
+        await connection.writer.drain()
+
+        status_line = await connection.reader.readline()
+        if not status_line:
+            raise HttpError("connection closed before the response")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HttpError(f"malformed status line {status_line!r}")
+
+        headers = {}
+        while True:
+            line = await connection.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked(connection.reader)
+        elif "content-length" in headers:
+            body = await connection.reader.readexactly(int(headers["content-length"]))
+        else:
+            # No framing: the body runs until the server closes the connection
+            return Response(status, await connection.reader.read()), False
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        return Response(status, body), keep_alive
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # Trailers, then the final empty line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+
+    async def close(self):
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+
+async def fetch_text(url: str, timeout: float = 10.0) -> Optional[str]:
+    """One-off GET (used for /metrics); returns None when the target is unreachable."""
+    parts = urlsplit(url)
+    pool = ConnectionPool(url, size=1, timeout=timeout)
+    try:
+        response = await pool.get(parts.path + (f"?{parts.query}" if parts.query else "") or "/")
+    except (OSError, HttpError, asyncio.TimeoutError):
+        return None
+    finally:
+        await pool.close()
+    return response.body.decode("utf-8", errors="replace") if response.status == 200 else None
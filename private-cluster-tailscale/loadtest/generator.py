@@ -0,0 +1,183 @@
+# loadtest/generator.py
+"""
+Open- and closed-loop load generation against the echo endpoint.
+
+Open loop sends at a fixed arrival rate no matter how the server responds, and
+measures latency from the moment each request was *scheduled*; a stalled
+server therefore shows up in the percentiles instead of silently lowering the
+offered load (coordinated omission). Closed loop runs a fixed number of
+clients that each wait for their response before sending the next request,
+which measures the throughput the server sustains at that concurrency.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from loadtest.client import ConnectionPool, HttpError
+from loadtest.histogram import LatencyHistogram
+from loadtest.metrics import ServerCounters, scrape
+
+OPEN_LOOP = "open"
+CLOSED_LOOP = "closed"
+
+
+@dataclass
+class RunConfig:
+    url: str
+    path: str = "/?message=loadtest"
+    mode: str = OPEN_LOOP
+    # Open loop: requests per second
+    rate: float = 100.0
+    # Closed loop: concurrent clients
+    concurrency: int = 16
+    # Closed loop: pause between a response and the next request
+    think_time: float = 0.0
+    connections: int = 64
+    duration: float = 30.0
+    # Requests scheduled during the warm-up are sent but not measured
+    warmup: float = 5.0
+    timeout: float = 10.0
+    # Open loop: requests allowed to wait for a connection before new ones are dropped
+    max_outstanding: int = 10_000
+    metrics_urls: List[str] = field(default_factory=list)
+
+
+@dataclass
+class RunStats:
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    # Measured requests by outcome: "2xx", "4xx", "500", "timeout", "connect", ...
+    outcomes: Dict[str, int] = field(default_factory=dict)
+    # Every request sent, warm-up included (comparable with the server counters)
+    sent: int = 0
+    dropped: int = 0
+
+    def count(self, outcome: str):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+def _outcome(status: int) -> str:
+    if 200 <= status < 300:
+        return "2xx"
+    return str(status) if status >= 500 else f"{status // 100}xx"
+
+
+async def _request(pool: ConnectionPool, path: str, started: float, measured: bool, stats: RunStats):
+    stats.sent += 1
+    try:
+        response = await pool.get(path)
+        outcome = _outcome(response.status)
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    except (ConnectionError, OSError):
+        outcome = "connect"
+    except HttpError:
+        outcome = "protocol"
+    if measured:
+        stats.histogram.record((time.perf_counter() - started) * 1_000_000)
+        stats.count(outcome)
+
+
+async def _open_loop(config: RunConfig, pool: ConnectionPool, stats: RunStats, start: float):
+    interval = 1.0 / config.rate
+    end = start + config.warmup + config.duration
+    pending = set()
+    i = 0
+    while True:
+        scheduled = start + i * interval
+        if scheduled >= end:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        i += 1
+        measured = scheduled >= start + config.warmup
+        if len(pending) >= config.max_outstanding:
+            # The client itself is saturated; count it instead of queueing without bound
+            if measured:
+                stats.dropped += 1
+            continue
+        task = asyncio.create_task(_request(pool, config.path, scheduled, measured, stats))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def _closed_loop(config: RunConfig, pool: ConnectionPool, stats: RunStats, start: float):
+    end = start + config.warmup + config.duration
+
+    async def client():
+        while True:
+            started = time.perf_counter()
+            if started >= end:
+                return
+            await _request(pool, config.path, started, started >= start + config.warmup, stats)
+            if config.think_time:
+                await asyncio.sleep(config.think_time)
+
+    await asyncio.gather(*(client() for _ in range(config.concurrency)))
+
+
+async def _scrape_all(urls: List[str]) -> Optional[ServerCounters]:
+    """Sums the counters of every replica; None if any of them could not be scraped."""
+    results = await asyncio.gather(*(scrape(url) for url in urls))
+    if not results or any(result is None for result in results):
+        return None
+    total = ServerCounters()
+    for result in results:
+        total.db_errors += result.db_errors
+        for status, value in result.requests.items():
+            total.requests[status] = total.requests.get(status, 0.0) + value
+    return total
+
+
+async def run(config: RunConfig) -> dict:
+    """Runs one load test and returns its report."""
+    if config.mode not in (OPEN_LOOP, CLOSED_LOOP):
+        raise ValueError(f"mode must be '{OPEN_LOOP}' or '{CLOSED_LOOP}', got '{config.mode}'")
+
+    before = await _scrape_all(config.metrics_urls)
+    pool = ConnectionPool(config.url, size=config.connections, timeout=config.timeout)
+    stats = RunStats()
+    start = time.perf_counter()
+    try:
+        if config.mode == OPEN_LOOP:
+            await _open_loop(config, pool, stats, start)
+        else:
+            await _closed_loop(config, pool, stats, start)
+    finally:
+        await pool.close()
+    elapsed = time.perf_counter() - start - config.warmup
+    after = await _scrape_all(config.metrics_urls)
+
+    measured = sum(stats.outcomes.values())
+    errors = measured - stats.outcomes.get("2xx", 0)
+    report = {
+        "mode": config.mode,
+        "target": config.url + config.path,
+        "offered_rps": config.rate if config.mode == OPEN_LOOP else None,
+        "concurrency": config.concurrency if config.mode == CLOSED_LOOP else None,
+        "duration_s": round(elapsed, 3),
+        "requests": measured,
+        "achieved_rps": measured / elapsed if elapsed > 0 else 0.0,
+        "error_rate": errors / measured if measured else 0.0,
+        "outcomes": dict(sorted(stats.outcomes.items())),
+        "dropped": stats.dropped,
+        "connections_opened": pool.opened,
+        "latency": stats.histogram.summary(),
+        "server": None,
+    }
+
+    if before is not None and after is not None:
+        delta = after - before
+        server_total = sum(delta.requests.values())
+        report["server"] = {
+            "requests": delta.requests,
+            "db_errors": delta.db_errors,
+            "db_error_rate": delta.db_errors / server_total if server_total else 0.0,
+            # Sent by this run (warm-up included) vs counted by the server; other traffic widens the gap
+            "client_sent": stats.sent,
+            "unaccounted": stats.sent - server_total,
+        }
+    return report
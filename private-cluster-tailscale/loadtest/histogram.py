@@ -0,0 +1,80 @@
+# loadtest/histogram.py
+"""
+HDR-style latency histogram.
+
+Values (microseconds) are bucketed log-linearly like HdrHistogram: every power
+of two gets the same number of linear sub-buckets, so the relative error stays
+below 10^-significant_figures across the whole range while memory stays fixed
+no matter how many requests are recorded.
+"""
+import math
+from typing import Dict, List
+
+
+class LatencyHistogram:
+
+    def __init__(self, highest_us: int = 60_000_000, significant_figures: int = 3):
+        self.highest_us = highest_us
+        # Enough linear sub-buckets per power of two for the requested precision
+        sub_bucket_count = 2 ** math.ceil(math.log2(2 * 10 ** significant_figures))
+        self._sub_bucket_bits = int(math.log2(sub_bucket_count))
+        self._counts: Dict[int, int] = {}
+        self.total = 0
+        self.min_us = None
+        self.max_us = 0
+        self._sum_us = 0
+
+    def _index(self, value: int) -> int:
+        # Values below the first sub-bucket range are stored exactly
+        exponent = max(0, value.bit_length() - self._sub_bucket_bits)
+        sub_bucket = value >> exponent
+        return (exponent << self._sub_bucket_bits) | sub_bucket
+
+    def _value_at(self, index: int) -> int:
+        exponent = index >> self._sub_bucket_bits
+        sub_bucket = index & ((1 << self._sub_bucket_bits) - 1)
+        # Highest value that maps to this bucket
+        return ((sub_bucket + 1) << exponent) - 1
+
+    def record(self, value_us: float):
+        value = min(max(0, int(value_us)), self.highest_us)
+        index = self._index(value)
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.total += 1
+        self._sum_us += value
+        self.max_us = max(self.max_us, value)
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self.total += other.total
+        self._sum_us += other._sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile(self, q: float) -> int:
+        """Latency (us) at or below which `q` percent of the requests completed."""
+        if not self.total:
+            return 0
+        wanted = max(1, math.ceil(q / 100 * self.total))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= wanted:
+                return min(self._value_at(index), self.max_us)
+        return self.max_us
+
+    @property
+    def mean_us(self) -> float:
+        return self._sum_us / self.total if self.total else 0.0
+
+    def summary(self, percentiles: List[float] = (50, 90, 99, 99.9)) -> dict:
+        return {
+            "count": self.total,
+            "min_ms": (self.min_us or 0) / 1000,
+            "mean_ms": self.mean_us / 1000,
+            "max_ms": self.max_us / 1000,
+            **{f"p{str(q).replace('.', '')}_ms": self.percentile(q) / 1000 for q in percentiles},
+        }
@@ -0,0 +1,26 @@
+# loadtest/local.py
+"""
+Starts and stops the local stand-in (Postgres + echo server) from compose.yaml.
+
+The database is seeded from infra/app_cluster/database_init.sql, the init
+script of the cluster database, so the local phrases table always matches
+what the cluster gets.
+"""
+import os
+import subprocess
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPOSE_FILE = os.path.join(LOADTEST_DIR, "compose.yaml")
+
+
+def _compose(*args: str) -> int:
+    return subprocess.call(["docker", "compose", "-f", COMPOSE_FILE, *args])
+
+
+def up() -> int:
+    return _compose("up", "--detach", "--build", "--wait")
+
+
+def down() -> int:
+    # Drop the database volume too, so every run starts from the same seed
+    return _compose("down", "--volumes")
@@ -0,0 +1,54 @@
+# loadtest/metrics.py
+"""
+Scrapes the server's Prometheus endpoint (:8081/metrics) around a run so the
+client-side numbers can be checked against what the server counted.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from loadtest.client import fetch_text
+
+REQUESTS_METRIC = "hungry_echoes_requests_total"
+DB_ERRORS_METRIC = "hungry_echoes_db_errors_total"
+
+_SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})?\s+(?P<value>\S+)')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+@dataclass
+class ServerCounters:
+    # hungry_echoes_requests_total by its "status" label
+    requests: Dict[str, float] = field(default_factory=dict)
+    db_errors: float = 0.0
+
+    def __sub__(self, other: "ServerCounters") -> "ServerCounters":
+        statuses = set(self.requests) | set(other.requests)
+        return ServerCounters(
+            requests={s: self.requests.get(s, 0.0) - other.requests.get(s, 0.0) for s in statuses},
+            db_errors=self.db_errors - other.db_errors,
+        )
+
+
+def parse(text: str) -> ServerCounters:
+    """Extracts the echo server counters from the Prometheus text exposition format."""
+    counters = ServerCounters()
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, value = match["name"], float(match["value"])
+        if name == REQUESTS_METRIC:
+            labels = dict(_LABEL.findall(match["labels"] or ""))
+            status = labels.get("status", "")
+            counters.requests[status] = counters.requests.get(status, 0.0) + value
+        elif name == DB_ERRORS_METRIC:
+            counters.db_errors += value
+    return counters
+
+
+async def scrape(url: str) -> Optional[ServerCounters]:
+    text = await fetch_text(url)
+    return parse(text) if text is not None else None
@@ -1,12 +1,13 @@
 package main
 
 import (
+	"context"
 	"database/sql"
 	"fmt"
 	"net/http"
 	"os"
 
-	_ "github.com/lib/pq"
+	"github.com/lib/pq"
 	"github.com/prometheus/client_golang/prometheus"
 	"github.com/prometheus/client_golang/prometheus/promauto"
 	"github.com/prometheus/client_golang/prometheus/promhttp"
@@ -20,7 +21,8 @@ const (
 
 // Global variables
 var (
-	db *sql.DB
+	db      *sql.DB
+	phrases *phraseCache
 
 	// Prometheus metrics
 	requestCounter = promauto.NewCounterVec(
@@ -39,22 +41,59 @@ var (
 	)
 )
 
-// Initialize the database connection
-func initDB() error {
-	dbHost := os.Getenv("DB_HOST")
+// Build the connection string for the given host
+func connString(dbHost string) string {
 	dbPort := os.Getenv("DB_PORT")
 	dbUser := os.Getenv("DB_USER")
 	dbPassword := os.Getenv("DB_PASSWORD")
 	dbName := os.Getenv("DB_NAME")
 
-	connStr := fmt.Sprintf("host=%s port=%s user=%s password=%s dbname=%s sslmode=disable",
+	return fmt.Sprintf("host=%s port=%s user=%s password=%s dbname=%s sslmode=disable",
 		dbHost, dbPort, dbUser, dbPassword, dbName)
+}
 
+// Initialize the database connection
+func initDB() error {
 	var err error
-	db, err = sql.Open("postgres", connStr)
+	db, err = sql.Open("postgres", connString(os.Getenv("DB_HOST")))
 	return err
 }
 
+// Initialize the phrase cache and start refreshing it in the background
+func initPhrases(ctx context.Context) error {
+	refreshInterval, err := durationEnv("PHRASE_REFRESH_INTERVAL", defaultRefreshEvery)
+	if err != nil {
+		return err
+	}
+	maxStaleness, err := durationEnv("PHRASE_MAX_STALENESS", defaultMaxStaleness)
+	if err != nil {
+		return err
+	}
+	if maxStaleness < refreshInterval {
+		return fmt.Errorf("PHRASE_MAX_STALENESS (%s) must not be shorter than PHRASE_REFRESH_INTERVAL (%s)",
+			maxStaleness, refreshInterval)
+	}
+
+	// Optional: reload as soon as the phrase table changes
+	var listener *pq.Listener
+	if channel := os.Getenv("PHRASE_NOTIFY_CHANNEL"); channel != "" {
+		notifyHost := os.Getenv("DB_NOTIFY_HOST")
+		if notifyHost == "" {
+			notifyHost = os.Getenv("DB_HOST")
+		}
+		listener, err = newPhraseListener(connString(notifyHost), channel)
+		if err != nil {
+			// The interval refresh still bounds the staleness
+			fmt.Println("Error listening for phrase changes, refreshing on the interval only:", err)
+			listener = nil
+		}
+	}
+
+	phrases = newPhraseCache(db, maxStaleness)
+	go phrases.run(ctx, refreshInterval, listener)
+	return nil
+}
+
 // Handle incoming HTTP requests
 func handleRequest(w http.ResponseWriter, r *http.Request) {
 	message := r.URL.Query().Get("message")
@@ -64,12 +103,10 @@ func handleRequest(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	var corporatePhrase string
-	// Select a random phrase from the database
-	err := db.QueryRow("SELECT sentence FROM corporate.jargons ORDER BY RANDOM() LIMIT 1").Scan(&corporatePhrase)
+	// Pick a random phrase from the cache (DB errors are counted when it reloads)
+	corporatePhrase, err := phrases.pick(r.Context())
 	if err != nil {
 		requestCounter.WithLabelValues("error").Inc()
-		dbErrorCounter.Inc() // Increment DB error counter
 		http.Error(w, "Failed to retrieve phrase", http.StatusInternalServerError)
 		return
 	}
@@ -89,13 +126,26 @@ func main() {
 	}
 	defer db.Close()
 
+	// Load the phrases into memory; until they are loaded, requests (and the readiness probe) fail
+	if err := initPhrases(context.Background()); err != nil {
+		fmt.Println("Error initializing phrases:", err)
+		return
+	}
+
 	// Create a new mux for the main application
 	mainMux := http.NewServeMux()
-	mainMux.HandleFunc("/", handleRequest)
+	mainMux.HandleFunc("/", instrument(handleRequest))
 
 	// Create a new mux for metrics
 	metricsMux := http.NewServeMux()
 	metricsMux.Handle("/metrics", promhttp.Handler())
+	registerDBStats(db, os.Getenv("DB_NAME"))
+
+	// Opt-in profiling endpoints, next to the metrics only
+	if os.Getenv("ENABLE_PPROF") == "true" {
+		registerProfiling(metricsMux)
+		fmt.Printf("Profiling endpoints enabled on %s/debug/pprof/\n", MetricsPort)
+	}
 
 	// Start the metrics server on a different port
 	go func() {
@@ -110,4 +160,4 @@ func main() {
 	if err := http.ListenAndServe(AppPort, mainMux); err != nil {
 		fmt.Printf("Error starting main server on %s: %v\n", AppPort, err)
 	}
-}
\ No newline at end of file
+}
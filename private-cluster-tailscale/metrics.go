@@ -0,0 +1,102 @@
+package main
+
+import (
+	"database/sql"
+	"net/http"
+	"net/http/pprof"
+	"time"
+
+	"github.com/prometheus/client_golang/prometheus"
+	"github.com/prometheus/client_golang/prometheus/collectors"
+	"github.com/prometheus/client_golang/prometheus/promauto"
+)
+
+// Latency, concurrency and connection pool metrics on the metrics port. They
+// tell apart a slow database (query duration), a saturated pool (pool waits)
+// and a CPU-starved server (request duration and in-flight requests rising
+// while queries stay fast). Requests are served from the phrase cache, so the
+// only queries are its reloads: the query histogram sees roughly one
+// observation per refresh interval and notification, not one per request. Go
+// runtime and process metrics (go_*, process_*) come with the default registry.
+var (
+	// 0.5ms .. ~2s: a cached phrase is served in well under a millisecond
+	requestDuration = promauto.NewHistogramVec(
+		prometheus.HistogramOpts{
+			Name:    "hungry_echoes_request_duration_seconds",
+			Help:    "Duration of requests to the echo server",
+			Buckets: prometheus.ExponentialBuckets(0.0005, 2, 13),
+		},
+		[]string{"status"}, // Label for success/error
+	)
+
+	// 1ms .. ~4s; phrase cache reloads only (query="load_phrases")
+	dbQueryDuration = promauto.NewHistogramVec(
+		prometheus.HistogramOpts{
+			Name:    "hungry_echoes_db_query_duration_seconds",
+			Help:    "Duration of phrase cache reloads from the database, including the wait for a pooled connection",
+			Buckets: prometheus.ExponentialBuckets(0.001, 2, 13),
+		},
+		[]string{"query", "status"},
+	)
+
+	requestsInFlight = promauto.NewGauge(
+		prometheus.GaugeOpts{
+			Name: "hungry_echoes_requests_in_flight",
+			Help: "Requests currently being served",
+		},
+	)
+)
+
+// statusRecorder remembers the status code a handler wrote
+type statusRecorder struct {
+	http.ResponseWriter
+	code int
+}
+
+func (r *statusRecorder) WriteHeader(code int) {
+	r.code = code
+	r.ResponseWriter.WriteHeader(code)
+}
+
+// instrument counts a request as in flight while next serves it and records its duration
+func instrument(next http.HandlerFunc) http.HandlerFunc {
+	return func(w http.ResponseWriter, r *http.Request) {
+		requestsInFlight.Inc()
+		defer requestsInFlight.Dec()
+
+		start := time.Now()
+		recorder := &statusRecorder{ResponseWriter: w, code: http.StatusOK}
+		next(recorder, r)
+
+		status := "success"
+		if recorder.code >= http.StatusBadRequest {
+			status = "error"
+		}
+		requestDuration.WithLabelValues(status).Observe(time.Since(start).Seconds())
+	}
+}
+
+// observeQuery records the duration of a query that started at start
+func observeQuery(query string, start time.Time, err error) {
+	status := "success"
+	if err != nil {
+		status = "error"
+	}
+	dbQueryDuration.WithLabelValues(query, status).Observe(time.Since(start).Seconds())
+}
+
+// registerDBStats exports the connection pool of db: open, in use and idle
+// connections, and how often and how long queries waited for one (go_sql_*)
+func registerDBStats(db *sql.DB, name string) {
+	prometheus.MustRegister(collectors.NewDBStatsCollector(db, name))
+}
+
+// registerProfiling serves the pprof endpoints under /debug/pprof/ on mux (the
+// metrics port only, never the public one)
+func registerProfiling(mux *http.ServeMux) {
+	mux.HandleFunc("/debug/pprof/", pprof.Index)
+	mux.HandleFunc("/debug/pprof/cmdline", pprof.Cmdline)
+	mux.HandleFunc("/debug/pprof/profile", pprof.Profile)
+	mux.HandleFunc("/debug/pprof/symbol", pprof.Symbol)
+	mux.HandleFunc("/debug/pprof/trace", pprof.Trace)
+}
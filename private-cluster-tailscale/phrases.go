@@ -0,0 +1,217 @@
+package main
+
+import (
+	"context"
+	"database/sql"
+	"errors"
+	"fmt"
+	"math/rand"
+	"os"
+	"sync"
+	"time"
+
+	"github.com/lib/pq"
+	"github.com/prometheus/client_golang/prometheus"
+	"github.com/prometheus/client_golang/prometheus/promauto"
+)
+
+// The phrase table only changes when the init script reruns, so the server keeps
+// it in memory and picks a phrase locally instead of running
+// `ORDER BY RANDOM() LIMIT 1` (a full scan and sort) on every request. The
+// database stays the source of truth: the cache is reloaded on an interval and,
+// when PHRASE_NOTIFY_CHANNEL is set, as soon as Postgres sends a notification on
+// that channel (see the trigger in infra/app_cluster/database_init.sql).
+const (
+	loadPhrasesQuery     = "SELECT sentence FROM corporate.jargons"
+	defaultRefreshEvery  = time.Minute
+	defaultMaxStaleness  = 5 * time.Minute
+	phraseQueryTimeout   = 5 * time.Second
+	listenerPingInterval = 90 * time.Second
+	listenerMinReconnect = 10 * time.Second
+	listenerMaxReconnect = time.Minute
+)
+
+var (
+	phraseRefreshCounter = promauto.NewCounterVec(
+		prometheus.CounterOpts{
+			Name: "hungry_echoes_phrase_refreshes_total",
+			Help: "Reloads of the phrase cache from the database",
+		},
+		[]string{"result"}, // Label for success/error
+	)
+
+	phraseCacheSize = promauto.NewGauge(
+		prometheus.GaugeOpts{
+			Name: "hungry_echoes_phrase_cache_size",
+			Help: "Number of phrases in the in-memory cache",
+		},
+	)
+
+	errNoPhrases    = errors.New("the phrase table is empty")
+	errStalePhrases = errors.New("the phrase cache is older than the maximum staleness")
+)
+
+// phraseCache holds the phrase table in memory
+type phraseCache struct {
+	db *sql.DB
+	// Phrases older than this are not served; a request then reloads them first
+	maxStaleness time.Duration
+
+	mu       sync.RWMutex
+	phrases  []string
+	loadedAt time.Time
+
+	// Serializes reloads; requests that waited behind one reuse its result
+	refreshMu sync.Mutex
+}
+
+func newPhraseCache(db *sql.DB, maxStaleness time.Duration) *phraseCache {
+	return &phraseCache{db: db, maxStaleness: maxStaleness}
+}
+
+// refresh reloads the phrase table; DB errors are counted and the old phrases are
+// kept. Unless force is set, it skips the query when another caller reloaded the
+// phrases while this one waited for the lock, so a burst of stale requests runs
+// a single query.
+func (c *phraseCache) refresh(ctx context.Context, force bool) error {
+	c.refreshMu.Lock()
+	defer c.refreshMu.Unlock()
+
+	if _, ok := c.fresh(); ok && !force {
+		return nil
+	}
+	phrases, err := c.load(ctx)
+	if err != nil {
+		phraseRefreshCounter.WithLabelValues("error").Inc()
+		dbErrorCounter.Inc() // Increment DB error counter
+		return err
+	}
+
+	c.mu.Lock()
+	c.phrases = phrases
+	c.loadedAt = time.Now()
+	c.mu.Unlock()
+	phraseRefreshCounter.WithLabelValues("success").Inc()
+	phraseCacheSize.Set(float64(len(phrases)))
+	return nil
+}
+
+func (c *phraseCache) load(ctx context.Context) (phrases []string, err error) {
+	ctx, cancel := context.WithTimeout(ctx, phraseQueryTimeout)
+	defer cancel()
+	defer func(start time.Time) { observeQuery("load_phrases", start, err) }(time.Now())
+
+	rows, err := c.db.QueryContext(ctx, loadPhrasesQuery)
+	if err != nil {
+		return nil, err
+	}
+	defer rows.Close()
+
+	for rows.Next() {
+		var phrase string
+		if err := rows.Scan(&phrase); err != nil {
+			return nil, err
+		}
+		phrases = append(phrases, phrase)
+	}
+	if err := rows.Err(); err != nil {
+		return nil, err
+	}
+	if len(phrases) == 0 {
+		return nil, errNoPhrases
+	}
+	return phrases, nil
+}
+
+// fresh returns the cached phrases if they are within the staleness bound
+func (c *phraseCache) fresh() ([]string, bool) {
+	c.mu.RLock()
+	defer c.mu.RUnlock()
+	if len(c.phrases) == 0 || time.Since(c.loadedAt) > c.maxStaleness {
+		return nil, false
+	}
+	return c.phrases, true
+}
+
+// pick returns a random phrase, reloading the cache first when it is too old
+func (c *phraseCache) pick(ctx context.Context) (string, error) {
+	phrases, ok := c.fresh()
+	if !ok {
+		if err := c.refresh(ctx, false); err != nil {
+			if phrases, ok = c.fresh(); !ok {
+				return "", fmt.Errorf("%w: %v", errStalePhrases, err)
+			}
+		} else if phrases, ok = c.fresh(); !ok {
+			return "", errStalePhrases
+		}
+	}
+	return phrases[rand.Intn(len(phrases))], nil
+}
+
+// run reloads the cache every interval and on every notification until ctx is done
+func (c *phraseCache) run(ctx context.Context, interval time.Duration, listener *pq.Listener) {
+	var notifications <-chan *pq.Notification
+	if listener != nil {
+		notifications = listener.Notify
+	}
+	ticker := time.NewTicker(interval)
+	defer ticker.Stop()
+	ping := time.NewTicker(listenerPingInterval)
+	defer ping.Stop()
+
+	c.forceRefresh(ctx)
+	for {
+		select {
+		case <-ctx.Done():
+			return
+		case <-ticker.C:
+			c.forceRefresh(ctx)
+		// A nil notification means the listener reconnected and may have missed some
+		case <-notifications:
+			c.forceRefresh(ctx)
+		case <-ping.C:
+			if listener != nil {
+				// Detects a dead listener connection, which then reconnects
+				go listener.Ping()
+			}
+		}
+	}
+}
+
+// forceRefresh reloads the phrase table even if the cache is still fresh
+func (c *phraseCache) forceRefresh(ctx context.Context) {
+	if err := c.refresh(ctx, true); err != nil {
+		fmt.Println("Error refreshing phrases:", err)
+	}
+}
+
+// newPhraseListener listens for phrase table changes on a direct connection to
+// Postgres. LISTEN needs a session of its own, which a transaction-mode pool
+// such as PgBouncer does not provide, so DB_NOTIFY_HOST (default DB_HOST) can
+// point straight at the server.
+func newPhraseListener(connStr, channel string) (*pq.Listener, error) {
+	listener := pq.NewListener(connStr, listenerMinReconnect, listenerMaxReconnect,
+		func(event pq.ListenerEventType, err error) {
+			if err != nil {
+				fmt.Println("Phrase listener:", err)
+			}
+		})
+	if err := listener.Listen(channel); err != nil {
+		listener.Close()
+		return nil, err
+	}
+	return listener, nil
+}
+
+// durationEnv reads a duration such as "30s" or "5m" from the environment
+func durationEnv(name string, fallback time.Duration) (time.Duration, error) {
+	value := os.Getenv(name)
+	if value == "" {
+		return fallback, nil
+	}
+	duration, err := time.ParseDuration(value)
+	if err != nil || duration <= 0 {
+		return 0, fmt.Errorf("%s must be a positive duration, got %q", name, value)
+	}
+	return duration, nil
+}